@@ -146,6 +146,16 @@ CACHES = {
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
 
+# Дополнительные стратегии TradeEngine: имя -> путь к классу.
+# Стратегии из пакетов также подхватываются по entry points группы trading.strategies.
+TRADING_STRATEGIES = {}
+
+# Каталог архива отчётных графиков; пусто - графики не пишутся на диск
+CHART_ARCHIVE_DIR = os.getenv("CHART_ARCHIVE_DIR") or None
+
+# Сколько сообщений в минуту уходит в чат Telegram; из него же считается общий лимит отчётов пар
+TELEGRAM_MESSAGES_PER_MINUTE = int(os.getenv("TELEGRAM_MESSAGES_PER_MINUTE", 20))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 LANGUAGE_CODE = "en-us"
@@ -0,0 +1,47 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from trading.services.backtest import BATCH_SIZE, run_many
+
+
+class Command(BaseCommand):
+    help = "Прогнать записанные трейды (CSV/Parquet/NPZ) через TradeEngine"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Файлы с трейдами, по одному на пару")
+        parser.add_argument(
+            "--pair", default=None,
+            help="Имя пары (по умолчанию - имя файла)",
+        )
+        parser.add_argument(
+            "--output", default=os.path.join(settings.BASE_DIR, "tmp", "backtests"),
+            help="Куда писать сигналы и diffs",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=0,
+            help="Прогонять файлы в N процессах (0 - в текущем)",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--reports", action="store_true",
+            help="Рисовать отчёты во время прогона в <output>/<пара>_reports (по умолчанию выключены)",
+        )
+
+    def handle(self, *args, **options):
+        jobs = [
+            {
+                'path': path,
+                'output_dir': options["output"],
+                'pair_name': options["pair"],
+                'batch_size': options["batch_size"],
+                'reports': options["reports"],
+            }
+            for path in options["paths"]
+        ]
+        for summary in run_many(jobs, workers=options["workers"]):
+            self.stdout.write(
+                f"✅ {summary['name']}: {summary['trades']} трейдов, {summary['buckets']} бакетов "
+                f"за {summary['seconds']:.2f} с ({summary['trades_per_second']:.0f} трейдов/с) -> {summary['signals']}"
+            )
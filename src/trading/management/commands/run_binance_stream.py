@@ -1,21 +1,68 @@
 from django.core.management.base import BaseCommand
-import asyncio
 
-from trading.services.binance_stream import BinanceBatchTradeStream
+from trading.services import runtime
+from trading.services.binance_stream import MIN_PAIR_COUNT
+from trading.services.sharded_stream import (
+    STREAMS_PER_CONNECTION,
+    ShardedTradeStream,
+)
 
 
 class Command(BaseCommand):
     help = "Запустить Binance WebSocket стрим"
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--streams-per-connection", type=int, default=STREAMS_PER_CONNECTION,
+            help="Сколько пар слушает одно соединение с биржей",
+        )
+        parser.add_argument(
+            "--processes", type=int, default=0,
+            help="Разнести соединения по N процессам (0 - всё в текущем)",
+        )
+        parser.add_argument(
+            "--max-pairs", type=int, default=MIN_PAIR_COUNT,
+            help="Ограничение на количество пар (0 - все ликвидные)",
+        )
+        parser.add_argument(
+            "--fast", action="store_true",
+            help="uvloop и периодический отчёт о пропускной способности",
+        )
+        parser.add_argument(
+            "--persist", action="store_true",
+            help="Писать трейды и бакеты в Postgres",
+        )
+        parser.add_argument(
+            "--snapshots", action="store_true",
+            help="Периодически сохранять состояние движков в Redis и восстанавливать при старте",
+        )
+        parser.add_argument(
+            "--cross-pair", action="store_true",
+            help="Считать EMA/AMA/ATR по бакетам сразу для всех пар и добавлять их в отчёты",
+        )
+        parser.add_argument(
+            "--telegram-digest", type=int, default=0,
+            help="Собирать отчёты пар в дайджест раз в N секунд (0 - отправлять сразу)",
+        )
+
+    def handle(self, *args, **options):
         self.stdout.write("🚀 Запуск BinanceBatchTradeStream...")
+        stream = ShardedTradeStream(
+            streams_per_connection=options["streams_per_connection"],
+            processes=options["processes"],
+            max_pairs=options["max_pairs"],
+            fast=options["fast"],
+            persist=options["persist"],
+            snapshots=options["snapshots"],
+            digest_interval=options["telegram_digest"],
+            cross_pair=options["cross_pair"],
+        )
         try:
-            asyncio.run(self.run_stream())
+            runtime.run(self.run_stream(stream), fast=options["fast"])
         except Exception as e:
             self.stderr.write(f"❌ Ошибка: {e}")
 
-    async def run_stream(self):
-        stream = BinanceBatchTradeStream()
+    async def run_stream(self, stream):
         try:
             await stream.run()
         except KeyboardInterrupt:
@@ -25,4 +72,4 @@ class Command(BaseCommand):
             print(f"❗️ Runtime error: {e}")
             await stream.stop()
         finally:
-            print("🔚 Работа завершена")
\ No newline at end of file
+            print("🔚 Работа завершена")
@@ -0,0 +1,65 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.services.sweep import (
+    INDICATOR_PARAMS,
+    STRATEGY_PARAMS,
+    Sweep,
+    grid,
+    random_search,
+)
+
+
+def parse_value(value: str):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    raise CommandError(f"Не число: {value}")
+
+
+class Command(BaseCommand):
+    help = "Перебрать параметры GigaStrategy и индикаторов на записанных трейдах"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл с трейдами (CSV/Parquet/NPZ)")
+        parser.add_argument(
+            "--param", action="append", default=[], metavar="NAME=V1,V2",
+            help=f"Значения параметра, можно повторять. Имена: {', '.join((*STRATEGY_PARAMS, *INDICATOR_PARAMS))}",
+        )
+        parser.add_argument(
+            "--random", type=int, default=0,
+            help="Взять N случайных точек сетки вместо полного перебора",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--pair", default=None, help="Имя пары (по умолчанию - имя файла)")
+        parser.add_argument(
+            "--output", default=os.path.join(settings.BASE_DIR, "tmp", "sweeps"),
+            help="Каталог для данных и кэша результатов",
+        )
+        parser.add_argument("--workers", type=int, default=0, help="Считать в N процессах (0 - в текущем)")
+        parser.add_argument("--top", type=int, default=10, help="Сколько лучших точек вывести")
+
+    def handle(self, *args, **options):
+        space = {}
+        for item in options["param"]:
+            name, _, values = item.partition("=")
+            if name not in STRATEGY_PARAMS and name not in INDICATOR_PARAMS:
+                raise CommandError(f"Неизвестный параметр: {name}")
+            space[name] = [parse_value(value) for value in values.split(",")]
+
+        if options["random"]:
+            points = random_search(space, options["random"], options["seed"])
+        else:
+            points = grid(space)
+
+        sweep = Sweep(options["path"], options["output"], pair_name=options["pair"], workers=options["workers"])
+        for result in sweep.run(points)[:options["top"]]:
+            best = result["scores"][result["best"]]
+            self.stdout.write(
+                f"{result['hash']} {result['params']}: {result['best']} "
+                f"{best['edge_bps']:.3f} б.п., попаданий {best['hit_rate']:.1%}"
+            )
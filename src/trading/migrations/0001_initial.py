@@ -0,0 +1,85 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+# Django не умеет создавать секционированные таблицы, поэтому DDL пишем сами,
+# а состояние моделей описываем обычными CreateModel. Дневные секции создаёт
+# TickWriter перед записью (trading.services.tick_writer.ensure_partition).
+CREATE_TRADE = """
+CREATE TABLE "trading_trade" (
+    "exchange" varchar(32) NOT NULL,
+    "symbol" varchar(32) NOT NULL,
+    "trade_id" bigint NOT NULL,
+    "traded_at" timestamp with time zone NOT NULL,
+    "price" double precision NOT NULL,
+    "amount" double precision NOT NULL,
+    "side" smallint NOT NULL,
+    PRIMARY KEY ("exchange", "symbol", "trade_id", "traded_at")
+) PARTITION BY RANGE ("traded_at");
+"""
+
+CREATE_TRADE_BUCKET = """
+CREATE TABLE "trading_tradebucket" (
+    "exchange" varchar(32) NOT NULL,
+    "symbol" varchar(32) NOT NULL,
+    "interval_ms" integer NOT NULL,
+    "started_at" timestamp with time zone NOT NULL,
+    "open" double precision NOT NULL,
+    "high" double precision NOT NULL,
+    "low" double precision NOT NULL,
+    "close" double precision NOT NULL,
+    "volume" double precision NULL,
+    "trades_count" integer NOT NULL,
+    "alfa_diff" double precision NOT NULL,
+    PRIMARY KEY ("exchange", "symbol", "interval_ms", "started_at")
+) PARTITION BY RANGE ("started_at");
+"""
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CREATE_TRADE, reverse_sql='DROP TABLE "trading_trade";'),
+                migrations.RunSQL(CREATE_TRADE_BUCKET, reverse_sql='DROP TABLE "trading_tradebucket";'),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='Trade',
+                    fields=[
+                        ('pk', models.CompositePrimaryKey('exchange', 'symbol', 'trade_id', 'traded_at', blank=True, editable=False, primary_key=True, serialize=False)),
+                        ('exchange', models.CharField(max_length=32)),
+                        ('symbol', models.CharField(max_length=32)),
+                        ('trade_id', models.BigIntegerField()),
+                        ('traded_at', models.DateTimeField()),
+                        ('price', models.FloatField()),
+                        ('amount', models.FloatField()),
+                        ('side', models.SmallIntegerField()),
+                    ],
+                ),
+                migrations.CreateModel(
+                    name='TradeBucket',
+                    fields=[
+                        ('pk', models.CompositePrimaryKey('exchange', 'symbol', 'interval_ms', 'started_at', blank=True, editable=False, primary_key=True, serialize=False)),
+                        ('exchange', models.CharField(max_length=32)),
+                        ('symbol', models.CharField(max_length=32)),
+                        ('interval_ms', models.IntegerField()),
+                        ('started_at', models.DateTimeField()),
+                        ('open', models.FloatField()),
+                        ('high', models.FloatField()),
+                        ('low', models.FloatField()),
+                        ('close', models.FloatField()),
+                        ('volume', models.FloatField(null=True)),
+                        ('trades_count', models.IntegerField()),
+                        ('alfa_diff', models.FloatField()),
+                    ],
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import models
+
+
+class Trade(models.Model):
+    """Сырой трейд. Таблица секционирована по дням (traded_at), см. миграцию 0001."""
+
+    pk = models.CompositePrimaryKey("exchange", "symbol", "trade_id", "traded_at")
+    exchange = models.CharField(max_length=32)
+    symbol = models.CharField(max_length=32)
+    trade_id = models.BigIntegerField()
+    traded_at = models.DateTimeField()
+    price = models.FloatField()
+    amount = models.FloatField()
+    side = models.SmallIntegerField()  # 1 - buy, -1 - sell, 0 - неизвестно
+
+    def __str__(self):
+        return f"{self.symbol} #{self.trade_id} {self.price}"
+
+
+class TradeBucket(models.Model):
+    """Агрегат трейдов за интервал. Таблица секционирована по дням (started_at)."""
+
+    pk = models.CompositePrimaryKey("exchange", "symbol", "interval_ms", "started_at")
+    exchange = models.CharField(max_length=32)
+    symbol = models.CharField(max_length=32)
+    interval_ms = models.IntegerField()
+    started_at = models.DateTimeField()
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.FloatField(null=True)
+    trades_count = models.IntegerField()
+    alfa_diff = models.FloatField()
+
+    def __str__(self):
+        return f"{self.symbol} {self.started_at} {self.close}"
@@ -0,0 +1,150 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .chart_reporter import ChartReporter
+from .trade_engine.trade_engine import TradeEngine
+from .trade_source import load_trades
+
+BATCH_SIZE = 1000  # Сколько трейдов отдаём движку за раз
+BACKTEST_LIMIT = 10000  # Размер TradeBuffer в прогоне
+
+
+def init_worker():
+    import django
+    import matplotlib
+    matplotlib.use('Agg')
+    django.setup()
+
+
+class BacktestRecorder:
+    """Копит по каждому закрытому бакету время, alfa_diff и сигналы уровней."""
+
+    def __init__(self):
+        self.started = []
+        self.alfa_diffs = []
+        self.signals = []
+        self.closes = []
+
+    def on_bucket(self, start_ms: int, alfa_diff: float, signals: np.ndarray, close: float | None = None):
+        self.started.append(start_ms)
+        self.alfa_diffs.append(alfa_diff)
+        self.signals.append(signals)
+        self.closes.append(np.nan if close is None else close)
+
+    def __len__(self):
+        return len(self.started)
+
+    def save(self, path):
+        np.savez(
+            path,
+            start_ms=np.array(self.started, dtype=np.int64),
+            alfa_diff=np.array(self.alfa_diffs, dtype=np.float64),
+            signals=np.array(self.signals, dtype=np.int8).reshape(len(self), -1),
+            close=np.array(self.closes, dtype=np.float64),
+        )
+
+
+class ReportArchive:
+    """Подменяет TelegramNotifier в бэктесте: отчёты ложатся PNG в каталог, в сеть ничего не уходит.
+
+    Без output_dir отчёты только считаются.
+    """
+
+    def __init__(self, pair_name, output_dir=None):
+        self.reporter = ChartReporter(pair_name, archive_dir=output_dir) if output_dir else None
+        self.saved = 0
+
+    def send_photo(self, caption: str, photo: bytes, key=None) -> bool:
+        if self.reporter is not None:
+            self.reporter.archive(photo, 'report')
+        self.saved += 1
+        return True
+
+    def send_message(self, text: str) -> bool:
+        return True
+
+
+async def replay(engine: TradeEngine, trades: dict, batch_size=BATCH_SIZE):
+    # Пачка не больше буфера, иначе стратегии не увидят её начало
+    batch_size = min(batch_size, engine.trades.capacity)
+    columns = (trades['id'], trades['timestamp'], trades['price'], trades['amount'], trades['side'])
+    for start in range(0, len(columns[0]), batch_size):
+        await engine.add_arrays(*(column[start:start + batch_size] for column in columns))
+
+
+def simulate(trades: dict, pair_name: str, params=None, batch_size=BATCH_SIZE, reports=False, report_dir=None):
+    """Один прогон трейдов через свежий TradeEngine. params уходят стратегиям через config['params'].
+
+    Отчёты рисуются прямо в прогоне и пишутся в report_dir, в Telegram ничего не отправляется.
+    """
+    recorder = BacktestRecorder()
+    engine = TradeEngine({
+        'enabled_strategies': ['GigaStrategy'],
+        'stock_name': 'backtest',
+        'pair_name': pair_name,
+        'limit': BACKTEST_LIMIT,
+        'virtual_clock': True,
+        'recorder': recorder,
+        'notifier': ReportArchive(pair_name, report_dir),
+        'report_schedule': {'enabled': reports},
+        'params': params or {},
+    })
+
+    started = time.perf_counter()
+    asyncio.run(replay(engine, trades, batch_size))
+    return engine, recorder, time.perf_counter() - started
+
+
+def run_backtest(path, output_dir, pair_name=None, params=None, batch_size=BATCH_SIZE, reports=False) -> dict:
+    """Прогоняет файл трейдов через TradeEngine и пишет сигналы и diffs в output_dir."""
+    path = Path(path)
+    pair_name = pair_name or path.stem
+    name = f"{pair_name.replace('/', '_')}{params_suffix(params)}"
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    trades = load_trades(path)
+    report_dir = output_dir / f"{name}_reports" if reports else None
+    engine, recorder, elapsed = simulate(trades, pair_name, params, batch_size, reports, report_dir)
+
+    signals_path = output_dir / f"{name}_signals.npz"
+    diffs_path = output_dir / f"{name}_diffs.npz"
+    recorder.save(signals_path)
+    np.savez(diffs_path, **engine.snapshot_state())
+
+    count = len(trades['timestamp'])
+    return {
+        'name': name,
+        'trades': count,
+        'buckets': len(recorder),
+        'seconds': elapsed,
+        'trades_per_second': count / elapsed if elapsed else 0.0,
+        'signals': str(signals_path),
+        'diffs': str(diffs_path),
+        'reports': engine.notifier.saved,
+    }
+
+
+def params_suffix(params) -> str:
+    if not params:
+        return ''
+    return '_' + '_'.join(f'{key}={value}' for key, value in sorted(params.items()))
+
+
+def run_many(jobs, workers=0):
+    """jobs - словари аргументов run_backtest. Отдаёт сводки по мере готовности."""
+    if workers <= 0:
+        for job in jobs:
+            yield run_backtest(**job)
+        return
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker) as pool:
+        futures = [pool.submit(run_backtest, **job) for job in jobs]
+        for future in futures:
+            yield future.result()
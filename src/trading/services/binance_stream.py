@@ -1,87 +1,202 @@
 import asyncio
+import time
 import ccxt.pro
 import aiohttp
 
+from .notifier import telegram_rate_limiter
+from .report_executor import ReportExecutor
+from .symbol_universe import SymbolUniverse
 from .trade_engine.trade_engine import TradeEngine
 
-MIN_USDT_VOLUME = 1000000  # Минимальный объём торгов в USDT за 24ч
-BANNED_PAIRS = {"TUSD/USDT", "BUSD/USDT", "USDC/USDT"}  # Чёрный список пар
 MIN_PAIR_COUNT = 1  # Минимальное количество пар для обработки
+RECONNECT_DELAY = 1  # Первая пауза после ошибки сокета, дальше удваивается
+MAX_RECONNECT_DELAY = 60
+BACKFILL_PAGE = 1000  # Максимум, который отдаёт /api/v3/historicalTrades за раз
+MAX_BACKFILL_PAGES = 10
 
 
 class BinanceBatchTradeStream:
-    def __init__(self, limit=10000, batch_size=50, delay_between_batches=5):
+    def __init__(
+        self,
+        limit=10000,
+        batch_size=50,
+        delay_between_batches=5,
+        symbols=None,
+        max_pairs=MIN_PAIR_COUNT,
+        report_executor=None,
+        report_rate_limiter=None,
+        throughput_meter=None,
+        backfill_source=None,
+        tick_writer=None,
+        snapshot_store=None,
+        cross_pair=None,
+        notifier=None,
+    ):
         self.exchange = ccxt.pro.binance()
         self.batch_size = batch_size
         self.delay_between_batches = delay_between_batches
         self.limit = limit
+        self.symbols = symbols  # Готовый список пар шарда, иначе берём ликвидные с биржи
+        self.max_pairs = max_pairs
         self.running = False
         self.apps = {}
+        self.tasks = {}  # symbol -> задача stream_symbol
+        # Executor и лимитер могут быть общими для нескольких соединений одного процесса
+        self.owns_executor = report_executor is None
+        self.report_executor = report_executor or ReportExecutor()
+        self.report_rate_limiter = report_rate_limiter or telegram_rate_limiter()
+        self.throughput_meter = throughput_meter  # ThroughputMeter в быстром режиме
+        # async (symbol, from_id, limit) -> трейды начиная с from_id; по умолчанию REST биржи
+        self.backfill_source = backfill_source or self.fetch_trades_from_id
+        self.tick_writer = tick_writer  # TickWriter, если трейды пишем в Postgres
+        self.snapshot_store = snapshot_store  # EngineSnapshotStore для тёплого старта
+        self.cross_pair = cross_pair  # CrossPairIndicators, общий для всех соединений процесса
+        self.notifier = notifier  # TelegramNotifier, общий для всех соединений процесса
+        # Без готового списка пары берём из SymbolUniverse; он один на стрим и закрывается в run()
+        self.universe = SymbolUniverse(exchange=self.exchange, max_pairs=max_pairs) if symbols is None else None
 
     async def fetch_usdt_symbols(self):
-        markets = await self.exchange.load_markets()
-        tickers = await self.exchange.fetch_tickers()
-
-        symbols = []
-        for symbol, market in markets.items():
-            if not symbol.endswith('/USDT') or not market['active']:
-                continue
-            if symbol in BANNED_PAIRS:
-                continue
-
-            ticker = tickers.get(symbol)
-            if not ticker:
-                continue
-
-            volume = ticker.get('quoteVolume', 0)
-            if volume and volume >= MIN_USDT_VOLUME:
-                symbols.append(symbol)
-
-        if MIN_PAIR_COUNT > 0:
-            symbols = symbols[:MIN_PAIR_COUNT]
-        print(f"Found {len(symbols)} liquid USDT pairs (min vol: {MIN_USDT_VOLUME})")
-        return symbols
+        return await self.universe.symbols()
+
+    def add_symbol(self, symbol):
+        """Подписаться на пару на ходу. Пока стрим не запущен, задачу не создаём: пару подпишет run()."""
+        task = self.tasks.get(symbol)
+        if task is not None and task.done():
+            del self.tasks[symbol]
+        if self.running and symbol not in self.tasks:
+            self.tasks[symbol] = asyncio.create_task(self.stream_symbol(symbol))
+
+    async def remove_symbol(self, symbol):
+        """Отписаться от пары на ходу: задача отменяется, движок закрывается."""
+        task = self.tasks.pop(symbol, None)
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if hasattr(self.exchange, 'un_watch_trades'):
+            try:
+                await self.exchange.un_watch_trades(symbol)
+            except Exception as e:
+                print(f"[{symbol}] Unsubscribe failed: {e}")
+        print(f"Unsubscribed from {symbol}")
+
+    async def close_symbols(self):
+        tasks = list(self.tasks.values())
+        self.tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
     async def stream_symbol(self, symbol):
         config = {
             'enabled_strategies': ['GigaStrategy'],
             'pair_name': symbol,
             'stock_name': "binance",
-            'limit': 10000, # Количество хранимых трейдов
+            'limit': self.limit, # Количество хранимых трейдов
+            'report_executor': self.report_executor,
+            'report_rate_limiter': self.report_rate_limiter,
+            'tick_writer': self.tick_writer,
+            'strategy_mode': 'queued',  # Медленная стратегия не держит чтение сокета
+            'cross_pair': self.cross_pair,
+            'notifier': self.notifier,
         }
         engine = TradeEngine(config)
+        self.apps[symbol] = engine
+        if self.snapshot_store is not None:
+            try:
+                await self.snapshot_store.restore(engine)
+            except Exception as e:
+                print(f"[{symbol}] Snapshot restore failed: {e}")
+            self.snapshot_store.register(engine)
 
         print(f"Subscribing to {symbol}")
-        while self.running:
-            # try:
-                trade = await self.exchange.watch_trades(symbol)
-                if isinstance(trade, list):
-                    trade = trade[-1]
-                await engine.add(trade)
-            # except Exception as e:
-            #     print(f"[{symbol}] WebSocket error: {e}")
-            #     await asyncio.sleep(3)
+        delay = RECONNECT_DELAY
+        try:
+            while self.running:
+                try:
+                    trades = await self.exchange.watch_trades(symbol)
+                    if not isinstance(trades, list):
+                        trades = [trades]
+                    await self.handle_trades(engine, symbol, trades)
+                    delay = RECONNECT_DELAY
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"[{symbol}] WebSocket error: {e}, retry in {delay}s")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RECONNECT_DELAY)
+        finally:
+            engine.close()
+            if self.snapshot_store is not None:
+                self.snapshot_store.unregister(engine)
+            if self.apps.get(symbol) is engine:
+                del self.apps[symbol]
+
+    async def handle_trades(self, engine, symbol, trades):
+        if not trades:
+            return
+        started = time.perf_counter()
+        # Дыра в id (переподключение, потерянные кадры) - сначала догружаем пропущенное
+        first_id = int(trades[0]['id'] or 0)
+        if engine.trades.last_id > 0 and engine.trades.last_id + 1 < first_id:
+            await self.backfill(engine, symbol, until_id=first_id)
+        await engine.add_many(trades)
+        if self.throughput_meter is not None:
+            self.throughput_meter.observe(len(trades), time.perf_counter() - started)
+
+    async def fetch_trades_from_id(self, symbol, from_id, limit=BACKFILL_PAGE):
+        return await self.exchange.fetch_trades(
+            symbol,
+            limit=limit,
+            params={'fetchTradesMethod': 'publicGetHistoricalTrades', 'fromId': from_id},
+        )
+
+    async def backfill(self, engine, symbol, until_id):
+        """Догружает трейды с last_id + 1 до until_id и отдаёт их движку одной пачкой."""
+        next_id = engine.trades.last_id + 1
+        missed = []
+        for _ in range(MAX_BACKFILL_PAGES):
+            page = await self.backfill_source(symbol, next_id, BACKFILL_PAGE)
+            if not page:
+                break
+            missed.extend(trade for trade in page if int(trade['id']) < until_id)
+            next_id = int(page[-1]['id']) + 1
+            if next_id >= until_id or len(page) < BACKFILL_PAGE:
+                break
+
+        print(f"[{symbol}] Backfilled {len(missed)} trades ({until_id - engine.trades.last_id - 1} missed)")
+        return await engine.add_many(missed)
 
     async def run(self):
         self.running = True
         try:
-            symbols = await self.fetch_usdt_symbols()
+            await self.report_executor.start()
+            symbols = self.symbols if self.symbols is not None else await self.fetch_usdt_symbols()
             batches = [symbols[i:i + self.batch_size] for i in range(0, len(symbols), self.batch_size)]
 
             for i, batch in enumerate(batches):
                 print(f"▶️ Starting batch {i + 1}/{len(batches)}: {len(batch)} symbols")
                 for symbol in batch:
-                    asyncio.create_task(self.stream_symbol(symbol))
+                    self.add_symbol(symbol)
                 await asyncio.sleep(self.delay_between_batches)
 
             while self.running:
                 await asyncio.sleep(10)
+                if self.owns_executor:
+                    print(f"📊 Reports: {self.report_executor.metrics()}")
 
         except Exception as e:
             print(f"🚨 Error in run(): {e}")
 
         finally:
+            # Шард перезапустят с новым стримом: задачи пар этого стрима не должны его пережить
+            self.running = False
+            await self.close_symbols()
             print("🛑 Closing Binance connection")
+            if self.owns_executor:
+                await self.report_executor.stop()
+            if self.universe is not None:
+                await self.universe.stop()
             await self.exchange.close()
 
     async def stop(self):
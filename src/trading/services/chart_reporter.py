@@ -1,66 +1,124 @@
-from datetime import datetime
-import matplotlib.pyplot as plt
+import io
 import os
-from PIL import Image
+from datetime import datetime, timezone
+
 import numpy as np
-import asyncio
 from django.conf import settings
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
 
+from .stripe_renderer import render_stripes
 from .telega import send_telegram_image, send_telegram_message
 
+WHITE = 255
+CHART_SIZE = (12, 4)  # Дюймы; при dpi 100 это 1200 px по ширине
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def decimate(times, values, columns: int):
+    """Min/max на столбец пикселей: не больше 2 * columns точек, крайние значения сохраняются.
+
+    times - отсортированные datetime64 или числа, values - цены.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    if not finite.all():
+        times, values = times[finite], values[finite]
+    if len(values) <= 2 * columns:
+        return times, values
+
+    ticks = times.astype(np.int64)
+    span = ticks[-1] - ticks[0] + 1
+    column = (ticks - ticks[0]) * columns // span
+    # Внутри столбца по возрастанию цены: первый элемент - минимум, последний - максимум
+    order = np.lexsort((values, column))
+    edges = np.flatnonzero(np.diff(column[order])) + 1
+    firsts = np.concatenate(([0], edges))
+    lasts = np.concatenate((edges - 1, [len(order) - 1]))
+    keep = np.unique(np.concatenate((order[firsts], order[lasts])))
+    return times[keep], values[keep]
+
+
+def stack_vertically(images) -> np.ndarray | None:
+    """Склеивает RGB-массивы сверху вниз, узкие центрируются на белом фоне."""
+    images = [image for image in images if image is not None]
+    if not images:
+        return None
+    width = max(image.shape[1] for image in images)
+    result = np.full((sum(image.shape[0] for image in images), width, 3), WHITE, dtype=np.uint8)
+    y = 0
+    for image in images:
+        x = (width - image.shape[1]) // 2
+        result[y:y + image.shape[0], x:x + image.shape[1]] = image
+        y += image.shape[0]
+    return result
+
 
 class ChartReporter:
-    def __init__(self, pair_name):
+    """Графики пары целиком в памяти: фигуры рисуются Agg в массивы,
+    склеиваются NumPy и уходят в Telegram байтами PNG. На диск пишется
+    только архив, если задан archive_dir (по умолчанию settings.CHART_ARCHIVE_DIR).
+    """
+
+    def __init__(self, pair_name, archive_dir=None):
         self.pair_name = pair_name
-        self.tmp_dir = os.path.join(settings.BASE_DIR, "tmp")
-        os.makedirs(self.tmp_dir, exist_ok=True)
         self.safe_pair_name = self.pair_name.replace("/", "_")
+        self.archive_dir = archive_dir or getattr(settings, 'CHART_ARCHIVE_DIR', None)
 
-    async def draw_valuer_stripe(self, valuers: list, path: str, width: int = 6000, height: int = 64, k: float = 0.001):
-        full_width = width + 100  # +100px отступ слева
-        save_path = os.path.join(self.tmp_dir, path)
-
-        n = len(valuers)
-        pixels = np.full((height, full_width, 3), fill_value=255, dtype=np.uint8)
-
-        for idx, val in enumerate(valuers):
-            x_start = int(idx * width / n) + 100
-            x_end = int((idx + 1) * width / n) + 100
-            color = (128, 128, 128)  # gray
-
-            if val.v > k:
-                color = (0, 255, 0)  # green
-            elif val.v < -k:
-                color = (255, 0, 0)  # red
-
-            for x in range(x_start, min(x_end, full_width)):
-                pixels[:, x] = color
-
-        plt.figure(figsize=(full_width / 100, height / 100), dpi=100)
-        plt.imshow(pixels, aspect='auto')
-        plt.axis('off')
-        plt.savefig(save_path, bbox_inches='tight', pad_inches=0)
-        plt.close()
+    def archive(self, png: bytes, kind: str) -> str | None:
+        """Кладёт PNG в архив под уникальным именем пара_вид_время."""
+        if not self.archive_dir:
+            return None
+        os.makedirs(self.archive_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(self.archive_dir, f"{self.safe_pair_name}_{kind}_{stamp}_{os.getpid()}.png")
+        with open(path, "wb") as f:
+            f.write(png)
+        return path
+
+    def draw_valuer_stripes(self, levels, width: int = 6000, height: int = 64, k: float = 0.001) -> bytes:
+        """Все уровни одной картинкой: полосы строятся в NumPy и кодируются в PNG один раз."""
+        png = encode_png(render_stripes(levels, width, height, k))
+        self.archive(png, "stripes")
+        return png
+
+    def draw_valuer_stripe(self, values, width: int = 6000, height: int = 64, k: float = 0.001) -> bytes:
+        return self.draw_valuer_stripes([values], width, height, k)
 
     def generate_and_send(self, trades, alfa_diff, beta_diff):
-        path1 = os.path.join(self.tmp_dir, f"{self.safe_pair_name}_trades.png")
-        path2 = os.path.join(self.tmp_dir, f"{self.safe_pair_name}_alfa.png")
-        path3 = os.path.join(self.tmp_dir, f"{self.safe_pair_name}_beta.png")
-        final_path = os.path.join(self.tmp_dir, f"{self.safe_pair_name}.png")
-
-        self.plot_and_save_array(trades, "Trades", path1, mode="line")
-        self.plot_and_save_array(alfa_diff, "Alfa Diff", path2, mode="dots")
-        self.plot_and_save_array(beta_diff, "Beta Diff", path3, mode="dots")
-
-        result = self.concatenate_images_vertically([path1, path2, path3], final_path)
-
-        caption = f"{self.safe_pair_name} — графики: цена, альфа, бета"
-        if result:
-            send_telegram_image(caption, file_path=final_path)
-        else:
+        image = stack_vertically([
+            self.plot_array(trades, "Trades", mode="line"),
+            self.plot_array(alfa_diff, "Alfa Diff", mode="dots"),
+            self.plot_array(beta_diff, "Beta Diff", mode="dots"),
+        ])
+        if image is None:
             send_telegram_message(f"Ошибка генерации графиков для {self.safe_pair_name}")
+            return
+
+        png = encode_png(image)
+        self.archive(png, "charts")
+        send_telegram_image(f"{self.safe_pair_name} — графики: цена, альфа, бета", png)
 
     def extract_time_price(self, data):
+        """Время (datetime64[ms]) и цены массивами NumPy."""
+        if hasattr(data, 'timestamps'):
+            # TradeBuffer: колонки уже лежат в массивах, ничего не обходим
+            return data.timestamps.astype('datetime64[ms]'), data.prices
+
+        try:
+            # Обычный случай - трейды ccxt с timestamp в мс
+            times = np.fromiter((entry["timestamp"] for entry in data), np.int64, len(data))
+            prices = np.fromiter((entry["price"] for entry in data), np.float64, len(data))
+            return times.astype('datetime64[ms]'), prices
+        except (KeyError, TypeError, ValueError):
+            pass
+
         times = []
         prices = []
         for entry in data:
@@ -73,56 +131,51 @@ class ChartReporter:
                     time = datetime.utcfromtimestamp(entry["timestamp"] / 1000)
                 else:
                     continue
-                times.append(time)
+                if time.tzinfo is not None:
+                    time = time.astimezone(timezone.utc).replace(tzinfo=None)
+                times.append(np.datetime64(time, 'ms'))
                 prices.append(entry["price"])
             except Exception as e:
                 print(f"[extract_time_price] Пропущен элемент: {entry}, ошибка: {e}")
-        return times, prices
+        return np.array(times, dtype='datetime64[ms]'), np.array(prices, dtype=np.float64)
 
-    def plot_and_save_array(self, data, label, save_path, mode="line"):
-        times, prices = self.extract_time_price(data)
-        if not times or not prices:
-            return
+    def plot_array(self, data, label, mode="line") -> np.ndarray | None:
+        """RGB-массив графика; Figure без pyplot, поэтому нет глобального состояния и окон.
 
-        max_price = max(prices)
-        min_price = min(prices)
-        y_min = min_price * 0.95
-        y_max = max_price * 1.05
+        Точки прореживаются до min/max на столбец пикселей, так что цена
+        отрисовки не зависит от размера буфера.
+        """
+        figure = Figure(figsize=CHART_SIZE)
+        times, prices = self.extract_time_price(data)
+        times, prices = decimate(times, prices, int(figure.get_figwidth() * figure.dpi))
+        if len(times) == 0 or len(prices) == 0:
+            return None
 
-        plt.figure(figsize=(12, 4))
+        canvas = FigureCanvasAgg(figure)
+        axes = figure.add_subplot()
         if mode == "line":
-            plt.plot(times, prices, label=label, linewidth=2)
+            axes.plot(times, prices, label=label, linewidth=2)
         elif mode == "dots":
-            plt.scatter(times, prices, label=label, s=10)
+            axes.scatter(times, prices, label=label, s=10)
         else:
             raise ValueError(f"Неизвестный режим графика: {mode}")
 
-        plt.xlabel('Time')
-        plt.ylabel('Price')
-        plt.title(f'{label} — {self.pair_name}')
-        plt.ylim(y_min, y_max)
-        plt.grid(True)
-        plt.tight_layout()
-        plt.savefig(save_path)
-        plt.close()
-
-    async def concatenate_images_vertically(self, image_names, save_name):
-        save_path = os.path.join(self.tmp_dir, save_name)
-        images = [Image.open(os.path.join(self.tmp_dir, name)) for name in image_names]
-        if not images:
+        axes.set_xlabel('Time')
+        axes.set_ylabel('Price')
+        axes.set_title(f'{label} — {self.pair_name}')
+        axes.set_ylim(np.min(prices) * 0.95, np.max(prices) * 1.05)
+        axes.grid(True)
+        figure.tight_layout()
+        canvas.draw()
+        return np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
+    def plot_and_save_array(self, data, label, save_path=None, mode="line") -> bytes | None:
+        """PNG графика; на диск пишет, только если передан save_path."""
+        image = self.plot_array(data, label, mode)
+        if image is None:
             return None
-
-        widths, heights = zip(*(img.size for img in images))
-        total_height = sum(heights)
-        max_width = max(widths)
-
-        result = Image.new('RGB', (max_width, total_height), color=(255, 255, 255))
-
-        y_offset = 0
-        for img in images:
-            x_offset = (max_width - img.width) // 2  # центрируем по ширине
-            result.paste(img, (x_offset, y_offset))
-            y_offset += img.height
-
-        result.save(save_path)
-        return save_path
\ No newline at end of file
+        png = encode_png(image)
+        if save_path is not None:
+            with open(save_path, "wb") as f:
+                f.write(png)
+        return png
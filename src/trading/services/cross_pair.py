@@ -0,0 +1,184 @@
+import asyncio
+
+import numpy as np
+
+CROSS_PAIR_INTERVAL = 2  # Как часто считаем, секунды - граница бакета агрегатора
+EMA_PERIODS = (12, 26)
+AMA_PERIOD = 10
+ATR_PERIOD = 14
+
+
+class CrossPairIndicators:
+    """EMA/AMA/ATR по закрытым бакетам сразу для всех пар процесса.
+
+    Движки только складывают закрытые бакеты в collect(), раз в тик step()
+    собирает их в матрицы пары x время и обновляет состояние всех пар
+    векторно: цикл Python идёт по бакетам тика, а не по парам. Состояние
+    каждой пары - строка в общих массивах; после step() обновлённые значения
+    отдаются движкам через engine.on_cross_indicators().
+    """
+
+    def __init__(
+        self,
+        ema_periods=EMA_PERIODS,
+        ama_period=AMA_PERIOD,
+        ama_fast=2,
+        ama_slow=30,
+        atr_period=ATR_PERIOD,
+        interval=CROSS_PAIR_INTERVAL,
+        capacity=64,
+    ):
+        self.ema_periods = tuple(ema_periods)
+        self.ema_alpha = np.array([2 / (period + 1) for period in self.ema_periods])
+        self.ama_period = ama_period
+        self.ama_fast = 2 / (ama_fast + 1)
+        self.ama_slow = 2 / (ama_slow + 1)
+        self.atr_period = atr_period
+        self.interval = interval
+
+        self.rows = {}  # engine -> строка
+        self.engines = {}  # строка -> engine
+        self.free = []
+        self.pending = {}  # строка -> список пачек (close, high, low)
+        self.size = 0
+        self.task = None
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        shapes = {
+            'ema': (len(self.ema_periods),),
+            'ama_window': (self.ama_period,),  # Последние period цен, старые слева
+            'ama_count': (),
+            'ama': (),
+            'prev_close': (),
+            'tr_sum': (),
+            'tr_count': (),
+            'atr': (),
+        }
+        old = getattr(self, 'state', None)
+        self.state = {}
+        for name, shape in shapes.items():
+            fill = 0.0 if name in ('ama_count', 'tr_sum', 'tr_count') else np.nan
+            self.state[name] = np.full((capacity, *shape), fill)
+            if old is not None:
+                self.state[name][:len(old[name])] = old[name]
+        self.capacity = capacity
+
+    def reset_row(self, row):
+        for name, column in self.state.items():
+            column[row] = 0.0 if name in ('ama_count', 'tr_sum', 'tr_count') else np.nan
+
+    def register(self, engine) -> int:
+        if engine in self.rows:
+            return self.rows[engine]
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self.allocate(self.capacity * 2)
+            row = self.size
+            self.size += 1
+        self.rows[engine] = row
+        self.engines[row] = engine
+        return row
+
+    def unregister(self, engine):
+        row = self.rows.pop(engine, None)
+        if row is not None:
+            del self.engines[row]
+            self.pending.pop(row, None)
+            self.reset_row(row)
+            self.free.append(row)
+
+    def collect(self, engine, buckets):
+        """Закрытые бакеты движка (колонки BUCKET_COLUMNS) до следующего step()."""
+        row = self.rows.get(engine)
+        if row is None or len(buckets['close']) == 0:
+            return
+        self.pending.setdefault(row, []).append((buckets['close'], buckets['high'], buckets['low']))
+
+    def step(self) -> int:
+        """Обновляет все пары с новыми бакетами, возвращает число строк."""
+        if not self.pending:
+            return 0
+        rows = np.fromiter(self.pending, np.int64, len(self.pending))
+        batches = [tuple(np.concatenate(parts) for parts in zip(*self.pending[row])) for row in rows.tolist()]
+        self.pending = {}
+
+        # Матрицы пары x время, короткие ряды добиты NaN и выключены маской
+        steps = max(len(closes) for closes, _, _ in batches)
+        closes, highs, lows = (np.full((len(rows), steps), np.nan) for _ in range(3))
+        for index, (close, high, low) in enumerate(batches):
+            closes[index, :len(close)] = close
+            highs[index, :len(close)] = high
+            lows[index, :len(close)] = low
+
+        state = {name: column[rows] for name, column in self.state.items()}
+        for t in range(steps):
+            self.update(state, ~np.isnan(closes[:, t]), closes[:, t], highs[:, t], lows[:, t])
+        for name, column in state.items():
+            self.state[name][rows] = column
+        self.publish(rows)
+        return len(rows)
+
+    def publish(self, rows):
+        for row in rows.tolist():
+            engine = self.engines.get(row)
+            if engine is not None:
+                engine.on_cross_indicators(self.row_values(row))
+
+    def update(self, state, mask, close, high, low):
+        # EMA: первая цена - затравка, дальше рекурсия
+        ema = state['ema']
+        seeded = np.where(np.isnan(ema), close[:, None], ema + self.ema_alpha * (close[:, None] - ema))
+        ema[mask] = seeded[mask]
+
+        # AMA Кауфмана, как AMAIndicator: окно последних period цен
+        window = state['ama_window']
+        window[mask, :-1] = window[mask, 1:]
+        window[mask, -1] = close[mask]
+        state['ama_count'][mask] += 1
+        active = mask & (state['ama_count'] > self.ama_period)
+        change = np.abs(close - window[:, 0])
+        volatility = np.nansum(np.abs(np.diff(window, axis=1)), axis=1)
+        er = np.divide(change, volatility, out=np.zeros_like(change), where=volatility > 0)
+        sc = (er * (self.ama_fast - self.ama_slow) + self.ama_slow) ** 2
+        ama = state['ama']
+        ama[active] = np.where(np.isnan(ama), close, ama + sc * (close - ama))[active]
+
+        # ATR Уайлдера по true range бакета
+        prev_close = state['prev_close']
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        atr = state['atr']
+        seeding = mask & np.isnan(atr)
+        state['tr_sum'][seeding] += true_range[seeding]
+        state['tr_count'][seeding] += 1
+        ready = seeding & (state['tr_count'] >= self.atr_period)
+        atr[ready] = state['tr_sum'][ready] / self.atr_period
+        smoothing = mask & ~seeding
+        atr[smoothing] += (true_range[smoothing] - atr[smoothing]) / self.atr_period
+        prev_close[mask] = close[mask]
+
+    def values(self, engine) -> dict:
+        return self.row_values(self.rows[engine])
+
+    def row_values(self, row) -> dict:
+        values = {f'ema_{period}': float(self.state['ema'][row, i]) for i, period in enumerate(self.ema_periods)}
+        values['ama'] = float(self.state['ama'][row])
+        values['atr'] = float(self.state['atr'][row])
+        return values
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.step()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
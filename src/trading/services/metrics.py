@@ -0,0 +1,73 @@
+import time
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с корзинами по степеням двойки микросекунд."""
+
+    def __init__(self, buckets=32):
+        self.buckets = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        micros = seconds * 1_000_000
+        index = min(int(micros).bit_length(), len(self.buckets) - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += micros
+        self.max = max(self.max, micros)
+
+    def percentile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попал q-й перцентиль, в мкс."""
+        if self.count == 0:
+            return 0.0
+        threshold = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= threshold:
+                return float(min(2 ** index, self.max))
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'avg_us': round(self.total / self.count, 1) if self.count else 0.0,
+            'p50_us': round(self.percentile(50), 1),
+            'p99_us': round(self.percentile(99), 1),
+            'max_us': round(self.max, 1),
+        }
+
+
+class ThroughputMeter:
+    """Сколько сообщений/трейдов в секунду проходит и сколько стоит обработка одного."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.started = self.clock()
+        self.messages = 0
+        self.trades = 0
+        self.handling = LatencyHistogram()
+
+    def observe(self, trades: int, seconds: float):
+        self.messages += 1
+        self.trades += trades
+        self.handling.observe(seconds)
+
+    def report(self) -> dict:
+        """Сводка за окно с прошлого вызова, окно начинается заново."""
+        elapsed = max(self.clock() - self.started, 1e-9)
+        summary = self.handling.summary()
+        result = {
+            'messages_per_s': round(self.messages / elapsed, 1),
+            'trades_per_s': round(self.trades / elapsed, 1),
+            'handling_avg_us': summary['avg_us'],
+            'handling_p99_us': summary['p99_us'],
+            'handling_max_us': summary['max_us'],
+        }
+        self.reset()
+        return result
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+
+import aiohttp
+from django.conf import settings
+
+from .metrics import LatencyHistogram
+from .rate_limiter import TokenBucket
+from .telega import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+
+TELEGRAM_API = "https://api.telegram.org"
+MESSAGES_PER_MINUTE = 20  # Лимит Telegram на сообщения в одну группу/канал
+MESSAGES_BURST = 3
+MAX_QUEUE = 100  # Сколько отправок ждут в очереди, дальше новые отбрасываются
+MAX_RETRIES = 3
+RETRY_DELAY = 1  # Первая пауза перед повтором, дальше удваивается
+MEDIA_GROUP_LIMIT = 10  # Больше фото в одну медиагруппу Telegram не принимает
+MESSAGE_LIMIT = 4096  # Максимальная длина текста сообщения
+DIGEST_LIMIT = 50  # Сколько отчётов держит дайджест, дальше вытесняются самые старые
+
+
+def telegram_rate_limiter() -> TokenBucket:
+    """Лимит по settings.TELEGRAM_MESSAGES_PER_MINUTE: и для отправки, и для общего бюджета отчётов пар."""
+    per_minute = getattr(settings, 'TELEGRAM_MESSAGES_PER_MINUTE', MESSAGES_PER_MINUTE)
+    return TokenBucket(rate=per_minute / 60, burst=MESSAGES_BURST)
+
+
+class TelegramError(Exception):
+    def __init__(self, status, description, retry_after=None):
+        super().__init__(f"{status}: {description}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TelegramNotifier:
+    """Асинхронная отправка в Telegram через одну aiohttp-сессию.
+
+    send_message/send_photo только кладут отправку в ограниченную очередь,
+    воркер отправляет её с учётом TokenBucket и повторяет при 429/5xx/обрыве
+    с удвоением паузы. В режиме дайджеста (digest_interval > 0) отчёты пар
+    копятся и раз в интервал уходят одной медиагруппой и одним сообщением;
+    от пары в дайджесте остаётся последний отчёт, всего не больше digest_limit.
+    """
+
+    def __init__(
+        self,
+        token=TELEGRAM_BOT_TOKEN,
+        chat_id=TELEGRAM_CHAT_ID,
+        base_url=TELEGRAM_API,
+        rate_limiter=None,
+        max_queue=MAX_QUEUE,
+        retries=MAX_RETRIES,
+        retry_delay=RETRY_DELAY,
+        digest_interval=0,
+        digest_limit=DIGEST_LIMIT,
+    ):
+        self.url = f"{base_url}/bot{token}"
+        self.chat_id = chat_id
+        self.rate_limiter = rate_limiter or telegram_rate_limiter()
+        self.queue = asyncio.Queue(max_queue)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.digest_interval = digest_interval
+        self.digest_limit = digest_limit
+        self.photos = OrderedDict()  # ключ пары -> (подпись, png) до следующего дайджеста
+        self.texts = deque(maxlen=digest_limit)
+        self.session = None
+        self.tasks = []
+
+        self.latency = LatencyHistogram()
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def send_message(self, text: str) -> bool:
+        if self.digest_interval > 0:
+            if len(self.texts) == self.digest_limit:
+                self.dropped += 1
+            self.texts.append(text)
+            return True
+        return self.enqueue('sendMessage', {'text': text})
+
+    def send_photo(self, caption: str, photo: bytes, key=None) -> bool:
+        """key - пара отчёта: в дайджесте новый отчёт пары заменяет прежний."""
+        if self.digest_interval > 0:
+            key = key or caption
+            if key in self.photos:
+                del self.photos[key]
+            elif len(self.photos) >= self.digest_limit:
+                self.photos.popitem(last=False)
+                self.dropped += 1
+            self.photos[key] = (caption, photo)
+            return True
+        return self.enqueue('sendPhoto', {'caption': caption}, {'photo': photo})
+
+    def enqueue(self, method, fields, files=None) -> bool:
+        try:
+            self.queue.put_nowait((method, fields, files or {}))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def flush(self) -> int:
+        """Собирает накопленное в дайджест, возвращает число поставленных отправок."""
+        queued = 0
+        photos = list(self.photos.values())
+        self.photos.clear()
+        for start in range(0, len(photos), MEDIA_GROUP_LIMIT):
+            group = photos[start:start + MEDIA_GROUP_LIMIT]
+            if len(group) == 1:
+                queued += self.enqueue('sendPhoto', {'caption': group[0][0]}, {'photo': group[0][1]})
+                continue
+            media = [
+                {'type': 'photo', 'media': f'attach://photo{i}', 'caption': caption}
+                for i, (caption, _) in enumerate(group)
+            ]
+            files = {f'photo{i}': photo for i, (_, photo) in enumerate(group)}
+            queued += self.enqueue('sendMediaGroup', {'media': json.dumps(media)}, files)
+
+        texts = list(self.texts)
+        self.texts.clear()
+        chunk = ""
+        for text in texts:
+            if chunk and len(chunk) + len(text) + 1 > MESSAGE_LIMIT:
+                queued += self.enqueue('sendMessage', {'text': chunk})
+                chunk = ""
+            chunk = f"{chunk}\n{text}" if chunk else text[:MESSAGE_LIMIT]
+        if chunk:
+            queued += self.enqueue('sendMessage', {'text': chunk})
+        return queued
+
+    async def post(self, method, fields, files):
+        form = aiohttp.FormData({'chat_id': self.chat_id, **fields})
+        for name, data in files.items():
+            form.add_field(name, data, filename=f'{name}.png', content_type='image/png')
+        async with self.session.post(f"{self.url}/{method}", data=form) as response:
+            try:
+                body = await response.json(content_type=None)
+            except ValueError:
+                # Прокси на 502/503 отвечает HTML - решаем по статусу, а не по телу
+                body = None
+            if not isinstance(body, dict):
+                raise TelegramError(response.status, f"не JSON ответ ({response.content_type})")
+            if response.status != 200 or not body.get('ok'):
+                retry_after = (body.get('parameters') or {}).get('retry_after')
+                raise TelegramError(response.status, body.get('description'), retry_after)
+            return body
+
+    async def deliver(self, method, fields, files):
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                return await self.post(method, fields, files)
+            except TelegramError as e:
+                # 4xx кроме 429 - ошибка в самом запросе, повтор не поможет
+                if (e.status != 429 and e.status < 500) or attempt == self.retries:
+                    raise
+                pause = e.retry_after or delay
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+                pause = delay
+            self.retried += 1
+            await asyncio.sleep(pause)
+            delay *= 2
+
+    async def worker(self):
+        while True:
+            method, fields, files = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                await self.deliver(method, fields, files)
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[Telegram] Ошибка {method}: {e}")
+            finally:
+                self.latency.observe(time.perf_counter() - started)
+                self.queue.task_done()
+
+    async def digest(self):
+        while True:
+            await asyncio.sleep(self.digest_interval)
+            self.flush()
+
+    async def start(self):
+        if self.session is not None:
+            return
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=4),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        self.tasks = [asyncio.create_task(self.worker())]
+        if self.digest_interval > 0:
+            self.tasks.append(asyncio.create_task(self.digest()))
+
+    async def stop(self, timeout=10):
+        """Дожидается отправки очереди (не дольше timeout) и закрывает сессию."""
+        if self.session is None:
+            return
+        self.flush()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[Telegram] Не отправлено при остановке: {self.queue.qsize()}")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.session.close()
+        self.session = None
+
+    def metrics(self) -> dict:
+        return {
+            'queue_depth': self.queue.qsize(),
+            'digest_pending': len(self.photos) + len(self.texts),
+            'sent': self.sent,
+            'retried': self.retried,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'latency': self.latency.summary(),
+        }
@@ -0,0 +1,110 @@
+import asyncio
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from .metrics import LatencyHistogram
+
+
+def init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+class ReportExecutor:
+    """Пул процессов для отрисовки и отправки отчётов вне event loop.
+
+    На каждую пару в очереди держится не больше одной задачи: новый отчёт
+    пары заменяет ещё не начатый старый (coalesce). Если очередь заполнена
+    отчётами других пар, новый отчёт отбрасывается (drop).
+    """
+
+    def __init__(self, workers=2, max_pending=32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = OrderedDict()  # ключ пары -> (job, args, callback)
+        self.in_flight = set()
+        self.pool = None
+        self.tasks = []
+        self.wakeup = asyncio.Event()
+
+        self.render_latency = LatencyHistogram()
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, key, job, *args, callback=None) -> bool:
+        if key in self.pending:
+            self.pending[key] = (job, args, callback)
+            self.coalesced += 1
+            return True
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+
+        self.pending[key] = (job, args, callback)
+        self.submitted += 1
+        self.wakeup.set()
+        return True
+
+    async def start(self):
+        if self.pool is not None:
+            return
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+        )
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def next_job(self):
+        for key in self.pending:
+            if key not in self.in_flight:
+                return key, self.pending.pop(key)
+        return None, None
+
+    async def worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, item = self.next_job()
+            if item is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            job, args, callback = item
+            self.in_flight.add(key)
+            started = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(self.pool, job, *args)
+                if callback is not None:
+                    callback(result)
+            except Exception as e:
+                self.failed += 1
+                print(f"[ReportExecutor] Ошибка отчёта {key}: {e}")
+            finally:
+                self.render_latency.observe(time.perf_counter() - started)
+                self.in_flight.discard(key)
+                self.wakeup.set()
+
+    def metrics(self) -> dict:
+        return {
+            'queue_depth': len(self.pending),
+            'in_flight': len(self.in_flight),
+            'submitted': self.submitted,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'render_latency': self.render_latency.summary(),
+        }
@@ -0,0 +1,26 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def ccxt_json_backend() -> str:
+    """Какой JSON-парсер ccxt использует для websocket-сообщений."""
+    from ccxt.async_support.base.ws import client
+    return client.json_parser.__name__
+
+
+def uvloop_factory():
+    try:
+        import uvloop
+    except ImportError:
+        logger.warning("uvloop не установлен, работаем на стандартном asyncio")
+        return None
+    return uvloop.new_event_loop
+
+
+def run(main, fast=False):
+    """asyncio.run, в быстром режиме - на uvloop."""
+    loop_factory = uvloop_factory() if fast else None
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        return runner.run(main)
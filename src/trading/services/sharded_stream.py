@@ -0,0 +1,290 @@
+import asyncio
+import contextlib
+import multiprocessing
+import zlib
+
+from . import runtime
+from .binance_stream import (
+    MIN_PAIR_COUNT,
+    BinanceBatchTradeStream,
+)
+from .cross_pair import CrossPairIndicators
+from .metrics import ThroughputMeter
+from .notifier import TelegramNotifier, telegram_rate_limiter
+from .report_executor import ReportExecutor
+from .snapshot_store import EngineSnapshotStore
+from .symbol_universe import SymbolUniverse
+from .tick_writer import TickWriter
+
+STREAMS_PER_CONNECTION = 50  # Сколько пар слушает одно websocket-соединение
+RESTART_DELAY = 5  # Пауза перед перезапуском упавшего шарда, секунды
+
+
+def split_symbols(symbols, streams_per_connection):
+    return [symbols[i:i + streams_per_connection] for i in range(0, len(symbols), streams_per_connection)]
+
+
+def partition_of(symbol, processes):
+    """Номер процесса пары: стабилен между перезапусками, поэтому новые пары процессы делят без переписки."""
+    return zlib.crc32(symbol.encode()) % processes
+
+
+def run_shard_process(connections, options):
+    """Точка входа процесса-шарда: свой event loop, свои соединения и TradeEngine."""
+    import django
+    django.setup()
+
+    stream = ShardedTradeStream(**options)
+    with contextlib.suppress(KeyboardInterrupt):
+        runtime.run(stream.run_connections(connections), fast=stream.fast)
+
+
+class ShardedTradeStream:
+    """Раскладывает пары по нескольким соединениям с биржей.
+
+    Каждое соединение - отдельный BinanceBatchTradeStream со своим
+    экземпляром ccxt. При processes > 0 соединения делятся между
+    процессами, у каждого свой event loop. Упавший шард перезапускается
+    сам по себе, остальные его не замечают. Набор пар берётся из
+    SymbolUniverse и меняется на ходу: каждый процесс сам подписывается
+    на новые пары своего раздела и отписывается от выпавших.
+    """
+
+    def __init__(
+        self,
+        streams_per_connection=STREAMS_PER_CONNECTION,
+        processes=0,
+        max_pairs=MIN_PAIR_COUNT,
+        limit=10000,
+        restart_delay=RESTART_DELAY,
+        fast=False,
+        persist=False,
+        snapshots=False,
+        partition=None,
+        digest_interval=0,
+        cross_pair=False,
+    ):
+        self.streams_per_connection = streams_per_connection
+        self.processes = processes
+        self.max_pairs = max_pairs
+        self.limit = limit
+        self.restart_delay = restart_delay
+        self.fast = fast  # uvloop + самоотчёт о пропускной способности
+        self.throughput_meter = ThroughputMeter() if fast else None
+        self.persist = persist  # Писать трейды и бакеты в Postgres
+        self.snapshots = snapshots  # Снапшоты движков в Redis
+        self.cross_pair = cross_pair  # Общий расчёт EMA/AMA/ATR по бакетам всех пар процесса
+        self.digest_interval = digest_interval  # >0 - отчёты пар уходят дайджестом раз в N секунд
+        self.partition = partition  # (номер, всего) для процесса-шарда
+        self.running = False
+        self.universe = None
+        self.connections = []  # Списки пар соединений, меняются вместе с universe
+        self.services = {}  # Общие для соединений процесса executor, writer и т.д.
+        self.shards = set()  # Задачи supervise_shard, в том числе открытые на ходу
+        self.streams = {}
+        self.workers = {}
+
+    @property
+    def options(self):
+        return {
+            'streams_per_connection': self.streams_per_connection,
+            'max_pairs': self.max_pairs,
+            'limit': self.limit,
+            'restart_delay': self.restart_delay,
+            'fast': self.fast,
+            'persist': self.persist,
+            'snapshots': self.snapshots,
+            'digest_interval': self.digest_interval,
+            'cross_pair': self.cross_pair,
+        }
+
+    async def fetch_symbols(self):
+        if self.universe is None:
+            self.universe = SymbolUniverse(max_pairs=self.max_pairs)
+        return await self.universe.symbols()
+
+    def owns(self, symbol) -> bool:
+        return self.partition is None or partition_of(symbol, self.partition[1]) == self.partition[0]
+
+    async def run(self):
+        self.running = True
+        symbols = await self.fetch_symbols()
+        print(f"🧩 {len(symbols)} pairs, {self.streams_per_connection} per connection, processes: {self.processes or 'off'}")
+        if self.fast:
+            print(f"⚡ Fast mode: ccxt json backend {runtime.ccxt_json_backend()}")
+
+        try:
+            if self.processes > 0:
+                await self.run_processes(symbols)
+            else:
+                await self.run_connections(split_symbols(symbols, self.streams_per_connection))
+        finally:
+            await self.universe.stop()
+
+    async def apply_universe(self, added=(), removed=()):
+        """Сверяет подписки процесса с текущим набором пар universe."""
+        wanted = [symbol for symbol in self.universe.current or () if self.owns(symbol)]
+        wanted_set = set(wanted)
+        for index, symbols in enumerate(self.connections):
+            for symbol in [symbol for symbol in symbols if symbol not in wanted_set]:
+                symbols.remove(symbol)
+                if index in self.streams:
+                    await self.streams[index].remove_symbol(symbol)
+
+        subscribed = {symbol for symbols in self.connections for symbol in symbols}
+        for symbol in wanted:
+            if symbol not in subscribed:
+                self.add_symbol(symbol)
+
+    def add_symbol(self, symbol):
+        index = min(range(len(self.connections)), key=lambda i: len(self.connections[i]), default=None)
+        if index is None or len(self.connections[index]) >= self.streams_per_connection:
+            # Все соединения заполнены - открываем новое
+            self.connections.append([symbol])
+            self.start_shard(len(self.connections) - 1, self.connections[-1])
+            return
+        self.connections[index].append(symbol)
+        if index in self.streams:
+            self.streams[index].add_symbol(symbol)
+
+    def start_shard(self, index, symbols):
+        if self.running:
+            self.shards.add(asyncio.create_task(self.supervise_shard(index, symbols)))
+
+    async def wait_shards(self):
+        """Ждёт все шарды, включая добавленные после старта, и не теряет их ошибки."""
+        while self.shards:
+            done, _ = await asyncio.wait(self.shards, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                self.shards.discard(task)
+                if not task.cancelled() and task.exception() is not None:
+                    print(f"🚨 Shard task failed: {task.exception()!r}")
+
+    async def close_shards(self):
+        shards = list(self.shards)
+        self.shards.clear()
+        for task in shards:
+            task.cancel()
+        await asyncio.gather(*shards, return_exceptions=True)
+
+    async def run_connections(self, connections):
+        """Все соединения в текущем event loop с общим пулом отчётов."""
+        self.running = True
+        report_executor = ReportExecutor()
+        notifier = TelegramNotifier(digest_interval=self.digest_interval)
+        self.services = {
+            'report_executor': report_executor,
+            'notifier': notifier,
+            'report_rate_limiter': telegram_rate_limiter(),
+            'tick_writer': TickWriter() if self.persist else None,
+            'snapshot_store': EngineSnapshotStore() if self.snapshots else None,
+            'cross_pair': CrossPairIndicators() if self.cross_pair else None,
+        }
+        background = [self.services[name] for name in ('tick_writer', 'snapshot_store', 'cross_pair')]
+        await report_executor.start()
+        await notifier.start()
+        for service in background:
+            if service is not None:
+                service.start()
+
+        self.connections = connections
+        if self.universe is None:
+            # Процесс-шард читает набор пар из кэша, который уже прогрел родитель
+            self.universe = SymbolUniverse(max_pairs=self.max_pairs)
+            await self.universe.symbols()
+        self.universe.subscribe(self.apply_universe)
+        self.universe.start()
+        try:
+            for index, symbols in enumerate(self.connections):
+                self.start_shard(index, symbols)
+            await self.apply_universe()
+            await asyncio.gather(self.report_metrics(), self.wait_shards())
+        finally:
+            await self.universe.stop()
+            await self.close_shards()
+            await report_executor.stop()
+            for service in reversed(background):
+                if service is not None:
+                    await service.stop()
+            await notifier.stop()
+
+    async def supervise_shard(self, index, symbols):
+        while self.running:
+            stream = BinanceBatchTradeStream(
+                limit=self.limit,
+                symbols=symbols,
+                throughput_meter=self.throughput_meter,
+                **self.services,
+            )
+            self.streams[index] = stream
+            try:
+                await stream.run()
+            except Exception as e:
+                print(f"🚨 Shard {index} failed: {e}")
+            if self.running:
+                print(f"🔁 Restarting shard {index} in {self.restart_delay}s")
+                await asyncio.sleep(self.restart_delay)
+
+    async def report_metrics(self):
+        report_executor = self.services['report_executor']
+        tick_writer = self.services['tick_writer']
+        while self.running:
+            await asyncio.sleep(10)
+            print(f"📊 Reports: {report_executor.metrics()}")
+            print(f"✉️ Telegram: {self.services['notifier'].metrics()}")
+            if tick_writer is not None:
+                print(f"💾 Ticks: {tick_writer.metrics()}")
+            if self.throughput_meter is not None:
+                print(f"⚡ Throughput: {self.throughput_meter.report()}")
+            slowest = self.slowest_strategy()
+            if slowest is not None:
+                print(f"🐢 Slowest strategy: {slowest}")
+
+    def slowest_strategy(self):
+        """Стратегия с самым большим p99 среди всех движков этого процесса."""
+        metrics = [
+            {'pair': symbol, 'strategy': name, **summary}
+            for stream in self.streams.values()
+            for symbol, engine in stream.apps.items()
+            for name, summary in engine.strategy_metrics().items()
+        ]
+        return max(metrics, key=lambda summary: summary['p99_us'], default=None)
+
+    async def run_processes(self, symbols):
+        context = multiprocessing.get_context('spawn')
+        groups = [[] for _ in range(self.processes)]
+        for symbol in symbols:
+            groups[partition_of(symbol, self.processes)].append(symbol)
+
+        def start_worker(index):
+            process = context.Process(
+                target=run_shard_process,
+                args=(
+                    split_symbols(groups[index], self.streams_per_connection),
+                    {**self.options, 'partition': (index, self.processes)},
+                ),
+                name=f"shard-{index}",
+                daemon=True,
+            )
+            process.start()
+            self.workers[index] = process
+
+        for index in range(len(groups)):
+            start_worker(index)
+
+        while self.running:
+            await asyncio.sleep(self.restart_delay)
+            for index, process in list(self.workers.items()):
+                if not process.is_alive() and self.running:
+                    print(f"🔁 Shard process {index} exited ({process.exitcode}), restarting")
+                    start_worker(index)
+
+    async def stop(self):
+        self.running = False
+        for stream in self.streams.values():
+            await stream.stop()
+        await self.close_shards()
+        for process in self.workers.values():
+            process.terminate()
+        for process in self.workers.values():
+            process.join(timeout=5)
@@ -0,0 +1,130 @@
+import asyncio
+import io
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+from redis.asyncio import Redis
+
+from .trade_engine.trade_buffer import TRADE_COLUMNS
+
+KEY_PREFIX = 'cryptobro:snapshot'
+SNAPSHOT_INTERVAL = 30  # секунды между тиками сохранения
+SNAPSHOT_BATCH = 20  # Сколько движков сохраняем за тик, остальные ждут своей очереди
+
+
+def pack(arrays: dict) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def unpack(blob: bytes) -> dict:
+    with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+class EngineSnapshotStore:
+    """Периодические снапшоты TradeEngine в Redis для тёплого старта.
+
+    Трейды пишутся в список чанков: каждый тик добавляет только новые
+    трейды, а когда в списке набирается больше capacity трейдов, он
+    переписывается одним чанком с текущим буфером. Состояние стратегий
+    (diffs, агрегатор) пишется целиком, оно фиксированного размера. За тик
+    сохраняется не больше batch движков по кругу.
+    """
+
+    def __init__(self, redis=None, interval=SNAPSHOT_INTERVAL, batch=SNAPSHOT_BATCH):
+        self.redis = redis or Redis.from_url(settings.REDIS_URL)
+        self.interval = interval
+        self.batch = batch
+        self.engines = {}
+        self.order = deque()
+        self.saved_total = {}  # ключ -> engine.trades.total на момент последнего сохранения
+        self.stored = {}  # ключ -> сколько трейдов лежит в списке чанков
+        self.task = None
+
+    def key(self, engine) -> str:
+        return f"{KEY_PREFIX}:{engine.stock_name}:{engine.pair_name}"
+
+    def register(self, engine):
+        key = self.key(engine)
+        if key not in self.engines:
+            self.order.append(key)
+        self.engines[key] = engine
+
+    def unregister(self, engine):
+        key = self.key(engine)
+        if self.engines.pop(key, None) is not None:
+            self.order.remove(key)
+
+    async def save(self, engine):
+        key = self.key(engine)
+        trades = engine.trades
+        # Трейды, пришедшие во время execute(), уйдут следующим сохранением
+        total = trades.total
+        new = min(total - self.saved_total.get(key, 0), len(trades))
+        stored = self.stored.get(key, 0)
+
+        pipe = self.redis.pipeline(transaction=True)
+        if key not in self.saved_total or stored + new > trades.capacity:
+            pipe.delete(f"{key}:trades")
+            if len(trades):
+                pipe.rpush(f"{key}:trades", pack(dict(zip(trades.columns, trades.window()))))
+            stored = len(trades)
+        elif new > 0:
+            pipe.rpush(f"{key}:trades", pack(dict(zip(trades.columns, trades.window(new)))))
+            stored += new
+        pipe.set(f"{key}:state", pack(engine.snapshot_state()))
+        await pipe.execute()
+
+        self.saved_total[key] = total
+        self.stored[key] = stored
+
+    async def restore(self, engine) -> bool:
+        """Загружает снапшот в свежий движок. Стратегии при этом не вызываются."""
+        key = self.key(engine)
+        chunks = await self.redis.lrange(f"{key}:trades", 0, -1)
+        state = await self.redis.get(f"{key}:state")
+        if not chunks and state is None:
+            return False
+
+        stored = 0
+        for chunk in chunks:
+            data = unpack(chunk)
+            engine.trades.add_arrays(*(data[name] for name in TRADE_COLUMNS))
+            stored += len(data['id'])
+        if state is not None:
+            engine.restore_state(unpack(state))
+        engine.mark_processed()
+
+        self.saved_total[key] = engine.trades.total
+        self.stored[key] = stored
+        print(f"♻️ [{engine.pair_name}] Restored {len(engine.trades)} trades from snapshot")
+        return True
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for _ in range(min(self.batch, len(self.order))):
+                key = self.order[0]
+                self.order.rotate(-1)
+                try:
+                    await self.save(self.engines[key])
+                except Exception as e:
+                    print(f"[Snapshot] Ошибка сохранения {key}: {e}")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        for engine in list(self.engines.values()):
+            try:
+                await self.save(engine)
+            except Exception as e:
+                print(f"[Snapshot] Ошибка сохранения {engine.pair_name}: {e}")
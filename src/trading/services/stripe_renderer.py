@@ -0,0 +1,29 @@
+import numpy as np
+
+MARGIN = 100  # Белый отступ слева, px
+WHITE = 3
+# Коды цветов: 0 - gray, 1 - green (рост), 2 - red (падение), 3 - белый фон
+COLORS = np.array([(128, 128, 128), (0, 255, 0), (255, 0, 0), (255, 255, 255)], dtype=np.uint8)
+
+
+def stripe_codes(values, width: int, k: float) -> np.ndarray:
+    """Код цвета для каждого из width столбцов полосы."""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return np.full(width, WHITE, dtype=np.uint8)
+
+    codes = np.where(values > k, 1, np.where(values < -k, 2, 0)).astype(np.uint8)
+    # Значение idx занимает столбцы [idx * width / n, (idx + 1) * width / n),
+    # при n > width столбец достаётся последнему попавшему в него значению
+    starts = (np.arange(n) * width / n).astype(np.int64)
+    owners = np.searchsorted(starts, np.arange(width), side='right') - 1
+    return codes[owners]
+
+
+def render_stripes(levels, width: int = 6000, height: int = 64, k: float = 0.001) -> np.ndarray:
+    """RGB-картинка из полос, по одной полосе высотой height на уровень."""
+    codes = np.full((len(levels), width + MARGIN), WHITE, dtype=np.uint8)
+    for row, values in enumerate(levels):
+        codes[row, MARGIN:] = stripe_codes(values, width, k)
+    return np.repeat(COLORS[codes], height, axis=0)
@@ -0,0 +1,195 @@
+import functools
+import hashlib
+import itertools
+import json
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from .backtest import init_worker, simulate
+from .trade_engine.indicators.ama_indicator import AMAIndicator
+from .trade_engine.indicators.macd_indicator import MACDIndicator
+from .trade_engine.indicators.supertrend_indicator import SuperTrendIndicator
+from .trade_source import load_columns, load_trades, save_columns
+
+# Параметры индикаторов: имя в свипе -> (индикатор, аргумент конструктора)
+INDICATOR_PARAMS = {
+    'ama_period': ('ama', 'period'),
+    'ama_fast': ('ama', 'fast'),
+    'ama_slow': ('ama', 'slow'),
+    'macd_short': ('macd', 'short_period'),
+    'macd_long': ('macd', 'long_period'),
+    'macd_signal': ('macd', 'signal_period'),
+    'supertrend_period': ('supertrend', 'atr_period'),
+    'supertrend_multiplier': ('supertrend', 'multiplier'),
+}
+INDICATORS = {
+    'ama': AMAIndicator,
+    'macd': MACDIndicator,
+    'supertrend': SuperTrendIndicator,
+}
+# Остальное читает GigaStrategy из config['params']
+STRATEGY_PARAMS = ('diff_limit', 'diffs_count', 'interval', 'stripe_k')
+
+
+def params_hash(params: dict) -> str:
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def grid(space: dict) -> list[dict]:
+    """Все сочетания значений: {'diff_limit': [4, 8], 'stripe_k': [0.001]} -> список словарей."""
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_search(space: dict, count: int, seed=0) -> list[dict]:
+    """count разных случайных точек сетки без построения всей сетки."""
+    rng = random.Random(seed)
+    names = sorted(space)
+    total = 1
+    for name in names:
+        total *= len(space[name])
+
+    chosen = {}
+    while len(chosen) < min(count, total):
+        params = {name: rng.choice(space[name]) for name in names}
+        chosen.setdefault(params_hash(params), params)
+    return list(chosen.values())
+
+
+def forward_fill_nan(values: np.ndarray) -> np.ndarray:
+    index = np.where(np.isnan(values), 0, np.arange(len(values)))
+    return values[np.maximum.accumulate(index)]
+
+
+def score(signal: np.ndarray, returns: np.ndarray) -> dict:
+    """Сигнал после бакета t против доходности бакета t+1: средний доход в б.п. и доля угадываний."""
+    signal = signal[:-1].astype(np.float64)
+    returns = returns[1:]
+    active = signal != 0
+    return {
+        'edge_bps': float((signal * returns).mean() * 1e4) if len(signal) else 0.0,
+        'hit_rate': float((np.sign(returns[active]) == signal[active]).mean()) if active.any() else 0.0,
+        'active': float(active.mean()) if len(signal) else 0.0,
+    }
+
+
+def strategy_key(params: dict) -> str:
+    """Часть точки, от которой зависит прогон GigaStrategy, в виде ключа кэша."""
+    return json.dumps({name: value for name, value in params.items() if name in STRATEGY_PARAMS}, sort_keys=True)
+
+
+@functools.lru_cache(maxsize=4)
+def simulate_signals(data_dir, pair_name: str, key: str):
+    """Прогон стратегии с параметрами key. Точки, которые отличаются только индикаторами, берут его из кэша."""
+    _, recorder, elapsed = simulate(load_columns(data_dir), pair_name, json.loads(key))
+    closes = forward_fill_nan(np.array(recorder.closes, dtype=np.float64))
+    signals = np.array(recorder.signals, dtype=np.int8).reshape(len(recorder), -1)
+    closes.setflags(write=False)
+    signals.setflags(write=False)
+    return closes, signals, elapsed
+
+
+def evaluate(data_dir, pair_name: str, params: dict) -> dict:
+    """Прогон одной точки свипа. Трейды открываются через mmap, поэтому задача ничего не перечитывает."""
+    indicator_kwargs = {name: {} for name in INDICATORS}
+    for name, value in params.items():
+        if name in INDICATOR_PARAMS:
+            indicator, argument = INDICATOR_PARAMS[name]
+            indicator_kwargs[indicator][argument] = value
+
+    closes, signals, elapsed = simulate_signals(Path(data_dir), pair_name, strategy_key(params))
+    returns = np.zeros(len(closes))
+    returns[1:] = np.diff(np.log(closes))
+
+    scores = {}
+    for level in range(signals.shape[1]):
+        scores[f'giga_{level}'] = score(signals[:, level], returns)
+    for name, indicator in INDICATORS.items():
+        _, trends = indicator(**indicator_kwargs[name]).batch(closes)
+        scores[name] = score(trends, returns)
+
+    return {
+        'params': params,
+        'hash': params_hash(params),
+        'buckets': len(signals),
+        'seconds': elapsed,
+        'scores': scores,
+        'best': max(scores, key=lambda key: scores[key]['edge_bps']) if scores else None,
+    }
+
+
+def evaluate_group(data_dir, pair_name: str, points: list[dict]) -> list[dict]:
+    return [evaluate(data_dir, pair_name, params) for params in points]
+
+
+class Sweep:
+    """Перебор параметров стратегии и индикаторов на одном наборе трейдов.
+
+    Исходный файл один раз раскладывается в каталог .npy, воркеры открывают
+    его через mmap. Результат каждой точки лежит в results/<hash>.json, так что
+    повторный свип считает только новые точки.
+    """
+
+    def __init__(self, path, output_dir, pair_name=None, workers=0):
+        self.path = Path(path)
+        self.pair_name = pair_name or self.path.stem
+        stat = self.path.stat()
+        fingerprint = hashlib.sha1(f'{self.path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:8]
+        self.root = Path(output_dir) / f"{self.path.stem}-{fingerprint}"
+        self.data_dir = self.root / 'trades'
+        self.results_dir = self.root / 'results'
+        self.workers = workers
+
+    def prepare(self):
+        if not (self.data_dir / 'timestamp.npy').exists():
+            save_columns(self.data_dir, load_trades(self.path))
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+
+    def cached(self, params) -> dict | None:
+        path = self.results_dir / f'{params_hash(params)}.json'
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def store(self, result):
+        (self.results_dir / f"{result['hash']}.json").write_text(json.dumps(result))
+
+    def run(self, points: list[dict]) -> list[dict]:
+        """Возвращает результаты всех точек, лучшие по edge_bps первыми."""
+        self.prepare()
+        results = []
+        missing = []
+        for params in points:
+            result = self.cached(params)
+            if result is None:
+                missing.append(params)
+            else:
+                results.append(result)
+        print(f"🧮 {len(points)} точек, из кэша {len(results)}, считаем {len(missing)}")
+
+        for result in self.evaluate_many(missing):
+            self.store(result)
+            results.append(result)
+
+        return sorted(results, key=lambda result: result['scores'][result['best']]['edge_bps'], reverse=True)
+
+    def evaluate_many(self, points):
+        # Точки с одинаковыми параметрами стратегии идут подряд и в один процесс, чтобы прогон считался раз
+        groups = {}
+        for params in points:
+            groups.setdefault(strategy_key(params), []).append(params)
+
+        if self.workers <= 0:
+            for group in groups.values():
+                yield from evaluate_group(self.data_dir, self.pair_name, group)
+            return
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.workers, mp_context=context, initializer=init_worker) as pool:
+            futures = [pool.submit(evaluate_group, self.data_dir, self.pair_name, group) for group in groups.values()]
+            for future in as_completed(futures):
+                yield from future.result()
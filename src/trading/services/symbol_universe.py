@@ -0,0 +1,196 @@
+import asyncio
+import inspect
+import json
+import os
+import time
+from pathlib import Path
+
+import ccxt.pro
+from django.conf import settings
+from redis.asyncio import Redis
+
+MIN_USDT_VOLUME = 1000000  # Минимальный объём торгов в USDT за 24ч
+BANNED_PAIRS = {"TUSD/USDT", "BUSD/USDT", "USDC/USDT"}  # Чёрный список пар
+UNIVERSE_KEY = 'cryptobro:universe'
+REFRESH_LOCK_KEY = f'{UNIVERSE_KEY}:refresh_lock'  # Пересчитывает рейтинг только владелец ключа
+MARKETS_TTL = 24 * 3600  # Список рынков меняется редко
+RANKING_TTL = 600  # Рейтинг по объёму считаем свежим 10 минут
+REFRESH_INTERVAL = 300  # Как часто пересчитываем набор ликвидных пар, секунды
+
+
+class SymbolUniverse:
+    """Набор ликвидных USDT-пар с кэшем в Redis и на диске.
+
+    На старте отдаёт закэшированный рейтинг сразу, даже устаревший, и
+    освежает его в фоне. Раз в refresh_interval рейтинг пересчитывается по
+    fetch_tickers; если набор пар поменялся, подписчики получают
+    (добавленные, убранные) и переподписывают стримы на ходу. Процессы-шарды
+    делят один рейтинг в Redis: биржу опрашивает тот, кто взял блокировку на
+    refresh_interval, остальные берут свежий рейтинг из кэша.
+    """
+
+    def __init__(
+        self,
+        exchange=None,
+        redis=None,
+        cache_dir=None,
+        max_pairs=0,
+        min_volume=MIN_USDT_VOLUME,
+        markets_ttl=MARKETS_TTL,
+        ranking_ttl=RANKING_TTL,
+        refresh_interval=REFRESH_INTERVAL,
+        clock=time.time,
+    ):
+        self.owns_exchange = exchange is None
+        self.exchange = exchange
+        self.owns_redis = redis is None
+        self.redis = redis or Redis.from_url(settings.REDIS_URL)
+        self.cache_dir = Path(cache_dir or os.path.join(settings.BASE_DIR, "tmp", "universe"))
+        self.max_pairs = max_pairs  # 0 - все ликвидные
+        self.min_volume = min_volume
+        self.ttl = {'markets': markets_ttl, 'ranking': ranking_ttl}
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.current = None  # Текущий набор пар, как его видят подписчики
+        self.stale = False  # Стартовали на устаревшем кэше - освежить сразу
+        self.listeners = []
+        self.task = None
+
+    def get_exchange(self):
+        if self.exchange is None:
+            self.exchange = ccxt.pro.binance()
+        return self.exchange
+
+    def subscribe(self, listener):
+        """listener(added, removed) - обычная функция или корутина."""
+        self.listeners.append(listener)
+
+    async def load_cached(self, name) -> dict | None:
+        """Сначала Redis, затем файл. Возвращает {'at': время записи, 'symbols': [...]}."""
+        try:
+            blob = await self.redis.get(f"{UNIVERSE_KEY}:{name}")
+            if blob is not None:
+                return json.loads(blob)
+        except Exception as e:
+            print(f"[Universe] Redis недоступен: {e}")
+        path = self.cache_dir / f"{name}.json"
+        if path.exists():
+            return json.loads(path.read_text())
+        return None
+
+    async def store(self, name, symbols):
+        blob = json.dumps({'at': self.clock(), 'symbols': symbols})
+        try:
+            await self.redis.set(f"{UNIVERSE_KEY}:{name}", blob, ex=self.ttl[name])
+        except Exception as e:
+            print(f"[Universe] Redis недоступен: {e}")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        (self.cache_dir / f"{name}.json").write_text(blob)
+
+    def fresh(self, cached, name) -> bool:
+        return cached is not None and self.clock() - cached['at'] < self.ttl[name]
+
+    async def markets(self) -> list[str]:
+        cached = await self.load_cached('markets')
+        if self.fresh(cached, 'markets'):
+            return cached['symbols']
+
+        markets = await self.get_exchange().load_markets()
+        symbols = [
+            symbol for symbol, market in markets.items()
+            if symbol.endswith('/USDT') and market['active'] and symbol not in BANNED_PAIRS
+        ]
+        await self.store('markets', symbols)
+        return symbols
+
+    async def ranking(self, force=False) -> list[str]:
+        """Ликвидные пары по убыванию объёма за 24ч."""
+        if not force:
+            cached = await self.load_cached('ranking')
+            if self.fresh(cached, 'ranking'):
+                return cached['symbols']
+
+        markets = await self.markets()
+        tickers = await self.get_exchange().fetch_tickers(markets)
+        listed = set(markets)
+        volumes = {
+            symbol: ticker.get('quoteVolume') or 0
+            for symbol, ticker in tickers.items()
+            if symbol in listed
+        }
+        symbols = sorted((symbol for symbol, volume in volumes.items() if volume >= self.min_volume), key=volumes.get, reverse=True)
+        await self.store('ranking', symbols)
+        return symbols
+
+    def top(self, ranking) -> list[str]:
+        return ranking[:self.max_pairs] if self.max_pairs > 0 else list(ranking)
+
+    async def symbols(self) -> list[str]:
+        """Пары для старта: из кэша без обращения к бирже, если он есть."""
+        cached = await self.load_cached('ranking')
+        if cached is not None:
+            self.stale = not self.fresh(cached, 'ranking')
+            ranking = cached['symbols']
+        else:
+            ranking = await self.ranking(force=True)
+        self.current = self.top(ranking)
+        print(f"Found {len(self.current)} liquid USDT pairs (min vol: {self.min_volume})")
+        return self.current
+
+    async def acquire_refresh(self) -> bool:
+        try:
+            return bool(await self.redis.set(REFRESH_LOCK_KEY, os.getpid(), nx=True, ex=self.refresh_interval))
+        except Exception as e:
+            print(f"[Universe] Redis недоступен, обновляем сами: {e}")
+            return True
+
+    async def shared_ranking(self) -> list[str] | None:
+        """Рейтинг для очередного обновления; None - его пока пересчитывает другой процесс."""
+        cached = await self.load_cached('ranking')
+        if cached is not None and self.clock() - cached['at'] < self.refresh_interval:
+            return cached['symbols']
+        if await self.acquire_refresh():
+            return await self.ranking(force=True)
+        return cached['symbols'] if cached is not None else None
+
+    async def refresh(self) -> tuple[list[str], list[str]]:
+        ranking = await self.shared_ranking()
+        if ranking is None:
+            return [], []
+        symbols = self.top(ranking)
+        self.stale = False
+        previous, latest = set(self.current or ()), set(symbols)
+        added = [symbol for symbol in symbols if symbol not in previous]
+        removed = [symbol for symbol in self.current or () if symbol not in latest]
+        self.current = symbols
+        if added or removed:
+            print(f"🌐 Universe: +{len(added)} -{len(removed)} pairs")
+            for listener in self.listeners:
+                result = listener(added, removed)
+                if inspect.isawaitable(result):
+                    await result
+        return added, removed
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(0 if self.stale else self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"[Universe] Ошибка обновления: {e}")
+                self.stale = False
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.owns_exchange and self.exchange is not None:
+            await self.exchange.close()
+            self.exchange = None
+        if self.owns_redis:
+            await self.redis.aclose()
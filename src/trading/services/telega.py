@@ -17,16 +17,16 @@ def send_telegram_message(text: str):
         print(f"[Telegram] Ошибка при отправке текста: {e}")
 
 
-def send_telegram_image(caption: str, file_path: str):
+def send_telegram_image(caption: str, photo: bytes):
+    """photo - готовые байты PNG, файл на диске не нужен."""
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
     try:
-        with open(file_path, "rb") as f:
-            files = {"photo": f}
-            data = {
-                "chat_id": TELEGRAM_CHAT_ID,
-                "caption": caption
-            }
-            requests.post(url, data=data, files=files, timeout=10)
+        files = {"photo": ("chart.png", photo, "image/png")}
+        data = {
+            "chat_id": TELEGRAM_CHAT_ID,
+            "caption": caption
+        }
+        requests.post(url, data=data, files=files, timeout=10)
     except Exception as e:
         print(f"[Telegram] Ошибка при отправке изображения: {e}")
 
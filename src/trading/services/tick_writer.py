@@ -0,0 +1,219 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+from django.db import close_old_connections, connection, transaction
+
+MAX_BUFFERED = 500_000  # Трейдов в памяти на процесс, при переполнении выкидываем самые старые
+BATCH_SIZE = 20_000  # Трейдов в одном COPY
+FLUSH_INTERVAL = 1.0  # секунды
+WRITE_RETRIES = 3  # Повторы записи пачки, потом она возвращается в очередь
+RETRY_DELAY = 0.5  # Первая пауза перед повтором, дальше удваивается
+DAY_MS = 86_400_000
+
+TRADE_FIELDS = '"exchange", "symbol", "trade_id", "traded_at", "price", "amount", "side"'
+BUCKET_FIELDS = (
+    '"exchange", "symbol", "interval_ms", "started_at", "open", "high", '
+    '"low", "close", "volume", "trades_count", "alfa_diff"'
+)
+
+
+def ensure_partition(cursor, table, day):
+    """Создаёт дневную секцию table за день day (номер дня от эпохи)."""
+    start = datetime(1970, 1, 1, tzinfo=UTC) + timedelta(days=int(day))
+    end = start + timedelta(days=1)
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{table}_p{start:%Y%m%d}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def copy_insert(cursor, table, fields, rows):
+    """COPY во временную таблицу и INSERT ... ON CONFLICT DO NOTHING.
+
+    Повторный трейд (например, после догрузки) не роняет всю пачку, как
+    было бы с COPY прямо в таблицу с первичным ключом.
+    """
+    stage = f"{table}_stage"
+    with transaction.atomic():
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS "{stage}" (LIKE "{table}" INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'
+        )
+        with cursor.cursor.copy(f'COPY "{stage}" ({fields}) FROM STDIN') as copy:
+            for row in rows:
+                copy.write_row(row)
+        cursor.execute(f'INSERT INTO "{table}" ({fields}) SELECT {fields} FROM "{stage}" ON CONFLICT DO NOTHING')
+
+
+def to_timestamps(milliseconds) -> np.ndarray:
+    return np.datetime_as_string(np.asarray(milliseconds).astype('datetime64[ms]'), unit='ms', timezone='UTC')
+
+
+class TickWriter:
+    """Фоновая запись трейдов и бакетов в Postgres пачками через COPY.
+
+    put_* ничего не ждут: данные копируются в очередь в памяти, а раз в
+    flush_interval очередь уходит в базу в отдельном потоке. Трейды и
+    бакеты пишутся независимо; неудачная пачка повторяется с паузой, а
+    потом возвращается в начало очереди. Если база не успевает, очередь
+    не растёт бесконечно - старые записи отбрасываются и считаются в dropped.
+    """
+
+    def __init__(
+        self,
+        max_buffered=MAX_BUFFERED,
+        batch_size=BATCH_SIZE,
+        flush_interval=FLUSH_INTERVAL,
+        retries=WRITE_RETRIES,
+        retry_delay=RETRY_DELAY,
+    ):
+        self.max_buffered = max_buffered
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.trades = deque()  # (exchange, symbol, ids, timestamps, prices, amounts, sides)
+        self.buckets = deque()  # (exchange, symbol, interval_ms, row)
+        self.buffered = 0
+        self.written = 0
+        self.dropped = 0
+        self.written_buckets = 0
+        self.dropped_buckets = 0
+        self.retried = 0
+        self.requeued = 0  # Пачки, вернувшиеся в очередь после всех повторов
+        self.partitions = set()
+        # Один поток - одно соединение Django, COPY идут строго по очереди
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tick-writer')
+        self.task = None
+
+    def put_trades(self, exchange, symbol, ids, timestamps, prices, amounts, sides):
+        chunk = (exchange, symbol, *(np.array(column) for column in (ids, timestamps, prices, amounts, sides)))
+        self.trades.append(chunk)
+        self.buffered += len(ids)
+        self.trim()
+
+    def put_bucket(self, exchange, symbol, interval_ms, row):
+        """row: (start_ms, open, high, low, close, volume, trades_count, alfa_diff)."""
+        self.buckets.append((exchange, symbol, interval_ms, *row))
+        self.trim()
+
+    def trim(self):
+        while self.buffered > self.max_buffered and len(self.trades) > 1:
+            dropped = self.trades.popleft()
+            self.buffered -= len(dropped[2])
+            self.dropped += len(dropped[2])
+        while len(self.buckets) > self.max_buffered:
+            self.buckets.popleft()
+            self.dropped_buckets += 1
+
+    def requeue(self, chunks, buckets):
+        """Неотправленная пачка встаёт в начало очереди, порядок сохраняется."""
+        self.requeued += 1
+        self.trades.extendleft(reversed(chunks))
+        self.buffered += sum(len(chunk[2]) for chunk in chunks)
+        self.buckets.extendleft(reversed(buckets))
+        self.trim()
+
+    def take_trades(self):
+        chunks = []
+        taken = 0
+        while self.trades and taken < self.batch_size:
+            chunk = self.trades.popleft()
+            chunks.append(chunk)
+            taken += len(chunk[2])
+        self.buffered -= taken
+        return chunks
+
+    def take_buckets(self):
+        buckets = list(self.buckets)
+        self.buckets.clear()
+        return buckets
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        while self.trades or self.buckets:
+            chunks, buckets = self.take_trades(), self.take_buckets()
+            failed_chunks = [] if await self.write_with_retry('trades', self.write_trades, chunks) else chunks
+            failed_buckets = [] if await self.write_with_retry('buckets', self.write_buckets, buckets) else buckets
+            if failed_chunks or failed_buckets:
+                # База недоступна: пачку не теряем, попробуем на следующем тике
+                self.requeue(failed_chunks, failed_buckets)
+                return
+
+    async def write_with_retry(self, kind, write, rows) -> bool:
+        if not rows:
+            return True
+        loop = asyncio.get_running_loop()
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                await loop.run_in_executor(self.executor, write, rows)
+                return True
+            except Exception as e:
+                print(f"[TickWriter] Ошибка записи {kind}, попытка {attempt + 1}: {e}")
+            if attempt < self.retries:
+                self.retried += 1
+                await asyncio.sleep(delay)
+                delay *= 2
+        return False
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+        self.executor.shutdown(wait=True)
+
+    def write_trades(self, chunks):
+        close_old_connections()
+        with connection.cursor() as cursor:
+            self.ensure_partitions(cursor, 'trading_trade', [chunk[3] for chunk in chunks])
+            rows = (
+                (exchange, symbol, *row)
+                for exchange, symbol, ids, timestamps, prices, amounts, sides in chunks
+                for row in zip(ids.tolist(), to_timestamps(timestamps), prices.tolist(), amounts.tolist(), sides.tolist())
+            )
+            copy_insert(cursor, 'trading_trade', TRADE_FIELDS, rows)
+        self.written += sum(len(chunk[2]) for chunk in chunks)
+
+    def write_buckets(self, buckets):
+        close_old_connections()
+        with connection.cursor() as cursor:
+            self.ensure_partitions(cursor, 'trading_tradebucket', [[bucket[3] for bucket in buckets]])
+            started_at = to_timestamps([bucket[3] for bucket in buckets])
+            rows = ((*bucket[:3], start, *bucket[4:]) for bucket, start in zip(buckets, started_at))
+            copy_insert(cursor, 'trading_tradebucket', BUCKET_FIELDS, rows)
+        self.written_buckets += len(buckets)
+
+    def ensure_partitions(self, cursor, table, timestamps):
+        days = set()
+        for values in timestamps:
+            if len(values):
+                days.update(np.unique(np.asarray(values) // DAY_MS).tolist())
+        for day in days:
+            if (table, day) not in self.partitions:
+                ensure_partition(cursor, table, day)
+                self.partitions.add((table, day))
+
+    def metrics(self) -> dict:
+        return {
+            'buffered': self.buffered,
+            'written': self.written,
+            'dropped': self.dropped,
+            'buckets_buffered': len(self.buckets),
+            'written_buckets': self.written_buckets,
+            'dropped_buckets': self.dropped_buckets,
+            'retried': self.retried,
+            'requeued': self.requeued,
+        }
@@ -0,0 +1,124 @@
+import operator
+
+import numpy as np
+
+INTERVAL_MS = 2000  # Длина бакета по умолчанию
+
+BUCKET_COLUMNS = {
+    'start': np.int64,  # epoch ms начала бакета
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+    'buy_volume': np.float64,
+    'sell_volume': np.float64,
+    'up_move': np.float64,  # Сумма ростов цены от трейда к трейду
+    'down_move': np.float64,  # Сумма падений, по модулю
+    'count': np.int64,
+    'gap': np.int64,  # Сколько пустых интервалов идёт сразу за бакетом
+}
+# Как колонку открытого бакета сливать с продолжением из следующей пачки
+MERGE = {
+    'open': lambda current, new: current,
+    'high': max,
+    'low': min,
+    'close': lambda current, new: new,
+}
+RUNNING_COLUMNS = tuple(name for name in BUCKET_COLUMNS if name not in ('start', 'gap'))
+
+
+def empty_buckets() -> dict:
+    return {name: np.zeros(0, dtype=dtype) for name, dtype in BUCKET_COLUMNS.items()}
+
+
+class TradePerIntervalAggregator:
+    """Режет поток трейдов на бакеты фиксированной длины по epoch ms.
+
+    Для открытого бакета держит только бегущие OHLCV, объёмы по сторонам и
+    суммы движений цены, списков трейдов нет. add_batch принимает колонки
+    трейдов и за один вызов возвращает все закрытые им бакеты колонками
+    BUCKET_COLUMNS; пустые интервалы между бакетами не материализуются, а
+    считаются в колонке gap.
+    """
+
+    def __init__(self, interval_ms: int = INTERVAL_MS):
+        self.interval_ms = int(interval_ms)
+        self.start = None  # Начало открытого бакета, epoch ms
+        self.current = dict.fromkeys(RUNNING_COLUMNS, 0.0)
+
+    def add(self, timestamp: int, price: float, amount: float = 0.0, side: int = 0) -> dict:
+        return self.add_batch(np.array([timestamp]), np.array([price]), np.array([amount]), np.array([side]))
+
+    def add_batch(self, timestamps, prices, amounts, sides=None) -> dict:
+        """sides в кодах TradeBuffer: 1 - buy, -1 - sell, 0 - неизвестно."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        sides = np.zeros(len(timestamps), dtype=np.int8) if sides is None else np.asarray(sides)
+        if len(timestamps) == 0:
+            return empty_buckets()
+
+        starts = timestamps // self.interval_ms * self.interval_ms
+        edges = np.flatnonzero(starts[1:] != starts[:-1]) + 1
+        first = np.concatenate(([0], edges))
+        last = np.concatenate((edges - 1, [len(timestamps) - 1]))
+        continues = self.start is not None and starts[0] == self.start
+
+        # Изменения цены от трейда к трейду; через границу бакета не считаем
+        moves = np.diff(prices, prepend=self.current['close'] if continues else prices[0])
+        moves[edges] = 0.0
+
+        buckets = {
+            'start': starts[first],
+            'open': prices[first],
+            'high': np.maximum.reduceat(prices, first),
+            'low': np.minimum.reduceat(prices, first),
+            'close': prices[last],
+            'volume': np.add.reduceat(amounts, first),
+            'buy_volume': np.add.reduceat(np.where(sides > 0, amounts, 0.0), first),
+            'sell_volume': np.add.reduceat(np.where(sides < 0, amounts, 0.0), first),
+            'up_move': np.add.reduceat(np.maximum(moves, 0.0), first),
+            'down_move': np.add.reduceat(np.maximum(-moves, 0.0), first),
+            'count': last - first + 1,
+        }
+
+        if continues:
+            # Пачка продолжает открытый бакет
+            for name in RUNNING_COLUMNS:
+                merge = MERGE.get(name, operator.add)
+                buckets[name][0] = merge(self.current[name], buckets[name][0])
+        elif self.start is not None:
+            buckets['start'] = np.concatenate(([self.start], buckets['start']))
+            for name in RUNNING_COLUMNS:
+                buckets[name] = np.concatenate(([self.current[name]], buckets[name])).astype(buckets[name].dtype)
+
+        # Последний бакет остаётся открытым до первого трейда следующего интервала
+        self.start = int(buckets['start'][-1])
+        self.current = {name: buckets[name][-1].item() for name in RUNNING_COLUMNS}
+
+        closed = {name: column[:-1] for name, column in buckets.items()}
+        # Трейд из прошлого интервала открывает бакет заново, но пустых интервалов не даёт
+        closed['gap'] = np.maximum(np.diff(buckets['start']) // self.interval_ms - 1, 0)
+        return closed
+
+    def get_state(self) -> dict:
+        state = {'aggregator_start': np.array([-1 if self.start is None else self.start], dtype=np.int64)}
+        for name in RUNNING_COLUMNS:
+            state[f'aggregator_{name}'] = np.array([self.current[name]], dtype=BUCKET_COLUMNS[name])
+        return state
+
+    def set_state(self, state: dict):
+        start = int(state['aggregator_start'][0])
+        self.start = None if start < 0 else start
+        for name in RUNNING_COLUMNS:
+            if f'aggregator_{name}' in state:
+                self.current[name] = state[f'aggregator_{name}'][0].item()
+
+
+def expand_gaps(buckets: dict, interval_ms: int) -> tuple[np.ndarray, np.ndarray]:
+    """Индексы бакетов и времена начала с пустыми интервалами, развёрнутыми по одному на строку."""
+    counts = buckets['gap'] + 1
+    index = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return index, buckets['start'][index] + offsets * interval_ms
@@ -0,0 +1,169 @@
+import operator
+
+import numpy as np
+
+from .ring_buffer import RingBuffer
+
+TIMEFRAMES = {'1s': 1000, '1m': 60_000, '5m': 300_000, '1h': 3_600_000}
+CANDLE_CAPACITY = 1000  # Свечей на таймфрейм
+
+CANDLE_COLUMNS = {
+    'start': np.int64,  # epoch ms начала свечи
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+    'quote_volume': np.float64,  # Сумма price * amount, из неё VWAP
+    'buy_volume': np.float64,
+    'sell_volume': np.float64,
+    'count': np.int64,
+    'vwap': np.float64,
+}
+# Как сливаются свечи младшего таймфрейма в старшую; open и close берутся из первой и последней
+REDUCE = {
+    'high': np.maximum,
+    'low': np.minimum,
+}
+MERGE = {
+    'open': lambda current, new: current,
+    'high': max,
+    'low': min,
+    'close': lambda current, new: new,
+}
+RUNNING_COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'quote_volume', 'buy_volume', 'sell_volume', 'count')
+
+
+def with_vwap(candles: dict) -> dict:
+    volume = candles['volume']
+    candles['vwap'] = np.divide(candles['quote_volume'], volume, out=candles['close'].copy(), where=volume > 0)
+    return candles
+
+
+class CandleLevel:
+    """Один таймфрейм: открытая свеча бегущими суммами и кольцо закрытых свечей."""
+
+    def __init__(self, name, interval_ms, capacity=CANDLE_CAPACITY):
+        self.name = name
+        self.interval_ms = int(interval_ms)
+        self.ring = RingBuffer(capacity, CANDLE_COLUMNS)
+        self.start = None  # Начало открытой свечи, epoch ms
+        self.current = dict.fromkeys(RUNNING_COLUMNS, 0.0)
+
+    def add(self, candles: dict) -> dict:
+        """Принимает свечи младшего таймфрейма (или трейды как свечи из одного трейда),
+        возвращает закрытые этим вызовом свечи и кладёт их в кольцо."""
+        starts = candles['start'] // self.interval_ms * self.interval_ms
+        edges = np.flatnonzero(starts[1:] != starts[:-1]) + 1
+        first = np.concatenate(([0], edges))
+        last = np.concatenate((edges - 1, [len(starts) - 1]))
+
+        merged = {'start': starts[first], 'open': candles['open'][first], 'close': candles['close'][last]}
+        for name in RUNNING_COLUMNS:
+            if name not in merged:
+                merged[name] = REDUCE.get(name, np.add).reduceat(candles[name], first)
+
+        if self.start is not None and starts[0] == self.start:
+            # Пачка продолжает открытую свечу
+            for name in RUNNING_COLUMNS:
+                merged[name][0] = MERGE.get(name, operator.add)(self.current[name], merged[name][0])
+        elif self.start is not None:
+            merged['start'] = np.concatenate(([self.start], merged['start']))
+            for name in RUNNING_COLUMNS:
+                merged[name] = np.concatenate(([self.current[name]], merged[name])).astype(merged[name].dtype)
+
+        # Последняя свеча остаётся открытой до первой сделки следующего интервала
+        self.start = int(merged['start'][-1])
+        self.current = {name: merged[name][-1].item() for name in RUNNING_COLUMNS}
+
+        closed = with_vwap({name: column[:-1] for name, column in merged.items()})
+        if len(closed['start']):
+            self.ring.extend(*(closed[name] for name in CANDLE_COLUMNS))
+        return closed
+
+    def open_candle(self) -> dict | None:
+        if self.start is None:
+            return None
+        candle = {name: np.array([value]) for name, value in self.current.items()}
+        return with_vwap({'start': np.array([self.start]), **candle})
+
+    def clear(self):
+        self.ring.clear()
+        self.start = None
+        self.current = dict.fromkeys(RUNNING_COLUMNS, 0.0)
+
+
+class CandleBuilder:
+    """OHLCV+VWAP свечи пары сразу на нескольких таймфреймах.
+
+    Трейды агрегируются только в самый мелкий таймфрейм; каждый следующий
+    собирается из закрытых свечей предыдущего, так что каждый трейд
+    трогается один раз. Закрытые свечи лежат в RingBuffer по таймфрейму.
+    Старшая открытая свеча видит только закрытые младшие, полная текущая
+    свеча - через open_candle(). Пустые интервалы свечей не получают.
+    """
+
+    def __init__(self, timeframes=tuple(TIMEFRAMES), capacity=CANDLE_CAPACITY):
+        intervals = sorted((TIMEFRAMES[name], name) for name in timeframes)
+        for (lower, _), (upper, name) in zip(intervals, intervals[1:]):
+            if upper % lower:
+                raise ValueError(f"Таймфрейм {name} не складывается из {lower} мс")
+        self.levels = {name: CandleLevel(name, interval, capacity) for interval, name in intervals}
+
+    def add_batch(self, timestamps, prices, amounts, sides=None) -> dict:
+        """sides в кодах TradeBuffer. Возвращает таймфрейм -> свечи, закрытые этой пачкой."""
+        prices = np.asarray(prices, dtype=np.float64)
+        if len(prices) == 0:
+            return {}
+        amounts = np.asarray(amounts, dtype=np.float64)
+        sides = np.zeros(len(prices), dtype=np.int8) if sides is None else np.asarray(sides)
+        candles = {
+            'start': np.asarray(timestamps, dtype=np.int64),
+            'open': prices,
+            'high': prices,
+            'low': prices,
+            'close': prices,
+            'volume': amounts,
+            'quote_volume': prices * amounts,
+            'buy_volume': np.where(sides > 0, amounts, 0.0),
+            'sell_volume': np.where(sides < 0, amounts, 0.0),
+            'count': np.ones(len(prices), dtype=np.int64),
+        }
+
+        closed = {}
+        for name, level in self.levels.items():
+            candles = level.add(candles)
+            if len(candles['start']) == 0:
+                break
+            closed[name] = candles
+        return closed
+
+    def candles(self, timeframe, n: int | None = None) -> dict:
+        """Последние n закрытых свечей колонками (view на кольцо, без копий)."""
+        ring = self.levels[timeframe].ring
+        return dict(zip(ring.columns, ring.window(n)))
+
+    def open_candle(self, timeframe) -> dict | None:
+        """Текущая незакрытая свеча с учётом открытых свечей младших таймфреймов."""
+        if timeframe not in self.levels:
+            raise KeyError(timeframe)
+        candle = None
+        for name, level in self.levels.items():
+            candle = level.open_candle() if candle is None else self.merge(level, candle)
+            if candle is None or name == timeframe:
+                return candle
+
+    @staticmethod
+    def merge(level, lower) -> dict:
+        current = level.open_candle()
+        if current is None or current['start'][0] != lower['start'][0] // level.interval_ms * level.interval_ms:
+            # Младшая открытая свеча уже из следующего интервала
+            return {**lower, 'start': lower['start'] // level.interval_ms * level.interval_ms}
+        merged = {'start': current['start']}
+        for name in RUNNING_COLUMNS:
+            merged[name] = np.array([MERGE.get(name, operator.add)(current[name][0], lower[name][0])])
+        return with_vwap(merged)
+
+    def clear(self):
+        for level in self.levels.values():
+            level.clear()
@@ -0,0 +1,47 @@
+class IndicatorCache:
+    """Общие индикаторы пары: один экземпляр на класс и набор параметров.
+
+    Стратегии берут индикатор через get(), движок обновляет каждый индикатор
+    один раз на пачку трейдов через batch(), и все стратегии читают один и
+    тот же результат. Индикатор живёт, пока его держит хотя бы одна стратегия.
+    """
+
+    def __init__(self, trades):
+        self.trades = trades
+        self.indicators = {}  # ключ -> индикатор
+        self.latest = {}  # ключ -> результат последнего batch()
+        self.owners = {}  # ключ -> стратегии, которые его используют
+
+    @staticmethod
+    def key(cls, params: dict) -> tuple:
+        return cls, tuple(sorted(params.items()))
+
+    def get(self, owner, cls, **params):
+        key = self.key(cls, params)
+        if key not in self.indicators:
+            indicator = cls(**params)
+            # Прогреваем на том, что уже лежит в буфере, чтобы поздний подписчик не стартовал с нуля
+            if len(self.trades):
+                self.latest[key] = indicator.batch(self.trades.prices)
+            self.indicators[key] = indicator
+            self.owners[key] = set()
+        self.owners[key].add(owner)
+        return self.indicators[key]
+
+    def result(self, cls, **params):
+        """Что вернул batch() индикатора на последней пачке (или None до первой пачки)."""
+        return self.latest.get(self.key(cls, params))
+
+    def update(self, prices):
+        for key, indicator in self.indicators.items():
+            self.latest[key] = indicator.batch(prices)
+
+    def release(self, owner):
+        for key in [key for key, owners in self.owners.items() if owner in owners]:
+            self.owners[key].discard(owner)
+            if not self.owners[key]:
+                del self.owners[key], self.indicators[key]
+                self.latest.pop(key, None)
+
+    def __len__(self):
+        return len(self.indicators)
@@ -1,29 +1,86 @@
-from .indicator_base import IndicatorBase
+from collections import deque
+
+import numpy as np
+
+from .indicator_base import TREND_CODES, TREND_NAMES, IndicatorBase
+from .vectorized import adaptive_smooth, trend_codes
+
+RESYNC_EVERY = 100  # Раз в RESYNC_EVERY * period тиков пересчитываем сумму, чтобы не копилась ошибка
 
 class AMAIndicator(IndicatorBase):
     def __init__(self, period=10, fast=2, slow=30):
         self.period = period
         self.fast = 2 / (fast + 1)
         self.slow = 2 / (slow + 1)
-        self.prices = []
+        self.window = deque(maxlen=period)  # Последние period цен
+        self.volatility = 0.0  # Сумма |Δцены| внутри окна
+        self.count = 0
         self.current_ama = None
         self.last_trend = "sideways"
 
     def update(self, price: float):
-        self.prices.append(price)
-        if len(self.prices) > self.period:
-            change = abs(self.prices[-1] - self.prices[-self.period])
-            volatility = sum(abs(self.prices[i] - self.prices[i-1]) for i in range(-self.period+1, 0))
+        window = self.window
+        if window:
+            if len(window) == self.period:
+                self.volatility -= abs(window[1] - window[0])
+            self.volatility += abs(price - window[-1])
+        window.append(price)
+
+        self.count += 1
+        if self.count % (RESYNC_EVERY * self.period) == 0:
+            self.volatility = sum(abs(window[i] - window[i - 1]) for i in range(1, len(window)))
+
+        if self.count > self.period:
+            change = abs(price - window[0])
+            volatility = max(self.volatility, 0.0)
             er = change / volatility if volatility != 0 else 0
             sc = (er * (self.fast - self.slow) + self.slow) ** 2
 
             if self.current_ama is None:
-                self.current_ama = self.prices[-1]
+                self.current_ama = price
             else:
                 self.current_ama = self.current_ama + sc * (price - self.current_ama)
 
             delta = price - self.current_ama
             self.last_trend = "up" if delta > 0.1 else "down" if delta < -0.1 else "sideways"
 
+    def batch(self, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        prices = np.asarray(prices, dtype=np.float64)
+        values = np.full(len(prices), np.nan)
+        trends = np.full(len(prices), TREND_CODES[self.last_trend], dtype=np.int8)
+        if len(prices) == 0:
+            return values, trends
+
+        history = np.concatenate((np.fromiter(self.window, np.float64, len(self.window)), prices))
+        offset = len(self.window)
+        start = max(self.period - self.count, 0)
+        self.count += len(prices)
+        self.window.extend(prices[-self.period:].tolist())
+        self.volatility = float(np.abs(np.diff(self.window)).sum()) if len(self.window) > 1 else 0.0
+        if start >= len(prices):
+            return values, trends
+
+        # Скользящие суммы |Δцены| за period - 1 шагов через кумулятивную сумму
+        steps = np.concatenate(([0.0], np.cumsum(np.abs(np.diff(history)))))
+        index = np.arange(offset + start, len(history))
+        change = np.abs(history[index] - history[index - self.period + 1])
+        volatility = steps[index] - steps[index - self.period + 1]
+        er = np.divide(change, volatility, out=np.zeros_like(change), where=volatility > 0)
+        sc = (er * (self.fast - self.slow) + self.slow) ** 2
+
+        active = prices[start:]
+        ama = np.empty(len(active))
+        if self.current_ama is None:
+            ama[0] = active[0]
+            ama[1:] = adaptive_smooth(active[1:], sc[1:], active[0])
+        else:
+            ama[:] = adaptive_smooth(active, sc, self.current_ama)
+
+        values[start:] = ama
+        trends[start:] = trend_codes(active - ama, 0.1)
+        self.current_ama = float(ama[-1])
+        self.last_trend = TREND_NAMES[int(trends[-1])]
+        return values, trends
+
     def get_trend(self) -> str:
         return self.last_trend
@@ -0,0 +1,28 @@
+import numpy as np
+
+from .vectorized import ema_series
+
+
+class EMA:
+    """Рекурсивная экспоненциальная средняя: O(1) памяти и времени на тик."""
+    __slots__ = ['alpha', 'value', 'count']
+
+    def __init__(self, period=None, alpha=None):
+        self.alpha = alpha if alpha is not None else 2 / (period + 1)
+        self.value = None
+        self.count = 0
+
+    def update(self, price: float) -> float:
+        if self.value is None:
+            self.value = price
+        else:
+            self.value += self.alpha * (price - self.value)
+        self.count += 1
+        return self.value
+
+    def batch(self, prices: np.ndarray) -> np.ndarray:
+        result = ema_series(prices, self.alpha, self.value)
+        if len(result):
+            self.value = float(result[-1])
+            self.count += len(result)
+        return result
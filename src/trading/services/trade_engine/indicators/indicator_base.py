@@ -1,10 +1,24 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+TREND_CODES = {'up': 1, 'down': -1, 'sideways': 0}
+TREND_NAMES = {code: name for name, code in TREND_CODES.items()}
+
 class IndicatorBase(ABC):
     @abstractmethod
     def update(self, price: float) -> None:
         pass
 
+    @abstractmethod
+    def batch(self, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Векторная версия update для целого массива цен.
+
+        Возвращает (значения индикатора, тренды в кодах TREND_CODES) по каждой
+        цене и оставляет состояние таким же, как после update на каждой из них.
+        """
+        pass
+
     @abstractmethod
     def get_trend(self) -> str:
         """Return one of: 'up', 'down', 'sideways'"""
@@ -1,40 +1,62 @@
-from .indicator_base import IndicatorBase
+import numpy as np
+
+from .ema import EMA
+from .indicator_base import TREND_CODES, TREND_NAMES, IndicatorBase
+from .vectorized import forward_fill, trend_codes
 
 class MACDIndicator(IndicatorBase):
     def __init__(self, short_period=12, long_period=26, signal_period=9):
         self.short_period = short_period
         self.long_period = long_period
         self.signal_period = signal_period
-        self.prices = []
-        self.macd_line = []
-        self.signal_line = []
+        self.short_ema = EMA(short_period)
+        self.long_ema = EMA(long_period)
+        self.signal_ema = EMA(signal_period)
+        self.count = 0
+        self.macd = None
+        self.signal = None
         self.last_trend = "sideways"
 
-    def ema(self, period, prices):
-        k = 2 / (period + 1)
-        ema = prices[0]
-        for price in prices[1:]:
-            ema = price * k + ema * (1 - k)
-        return ema
-
     def update(self, price: float):
-        self.prices.append(price)
-        if len(self.prices) > self.long_period:
-            ema_short = self.ema(self.short_period, self.prices[-self.short_period:])
-            ema_long = self.ema(self.long_period, self.prices[-self.long_period:])
-            macd_value = ema_short - ema_long
-            self.macd_line.append(macd_value)
-
-            if len(self.macd_line) >= self.signal_period:
-                signal = self.ema(self.signal_period, self.macd_line[-self.signal_period:])
-                self.signal_line.append(signal)
-
-                if macd_value > signal:
-                    self.last_trend = "up"
-                elif macd_value < signal:
-                    self.last_trend = "down"
-                else:
-                    self.last_trend = "sideways"
+        self.count += 1
+        ema_short = self.short_ema.update(price)
+        ema_long = self.long_ema.update(price)
+        if self.count <= self.long_period:
+            return
+
+        self.macd = ema_short - ema_long
+        self.signal = self.signal_ema.update(self.macd)
+        if self.signal_ema.count >= self.signal_period:
+            if self.macd > self.signal:
+                self.last_trend = "up"
+            elif self.macd < self.signal:
+                self.last_trend = "down"
+            else:
+                self.last_trend = "sideways"
+
+    def batch(self, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        prices = np.asarray(prices, dtype=np.float64)
+        values = np.full(len(prices), np.nan)
+        trends = np.full(len(prices), TREND_CODES[self.last_trend], dtype=np.int8)
+
+        ema_short = self.short_ema.batch(prices)
+        ema_long = self.long_ema.batch(prices)
+        start = max(self.long_period - self.count, 0)
+        self.count += len(prices)
+        if start >= len(prices):
+            return values, trends
+
+        macd = ema_short[start:] - ema_long[start:]
+        signal_count = self.signal_ema.count
+        signal = self.signal_ema.batch(macd)
+        ready = signal_count + np.arange(1, len(macd) + 1) >= self.signal_period
+
+        values[start:] = macd
+        trends[start:] = forward_fill(trend_codes(macd - signal), ready, trends[0])
+        self.macd = float(macd[-1])
+        self.signal = float(signal[-1])
+        self.last_trend = TREND_NAMES[int(trends[-1])]
+        return values, trends
 
     def get_trend(self) -> str:
         return self.last_trend
@@ -1,23 +1,38 @@
-from .indicator_base import IndicatorBase
+import numpy as np
+
+from .indicator_base import TREND_CODES, TREND_NAMES, IndicatorBase
+from .vectorized import ema_series, forward_fill
 
 class SuperTrendIndicator(IndicatorBase):
     def __init__(self, atr_period=7, multiplier=3):
         self.atr_period = atr_period
         self.multiplier = multiplier
-        self.prices = []
+        self.prev_price = None
+        self.tr_sum = 0.0  # Сумма первых atr_period TR для затравки ATR
+        self.tr_count = 0
+        self.atr = None
         self.prev_close = None
         self.trend = "sideways"
 
     def update(self, price: float):
-        self.prices.append(price)
-        if len(self.prices) < self.atr_period + 1:
+        prev_price, self.prev_price = self.prev_price, price
+        if prev_price is None:
             return
 
-        trs = [abs(self.prices[i] - self.prices[i-1]) for i in range(-self.atr_period+1, 0)]
-        atr = sum(trs) / self.atr_period
-        hl2 = (price + self.prices[-2]) / 2
-        upper_band = hl2 + self.multiplier * atr
-        lower_band = hl2 - self.multiplier * atr
+        tr = abs(price - prev_price)
+        if self.atr is None:
+            self.tr_sum += tr
+            self.tr_count += 1
+            if self.tr_count < self.atr_period:
+                return
+            self.atr = self.tr_sum / self.atr_period
+        else:
+            # Сглаживание Уайлдера
+            self.atr += (tr - self.atr) / self.atr_period
+
+        hl2 = (price + prev_price) / 2
+        upper_band = hl2 + self.multiplier * self.atr
+        lower_band = hl2 - self.multiplier * self.atr
 
         if self.prev_close:
             if self.prev_close > upper_band:
@@ -29,5 +44,55 @@ class SuperTrendIndicator(IndicatorBase):
 
         self.prev_close = price
 
+    def batch(self, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        prices = np.asarray(prices, dtype=np.float64)
+        values = np.full(len(prices), np.nan)
+        trends = np.full(len(prices), TREND_CODES[self.trend], dtype=np.int8)
+        if len(prices) == 0:
+            return values, trends
+
+        first = 1 if self.prev_price is None else 0
+        previous = np.concatenate(([self.prev_price], prices[:-1])) if first == 0 else prices[:-1]
+        current = prices[first:]
+        trs = np.abs(current - previous)
+        self.prev_price = float(prices[-1])
+
+        start = 0
+        had_atr = self.atr is not None
+        if not had_atr:
+            needed = self.atr_period - self.tr_count
+            if len(trs) < needed:
+                self.tr_sum += float(trs.sum())
+                self.tr_count += len(trs)
+                return values, trends
+            self.atr = (self.tr_sum + float(trs[:needed].sum())) / self.atr_period
+            self.tr_count = self.atr_period
+            start = needed - 1
+
+        # Сглаживание Уайлдера - это EMA с alpha = 1 / period
+        if had_atr:
+            atr = ema_series(trs, 1 / self.atr_period, self.atr)
+        else:
+            atr = np.empty(len(trs) - start)
+            atr[0] = self.atr
+            atr[1:] = ema_series(trs[start + 1:], 1 / self.atr_period, self.atr)
+        self.atr = float(atr[-1])
+
+        hl2 = (current[start:] + previous[start:]) / 2
+        upper_band = hl2 + self.multiplier * atr
+        lower_band = hl2 - self.multiplier * atr
+        prev_close = previous[start:].copy()
+        if not had_atr:
+            prev_close[0] = np.nan  # На первом ATR сравнивать ещё не с чем
+
+        codes = np.where(prev_close > upper_band, -1, np.where(prev_close < lower_band, 1, 0))
+        valid = (prev_close > upper_band) | (prev_close < lower_band)
+        position = first + start
+        values[position:] = atr
+        trends[position:] = forward_fill(codes, valid, trends[0])
+        self.prev_close = self.prev_price
+        self.trend = TREND_NAMES[int(trends[-1])]
+        return values, trends
+
     def get_trend(self) -> str:
         return self.trend
@@ -0,0 +1,51 @@
+import numpy as np
+from scipy.signal import lfilter
+
+CHUNK = 256  # Длина куска для adaptive_smooth: произведение (1 - sc) не успевает уйти в ноль
+
+
+def ema_series(prices: np.ndarray, alpha: float, initial: float | None = None) -> np.ndarray:
+    """y[n] = y[n-1] + alpha * (x[n] - y[n-1]) одним вызовом lfilter."""
+    if len(prices) == 0:
+        return np.empty(0)
+    if initial is None:
+        initial = prices[0]
+    result, _ = lfilter([alpha], [1.0, alpha - 1.0], prices, zi=[(1.0 - alpha) * initial])
+    return result
+
+
+def adaptive_smooth(prices: np.ndarray, alphas: np.ndarray, initial: float) -> np.ndarray:
+    """Та же рекурсия, но с коэффициентом alphas[n] на каждом шаге (AMA).
+
+    Внутри куска y[k] = D[k] * (y0 + sum(a[m] * x[m] / D[m])), где D - накопленное
+    произведение (1 - a). Все слагаемые одного знака, так что точность не теряется.
+    """
+    result = np.empty(len(prices))
+    prev = initial
+    for start in range(0, len(prices), CHUNK):
+        x = prices[start:start + CHUNK]
+        a = alphas[start:start + CHUNK]
+        decay = np.cumprod(1.0 - a)
+        if decay[-1] > 1e-200:
+            y = decay * (prev + np.cumsum(a * x / decay))
+        else:
+            y = np.empty(len(x))
+            for i in range(len(x)):
+                prev = prev + a[i] * (x[i] - prev)
+                y[i] = prev
+        result[start:start + CHUNK] = y
+        prev = y[-1]
+    return result
+
+
+def forward_fill(codes: np.ndarray, valid: np.ndarray, initial: int) -> np.ndarray:
+    """Протягивает последнее валидное значение вперёд, до первого - initial."""
+    codes = np.concatenate(([initial], codes))
+    valid = np.concatenate(([True], valid))
+    index = np.where(valid, np.arange(len(codes)), 0)
+    np.maximum.accumulate(index, out=index)
+    return codes[index][1:]
+
+
+def trend_codes(delta: np.ndarray, threshold: float = 0.0) -> np.ndarray:
+    return np.where(delta > threshold, 1, np.where(delta < -threshold, -1, 0)).astype(np.int8)
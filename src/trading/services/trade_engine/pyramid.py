@@ -0,0 +1,86 @@
+import numpy as np
+
+from .ring_buffer import RingBuffer
+
+PYRAMID_COLUMNS = {
+    't': np.int64,  # epoch ms, для прореженных уровней - середина между исходными точками
+    'v': np.float64,
+}
+
+
+class MultiResolutionPyramid:
+    """Пирамида разрешений поверх RingBuffer: уровень i - 1 получает среднее
+    каждой пары точек уровня i.
+
+    Уровень levels - 1 самый подробный, 0 самый грубый. Ёмкость уровня i равна
+    base_capacity * 2 ** i, поэтому все уровни покрывают одно и то же окно
+    времени, а память на пару известна заранее (nbytes).
+    """
+
+    def __init__(self, levels: int, base_capacity: int):
+        self.levels = [RingBuffer(base_capacity * 2 ** i, PYRAMID_COLUMNS) for i in range(levels)]
+
+    def __len__(self):
+        return len(self.levels)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+    def push(self, t: int, v: float):
+        i = len(self.levels) - 1
+        self.levels[i].append(t, v)
+        # Пара закрывается на каждой второй точке уровня
+        while i > 0 and self.levels[i].total % 2 == 0:
+            (t0, t1), (v0, v1) = self.levels[i].window(2)
+            i -= 1
+            self.levels[i].append((t0 + t1) // 2, (v0 + v1) / 2)
+
+    def extend(self, times, values):
+        """Пачка точек самого подробного уровня, каскад считается массивами."""
+        times = np.asarray(times, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        for i in reversed(range(len(self.levels))):
+            level = self.levels[i]
+            if len(times) == 0:
+                return
+            # Непарная точка, оставшаяся с прошлого раза, открывает первую пару
+            unpaired = level.row(-1) if level.total % 2 else None
+            level.extend(times, values)
+            if i == 0:
+                return
+
+            if unpaired is not None:
+                times = np.concatenate(([unpaired[0]], times))
+                values = np.concatenate(([unpaired[1]], values))
+            pairs = len(times) // 2
+            times = times[:2 * pairs].reshape(pairs, 2).sum(axis=1) // 2
+            values = values[:2 * pairs].reshape(pairs, 2).mean(axis=1)
+
+    def times(self, level: int) -> np.ndarray:
+        return self.levels[level].column('t')
+
+    def values(self, level: int) -> np.ndarray:
+        """Уровень одним непрерывным массивом (view), для отрисовки и сигналов."""
+        return self.levels[level].column('v')
+
+    def last_values(self) -> np.ndarray:
+        return np.array([level.column('v', 1)[0] if len(level) else 0.0 for level in self.levels])
+
+    def clear(self):
+        for level in self.levels:
+            level.clear()
+            level.total = 0
+
+    def get_state(self) -> dict:
+        state = {'pyramid_total': np.array([level.total for level in self.levels], dtype=np.int64)}
+        for i, level in enumerate(self.levels):
+            state[f'pyramid_{i}_t'], state[f'pyramid_{i}_v'] = (column.copy() for column in level.window())
+        return state
+
+    def set_state(self, state: dict):
+        self.clear()
+        totals = state['pyramid_total']
+        for i, level in enumerate(self.levels[:len(totals)]):
+            level.extend(state[f'pyramid_{i}_t'], state[f'pyramid_{i}_v'])
+            level.total = int(totals[i])
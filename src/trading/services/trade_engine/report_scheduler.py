@@ -0,0 +1,46 @@
+import time
+
+REPORT_MIN_INTERVAL = 60.0  # Не чаще раза в минуту на пару, секунды
+REPORT_MIN_NEW_BUCKETS = 8  # Сколько новых бакетов должно закрыться с прошлого отчёта
+
+
+class ReportScheduler:
+    """Решает, пора ли строить отчёт пары.
+
+    Отчёт строится только если с прошлого появились новые бакеты, прошло
+    min_interval секунд и общий на все пары rate_limiter даёт токен.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = REPORT_MIN_INTERVAL,
+        min_new_buckets: int = REPORT_MIN_NEW_BUCKETS,
+        rate_limiter=None,
+        clock=time.monotonic,
+        enabled: bool = True,
+    ):
+        self.min_interval = min_interval
+        self.min_new_buckets = min_new_buckets
+        self.rate_limiter = rate_limiter
+        self.clock = clock
+        self.enabled = enabled
+        self.last_report = None
+        self.new_buckets = 0
+        self.reports = 0
+
+    def on_buckets(self, count: int):
+        self.new_buckets += count
+
+    def should_report(self) -> bool:
+        if not self.enabled or self.new_buckets == 0 or self.new_buckets < self.min_new_buckets:
+            return False
+        now = self.clock()
+        if self.last_report is not None and now - self.last_report < self.min_interval:
+            return False
+        if self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+            return False
+
+        self.last_report = now
+        self.new_buckets = 0
+        self.reports += 1
+        return True
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Колоночный кольцевой буфер фиксированной ёмкости.
+
+    Каждая колонка хранится в массиве двойной длины: значение пишется по
+    индексам pos и pos + capacity, поэтому последние N записей всегда лежат
+    в памяти подряд и отдаются как view без копирования.
+    """
+
+    def __init__(self, capacity: int, columns: dict):
+        if capacity <= 0:
+            raise ValueError(f"Ёмкость буфера должна быть положительной: {capacity}")
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._data = {name: np.zeros(2 * capacity, dtype=dtype) for name, dtype in columns.items()}
+        self._pos = 0
+        self._size = 0
+        self.total = 0  # Сколько записей добавлено за всё время
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self._data.values())
+
+    def append(self, *values):
+        pos = self._pos
+        for name, value in zip(self.columns, values):
+            column = self._data[name]
+            column[pos] = value
+            column[pos + self.capacity] = value
+
+        self._pos = (pos + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.total += 1
+
+    def extend(self, *arrays):
+        count = len(arrays[0])
+        if count == 0:
+            return
+        skip = max(count - self.capacity, 0)
+        written = count - skip
+
+        first = min(written, self.capacity - self._pos)
+        for name, array in zip(self.columns, arrays):
+            column = self._data[name]
+            array = np.asarray(array)[skip:]
+            for offset in (0, self.capacity):
+                start = self._pos + offset
+                column[start:start + first] = array[:first]
+                column[offset:offset + written - first] = array[first:]
+
+        self._pos = (self._pos + written) % self.capacity
+        self._size = min(self._size + written, self.capacity)
+        self.total += count
+
+    def clear(self):
+        self._pos = 0
+        self._size = 0
+
+    def column(self, name: str, n: int | None = None) -> np.ndarray:
+        """View последних n значений колонки (по умолчанию всех)."""
+        n = self._size if n is None else min(n, self._size)
+        end = self._pos + self.capacity
+        return self._data[name][end - n:end]
+
+    def window(self, n: int | None = None) -> tuple:
+        return tuple(self.column(name, n) for name in self.columns)
+
+    def row(self, index: int) -> tuple:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("Индекс за пределами буфера")
+        position = self._pos + self.capacity - self._size + index
+        return tuple(self._data[name][position] for name in self.columns)
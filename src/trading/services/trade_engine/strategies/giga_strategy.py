@@ -1,112 +1,141 @@
-from collections import deque
-from datetime import datetime, timedelta
-
-from ..valuer import Valuer
-
-
-class TradePerIntervalAggregator:
-    def __init__(self, interval = timedelta(seconds=2)):
-        self.interval = interval
-        self.current_time: datetime | None = None
-        self.current_group: list[Valuer] = []
-
-    def truncate_to_interval(self, dt: datetime) -> datetime:
-        total_seconds = (dt - datetime.min).total_seconds()
-        interval_seconds = self.interval.total_seconds()
-        bucket = int(total_seconds // interval_seconds)
-        return datetime.min + timedelta(seconds=bucket * interval_seconds)
-
-    def process_trade(self, trade: Valuer) -> list[dict]:
-        trade_time = self.truncate_to_interval(trade.t)
-        result = []
-
-        if self.current_time is None:
-            self.current_time = trade_time
-
-        if trade_time == self.current_time:
-            self.current_group.append(trade)
-            return []
-
-        # 1. Вернуть текущую группу
-        result.append({
-            "start_time": self.current_time,
-            "trades": self.current_group.copy()
-        })
-
-        # 2. Добавить пустые интервалы
-        gap = int((trade_time - self.current_time).total_seconds() // self.interval.total_seconds())
-        for i in range(1, gap):
-            result.append({
-                "start_time": self.current_time + i * self.interval,
-                "trades": []
-            })
-
-        # 3. Начать новую группу
-        self.current_time = trade_time
-        self.current_group = [trade]
-
-        return result
+import numpy as np
 
+from ...chart_reporter import ChartReporter
+from ...telega import send_telegram_image
+from ..bucket_aggregator import TradePerIntervalAggregator, expand_gaps
+from ..pyramid import MultiResolutionPyramid
 
 DIFF_LIMIT = 8
 DIFFS_COUNT = 11
+INTERVAL = 2  # Длина бакета, секунды
+STRIPE_K = 0.001  # Порог флэта для полос отчёта и сигналов
 
 class GigaStrategy:
+    name = 'GigaStrategy'
+
     def __init__(self, engine):
         self.engine = engine
         self.pair_name = engine.pair_name
         self.trades = engine.trades
 
-        self.aggregator = TradePerIntervalAggregator()
+        # Параметры можно переопределить через config['params'] движка (бэктест, свипы)
+        params = engine.config.get('params', {})
+        self.diff_limit = params.get('diff_limit', DIFF_LIMIT)
+        self.diffs_count = params.get('diffs_count', DIFFS_COUNT)
+        self.stripe_k = params.get('stripe_k', STRIPE_K)
+
+        self.aggregator = TradePerIntervalAggregator(int(params.get('interval', INTERVAL) * 1000))
 
         self.counter = 1
-        self.diffs = [deque(maxlen=DIFF_LIMIT * (2 ** i)) for i in range(DIFFS_COUNT)]
+        self.last_close = None  # Цена закрытия последнего непустого бакета
+        self.cross = {}  # EMA/AMA/ATR по бакетам от CrossPairIndicators, идут в подпись отчёта
+        # Уровень diffs_count - 1 - alfa_diff каждого бакета, каждый уровень выше усредняет пары
+        self.diffs = MultiResolutionPyramid(self.diffs_count, self.diff_limit)
 
     async def process_trade(self):
-        if len(self.diffs[DIFFS_COUNT - 1]) % 8 == 0:
-            await self.generate_report()
-
-        self.counter += 1
-        trade = self.trades[-1]
-
-        trade_groups = self.aggregator.process_trade(trade)
-        if len(trade_groups) > 0:
-            for group in trade_groups:
-                valuer = Valuer(datetime.now(), self.alfa_diff(group['trades']))
-                self.diffs[DIFFS_COUNT - 1].append(valuer)
-
-                for i in reversed(range(DIFFS_COUNT)):
-                    if len(self.diffs[i]) % 2 == 0:
-                        diff_avg = (self.diffs[i][-1].v + self.diffs[i][-2].v)/2.0
-                        self.diffs[i - 1].append(
-                            Valuer(datetime.fromtimestamp(self.diffs[i][-1].t.timestamp() + self.diffs[i][-2].t.timestamp() / 2), diff_avg)
-                        )
-                    else:
-                        break
-                    # self.print_diffs()
-
-    def alfa_diff(self, trades):
-        if len(trades) < 2:
-            return 0.0
-
-        diffs = [trades[i + 1].v - trades[i].v for i in range(len(trades) - 1)]
-
-        pos_sum = sum(d for d in diffs if d > 0)
-        neg_sum = sum(d for d in diffs if d < 0)
-
-        return pos_sum + neg_sum
+        await self.process_trades(1)
+
+    async def process_trades(self, count):
+        """Обрабатывает последние count трейдов движка одним вызовом."""
+        self.counter += count
+        _, timestamps, prices, amounts, sides = self.trades.window(count)
+        self.process_buckets(self.aggregator.add_batch(timestamps, prices, amounts, sides))
+
+        if self.engine.report_scheduler.should_report():
+            self.generate_report()
+
+    def process_buckets(self, buckets):
+        if len(buckets['start']) == 0:
+            return
+        # alfa_diff - сумма всех изменений цены внутри бакета: рост минус падение
+        alfa_diffs = buckets['up_move'] - buckets['down_move']
+        self.persist_buckets(buckets, alfa_diffs)
+        self.engine.publish_buckets(buckets)
+
+        # Пустые интервалы идут в пирамиду нулями, как и раньше
+        index, times = expand_gaps(buckets, self.aggregator.interval_ms)
+        values = np.where(times == buckets['start'][index], alfa_diffs[index], 0.0)
+        self.engine.report_scheduler.on_buckets(len(times))
+
+        recorder = self.engine.recorder
+        if recorder is None:
+            self.diffs.extend(times, values)
+        else:
+            # Бэктесту нужны сигналы после каждого бакета, поэтому по одному
+            closes = buckets['close'][index]
+            for t, value, close in zip(times.tolist(), values.tolist(), closes.tolist()):
+                self.diffs.push(t, value)
+                recorder.on_bucket(t, value, self.signals(), close)
+        self.last_close = float(buckets['close'][-1])
+
+    def on_cross_indicators(self, values):
+        self.cross = values
+
+    def report_caption(self) -> str:
+        caption = f"{self.engine.stock_name} {self.pair_name}"
+        indicators = [f"{name.upper()} {value:.6g}" for name, value in self.cross.items() if np.isfinite(value)]
+        return f"{caption} | {', '.join(indicators)}" if indicators else caption
+
+    def signals(self) -> np.ndarray:
+        """Последнее значение каждого уровня diffs в кодах полосы: 1 рост, -1 падение, 0 флэт."""
+        last = self.diffs.last_values()
+        return np.where(last > self.stripe_k, 1, np.where(last < -self.stripe_k, -1, 0)).astype(np.int8)
+
+    def get_state(self) -> dict:
+        """Состояние для снапшота: уровни diffs и недособранный бакет агрегатора."""
+        return {
+            'counter': np.array([self.counter]),
+            **self.diffs.get_state(),
+            **self.aggregator.get_state(),
+        }
+
+    def set_state(self, state: dict):
+        self.counter = int(state['counter'][0])
+        # Снапшоты до пирамиды хранили уровни иначе - такие начинаем с пустых уровней
+        if 'pyramid_total' in state:
+            self.diffs.set_state(state)
+        else:
+            self.diffs.clear()
+
+        if 'aggregator_start' in state:
+            self.aggregator.set_state(state)
+
+    def persist_buckets(self, buckets, alfa_diffs):
+        if self.engine.tick_writer is None:
+            return
+        columns = ('start', 'open', 'high', 'low', 'close', 'volume', 'count')
+        for row in zip(*(buckets[name].tolist() for name in columns), alfa_diffs.tolist()):
+            self.engine.persist_bucket(self.aggregator.interval_ms, row)
 
     # def print_diffs(self):
     #     print("================================================")
     #     print(self.pair_name)
-    #     for i in reversed(range(DIFFS_COUNT)):
-    #         print(f'{i:2} - {len(self.diffs[i]):10} - {self.diffs[i].maxlen}')
+    #     for i in reversed(range(self.diffs_count)):
+    #         print(f'{i:2} - {len(self.diffs.levels[i]):10} - {self.diffs.levels[i].capacity}')
     #     print("================================================")
 
-    async def generate_report(self):
-        img_paths = []
-        for i in reversed(range(DIFFS_COUNT)):
-            img_path = f"{self.engine.stock_name}_{self.pair_name}_{i}.png"
-            img_paths.append(img_path)
-            await self.engine.chart_reporter.draw_valuer_stripe(self.diffs[i], img_path)
-        await self.engine.chart_reporter.concatenate_images_vertically(img_paths, "lalalalla.png")
+    def generate_report(self):
+        levels = [self.diffs.values(i).copy() for i in range(self.diffs_count)]
+        caption = self.report_caption()
+        notifier = self.engine.notifier
+        if notifier is None:
+            self.engine.submit_report(
+                render_report, self.engine.stock_name, self.pair_name, levels, self.stripe_k, True, caption,
+            )
+            return
+        self.engine.submit_report(
+            render_report, self.engine.stock_name, self.pair_name, levels, self.stripe_k, False,
+            callback=lambda png: notifier.send_photo(caption, png, key=self.pair_name),
+        )
+
+
+def render_report(stock_name, pair_name, levels, k=STRIPE_K, send=True, caption=None):
+    """Выполняется в процессе ReportExecutor, поэтому получает только массивы.
+
+    PNG собирается в памяти; при send=True сразу уходит в Telegram, иначе
+    возвращается в event loop для TelegramNotifier. Архив на диске - по настройке.
+    """
+    png = ChartReporter(pair_name).draw_valuer_stripes(levels[::-1], k=k)
+    if send:
+        send_telegram_image(caption or f"{stock_name} {pair_name}", png)
+    return png
@@ -0,0 +1,42 @@
+from functools import cache
+from importlib import import_module
+from importlib.metadata import entry_points
+
+from django.conf import settings
+
+from .strategies.giga_strategy import GigaStrategy
+
+ENTRY_POINT_GROUP = 'trading.strategies'  # Группа entry points для стратегий из сторонних пакетов
+
+STRATEGIES = {
+    'GigaStrategy': GigaStrategy,
+}
+
+
+def import_string(path: str):
+    module, _, name = path.rpartition('.')
+    return getattr(import_module(module), name)
+
+
+@cache
+def load_strategies() -> dict:
+    """Встроенные стратегии, затем entry points, затем settings.TRADING_STRATEGIES (имя -> путь к классу).
+
+    Более поздний источник перекрывает стратегию с тем же именем.
+    """
+    strategies = dict(STRATEGIES)
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            strategies[entry_point.name] = entry_point.load()
+        except Exception as e:
+            print(f"⚠️ Strategy entry point {entry_point.name} failed to load: {e}")
+    for name, path in getattr(settings, 'TRADING_STRATEGIES', {}).items():
+        strategies[name] = import_string(path) if isinstance(path, str) else path
+    return strategies
+
+
+def get_strategy(name: str):
+    strategies = load_strategies()
+    if name not in strategies:
+        raise KeyError(f"Неизвестная стратегия {name}, доступны: {', '.join(sorted(strategies))}")
+    return strategies[name]
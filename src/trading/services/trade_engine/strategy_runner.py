@@ -0,0 +1,195 @@
+import asyncio
+import multiprocessing
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from ..metrics import LatencyHistogram
+
+POLICIES = ('every', 'latest')
+ISOLATED_WORKERS = 2  # Процессов на одну изолированную стратегию, общих для всех пар
+
+_isolated_engines = {}  # (биржа, пара) -> TradeEngine внутри процесса изолированной стратегии
+_isolated_loop = None  # Один event loop на процесс, а не новый на каждую пачку
+
+
+def init_isolated():
+    import django
+    import matplotlib
+    matplotlib.use('Agg')
+    django.setup()
+
+    global _isolated_loop
+    _isolated_loop = asyncio.new_event_loop()
+
+
+def feed_isolated(config, columns):
+    key = (config['stock_name'], config['pair_name'])
+    engine = _isolated_engines.get(key)
+    if engine is None:
+        from .trade_engine import TradeEngine
+        engine = _isolated_engines[key] = TradeEngine(config)
+    return _isolated_loop.run_until_complete(engine.add_arrays(*columns))
+
+
+def release_isolated(stock_name, pair_name):
+    engine = _isolated_engines.pop((stock_name, pair_name), None)
+    if engine is not None:
+        engine.close()
+
+
+class IsolatedPool:
+    """Процессы одной изолированной стратегии, общие для всех движков.
+
+    Пара всегда попадает в один и тот же процесс (по crc32 имени), поэтому
+    её TradeEngine живёт там между пачками. Процессы стартуют по первой
+    пачке, пул закрывается вместе с последним использующим его движком.
+    """
+
+    pools = {}  # имя стратегии -> IsolatedPool
+
+    def __init__(self, name, workers=ISOLATED_WORKERS):
+        self.name = name
+        context = multiprocessing.get_context('spawn')
+        self.executors = [
+            ProcessPoolExecutor(1, mp_context=context, initializer=init_isolated) for _ in range(workers)
+        ]
+        self.users = 0
+
+    @classmethod
+    def acquire(cls, name):
+        pool = cls.pools.get(name)
+        if pool is None:
+            pool = cls.pools[name] = cls(name)
+        pool.users += 1
+        return pool
+
+    def executor(self, pair_name):
+        return self.executors[zlib.crc32(pair_name.encode()) % len(self.executors)]
+
+    def release(self, stock_name, pair_name):
+        self.users -= 1
+        if self.users > 0:
+            self.executor(pair_name).submit(release_isolated, stock_name, pair_name)
+            return
+        if self.pools.get(self.name) is self:
+            del self.pools[self.name]
+        self.shutdown(wait=False)
+
+    def shutdown(self, wait=True):
+        for executor in self.executors:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+class IsolatedStrategy:
+    """Стратегия в отдельном процессе со своим TradeEngine.
+
+    В основном процессе остаётся только этот прокси: новые трейды уходят
+    в процесс колонками, поэтому тяжёлая стратегия не держит event loop.
+    Процессы общие для всех пар с этой стратегией (IsolatedPool).
+    Состояние такой стратегии в снапшоты не попадает.
+    """
+
+    def __init__(self, engine, name):
+        self.engine = engine
+        self.name = name
+        self.config = {
+            key: engine.config[key]
+            for key in ('pair_name', 'stock_name', 'limit', 'params', 'report_schedule')
+            if key in engine.config
+        }
+        self.config['enabled_strategies'] = [name]
+        self.pool = IsolatedPool.acquire(name)
+
+    async def process_trade(self):
+        await self.process_trades(1)
+
+    async def process_trades(self, count):
+        columns = tuple(column.copy() for column in self.engine.trades.window(count))
+        executor = self.pool.executor(self.engine.pair_name)
+        await asyncio.get_running_loop().run_in_executor(executor, feed_isolated, self.config, columns)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self.engine.stock_name, self.engine.pair_name)
+            self.pool = None
+
+
+class StrategyRunner:
+    """Вызывает стратегию и меряет, сколько она занимает.
+
+    inline - стратегия вызывается прямо из TradeEngine.add*, как раньше.
+    Иначе у стратегии своя очередь и задача: движок только отмечает, что
+    пришли трейды, и сразу возвращается к сокету. Пока стратегия занята,
+    уведомления сливаются по policy:
+      every  - при следующем вызове стратегия получает все пропущенные трейды
+               одной пачкой (но не больше, чем помещается в буфер);
+      latest - только последнюю пачку, более старые пропускаются.
+    """
+
+    def __init__(self, engine, strategy, policy='every', inline=True):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная policy {policy}, доступны: {', '.join(POLICIES)}")
+        self.engine = engine
+        self.strategy = strategy
+        self.policy = policy
+        self.inline = inline
+        self.latency = LatencyHistogram()
+        self.seen = engine.trades.total  # Сколько трейдов движка стратегия уже получила
+        self.latest = 0
+        self.dropped = 0
+        self.failed = 0
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    async def notify(self, count):
+        if self.inline:
+            self.seen = self.engine.trades.total
+            await self.run(count)
+            return
+
+        self.latest = count
+        self.wakeup.set()
+        if self.task is None:
+            self.task = asyncio.create_task(self.loop())
+
+    async def loop(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            total = self.engine.trades.total
+            pending = total - self.seen
+            count = pending if self.policy == 'every' else min(self.latest, pending)
+            count = min(count, len(self.engine.trades))
+            self.dropped += pending - count
+            self.seen = total
+            if count > 0:
+                await self.run(count)
+
+    async def run(self, count):
+        started = time.perf_counter()
+        try:
+            await self.strategy.process_trades(count)
+        except Exception as e:
+            if self.inline:
+                raise
+            self.failed += 1
+            print(f"[{self.engine.pair_name}] {self.strategy.name} failed: {e}")
+        finally:
+            self.latency.observe(time.perf_counter() - started)
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if hasattr(self.strategy, 'close'):
+            self.strategy.close()
+
+    def metrics(self) -> dict:
+        return {
+            **self.latency.summary(),
+            'policy': self.policy,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
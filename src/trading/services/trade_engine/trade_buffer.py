@@ -0,0 +1,95 @@
+from datetime import UTC, datetime
+
+import numpy as np
+
+from .ring_buffer import RingBuffer
+from .valuer import Valuer
+
+SIDES = {'buy': 1, 'sell': -1}
+
+TRADE_COLUMNS = {
+    'id': np.int64,  # id трейда на бирже, 0 - неизвестен
+    'timestamp': np.int64,  # epoch ms
+    'price': np.float64,
+    'amount': np.float64,
+    'side': np.int8,  # 1 - buy, -1 - sell, 0 - неизвестно
+}
+
+
+class TradeBuffer(RingBuffer):
+    """Хранилище последних трейдов пары фиксированного размера.
+
+    Колонки доступны как непрерывные массивы (timestamps, prices, ...), а
+    индексация buffer[-1] по-прежнему возвращает Valuer для старого кода.
+    Трейды с id не больше последнего принятого считаются повторами и
+    отбрасываются, поэтому догрузку после переподключения можно лить как есть.
+    """
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity, TRADE_COLUMNS)
+        self.last_id = 0
+
+    def clear(self):
+        super().clear()
+        self.last_id = 0
+
+    def add(self, trade) -> bool:
+        trade_id = int(trade['id'] or 0)
+        if 0 < trade_id <= self.last_id:
+            return False
+        self.last_id = max(self.last_id, trade_id)
+        self.append(trade_id, trade['timestamp'], trade['price'], trade['amount'] or 0.0, SIDES.get(trade['side'], 0))
+        return True
+
+    def add_many(self, trades) -> int:
+        """Добавляет пачку трейдов, возвращает сколько из них новых."""
+        return self.add_arrays(
+            np.fromiter((int(trade['id'] or 0) for trade in trades), np.int64, len(trades)),
+            np.fromiter((trade['timestamp'] for trade in trades), np.int64, len(trades)),
+            np.fromiter((trade['price'] for trade in trades), np.float64, len(trades)),
+            np.fromiter((trade['amount'] or 0.0 for trade in trades), np.float64, len(trades)),
+            np.fromiter((SIDES.get(trade['side'], 0) for trade in trades), np.int8, len(trades)),
+        )
+
+    def add_arrays(self, ids, timestamps, prices, amounts, sides) -> int:
+        """То же, что add_many, но для уже разложенных по колонкам трейдов."""
+        columns = (ids, timestamps, prices, amounts, sides)
+        fresh = (ids == 0) | (ids > self.last_id)
+        if not fresh.all():
+            columns = tuple(column[fresh] for column in columns)
+        if len(columns[0]) == 0:
+            return 0
+
+        self.last_id = max(self.last_id, int(columns[0].max()))
+        self.extend(*columns)
+        return len(columns[0])
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.column('id')
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.column('timestamp')
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self.column('price')
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self.column('amount')
+
+    @property
+    def sides(self) -> np.ndarray:
+        return self.column('side')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        _, timestamp, price, _, _ = self.row(index)
+        return Valuer(datetime.fromtimestamp(int(timestamp) / 1000, UTC).replace(tzinfo=None), float(price))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
@@ -1,49 +1,222 @@
-from datetime import datetime
-from collections import deque
 import asyncio
+import time
 
-from .strategies.giga_strategy import GigaStrategy
-from .valuer import Valuer
-from ..chart_reporter import ChartReporter
+from .candles import CandleBuilder
+from .indicator_cache import IndicatorCache
+from .report_scheduler import ReportScheduler
+from .strategy_registry import get_strategy
+from .strategy_runner import IsolatedStrategy, StrategyRunner
+from .trade_buffer import TradeBuffer
 
-STRATEGIES = {
-    'GigaStrategy': GigaStrategy,
-}
 
 class TradeEngine:
     def __init__(self, config):
         self.pair_name = config['pair_name']
         self.stock_name = config['stock_name']
         self.config = config
-        self.trades = deque(maxlen=self.config['limit'])
-        self.chart_reporter = ChartReporter(self.pair_name)
+        self.trades = TradeBuffer(self.config['limit'])
+        self.indicators = IndicatorCache(self.trades)  # Общие для всех стратегий пары
+        self.candles = None  # CandleBuilder, создаётся при первой подписке на свечи
+        self.candle_subscribers = {}  # подписчик -> {таймфрейм: callback или None}
+        self.report_executor = config.get('report_executor')
+        self.tick_writer = config.get('tick_writer')  # TickWriter, если трейды пишем в Postgres
+        self.notifier = config.get('notifier')  # TelegramNotifier; без него отчёт отправляет воркер сам
+        self.recorder = config.get('recorder')  # BacktestRecorder при прогоне истории
+        self.cross_pair = config.get('cross_pair')  # CrossPairIndicators, общий для пар процесса
+        self.cross_values = {}  # Последние EMA/AMA/ATR пары от CrossPairIndicators
+        if self.cross_pair is not None:
+            self.cross_pair.register(self)
+        # В бэктесте время идёт по трейдам, а не по часам процесса
+        self.clock = self.trade_clock if config.get('virtual_clock') else time.monotonic
+        self.report_scheduler = ReportScheduler(
+            **config.get('report_schedule', {}),
+            rate_limiter=config.get('report_rate_limiter'),
+            clock=self.clock,
+        )
 
-        self.strategies = None
+        # inline - стратегии вызываются прямо из add*, queued - у каждой своя очередь и задача
+        self.strategy_mode = config.get('strategy_mode', 'inline')
+        self.strategies = []
+        self.runners = {}
         self.init_strategies(config)
 
     def init_strategies(self, config):
-        self.strategies = [STRATEGIES[name](self) for name in config['enabled_strategies']]
+        """config['strategy_options'][name]: policy ('every'/'latest') и process (отдельный процесс)."""
+        options = config.get('strategy_options', {})
+        for name in config['enabled_strategies']:
+            strategy_options = options.get(name, {})
+            if strategy_options.get('process'):
+                strategy = IsolatedStrategy(self, name)
+            else:
+                strategy = get_strategy(name)(self)
+            self.add_strategy(strategy, policy=strategy_options.get('policy', 'every'))
 
-    def add_strategy(self, strategy):
+    def add_strategy(self, strategy, policy='every'):
         self.strategies.append(strategy)
+        self.runners[strategy] = StrategyRunner(self, strategy, policy, inline=self.strategy_mode == 'inline')
 
     def remove_strategy(self, strategy):
         self.strategies.remove(strategy)
+        self.runners.pop(strategy).close()
+        self.indicators.release(strategy)
+        self.unsubscribe_candles(strategy)
+
+    def indicator(self, strategy, cls, **params):
+        """Индикатор из общего кэша пары; освобождается при remove_strategy."""
+        return self.indicators.get(strategy, cls, **params)
+
+    def subscribe_candles(self, owner, timeframe, callback=None):
+        """Подписка на свечи таймфрейма из общего CandleBuilder пары.
+
+        callback(timeframe, candles) вызывается с закрытыми свечами каждой
+        пачки. Возвращает builder, последние свечи читаются через candles(timeframe).
+        """
+        if self.candles is None:
+            options = self.config.get('candles', {})
+            self.candles = CandleBuilder(**options)
+            # Как и индикаторы, прогреваем на том, что уже лежит в буфере
+            self.rebuild_candles()
+        if timeframe not in self.candles.levels:
+            raise KeyError(f"Таймфрейм {timeframe} не включён в config['candles']")
+        self.candle_subscribers.setdefault(owner, {})[timeframe] = callback
+        return self.candles
+
+    def unsubscribe_candles(self, owner):
+        self.candle_subscribers.pop(owner, None)
+        if not self.candle_subscribers:
+            self.candles = None
+
+    def rebuild_candles(self):
+        if self.candles is not None:
+            self.candles.clear()
+            if len(self.trades):
+                self.candles.add_batch(*self.trades.window()[1:])
+
+    def update_candles(self, count):
+        closed = self.candles.add_batch(*self.trades.window(count)[1:])
+        for subscriptions in list(self.candle_subscribers.values()):
+            for timeframe, callback in subscriptions.items():
+                if callback is not None and timeframe in closed:
+                    callback(timeframe, closed[timeframe])
+
+    def close(self):
+        for strategy in list(self.strategies):
+            self.remove_strategy(strategy)
+        self.candle_subscribers.clear()
+        self.candles = None
+        if self.cross_pair is not None:
+            self.cross_pair.unregister(self)
+
+    def mark_processed(self):
+        """Уже лежащие в буфере трейды (например, из снапшота) стратегиям из очередей не отдаём."""
+        for runner in self.runners.values():
+            runner.seen = self.trades.total
+        # Свечи в снапшот не пишутся: пересобираем по восстановленному буферу
+        self.rebuild_candles()
+
+    def strategy_metrics(self) -> dict:
+        """Задержки стратегий: имя -> LatencyHistogram.summary() плюс policy и счётчики пропусков."""
+        return {strategy.name: self.runners[strategy].metrics() for strategy in self.strategies}
 
     def list_strategy(self):
         return [strategy.name for strategy in self.strategies]
 
+    def snapshot_state(self) -> dict:
+        """Состояние стратегий в виде плоского словаря массивов для EngineSnapshotStore."""
+        state = {}
+        for strategy in self.strategies:
+            if hasattr(strategy, 'get_state'):
+                for key, value in strategy.get_state().items():
+                    state[f'{strategy.name}.{key}'] = value
+        return state
+
+    def restore_state(self, state: dict):
+        for strategy in self.strategies:
+            prefix = f'{strategy.name}.'
+            strategy_state = {key[len(prefix):]: value for key, value in state.items() if key.startswith(prefix)}
+            if strategy_state and hasattr(strategy, 'set_state'):
+                strategy.set_state(strategy_state)
+
+    def submit_report(self, job, *args, callback=None):
+        """Отдаёт отрисовку отчёта в пул процессов, чтобы не блокировать поток трейдов.
+
+        job и args должны сериализоваться pickle. Без executor (тесты, отладка)
+        отчёт строится прямо здесь.
+        """
+        if self.report_executor is not None:
+            return self.report_executor.submit(self.pair_name, job, *args, callback=callback)
+
+        result = job(*args)
+        if callback is not None:
+            callback(result)
+        return True
+
     # {'info': {'e': 'trade', 'E': 1750958244666, 's': 'BTCUSDT', 't': 5048890612, 'p': '107275.00000000',
     #           'q': '0.01770000', 'T': 1750958244666, 'm': True, 'M': True}, 'timestamp': 1750958244666,
     #  'datetime': '2025-06-26T17:17:24.666Z', 'symbol': 'BTC/USDT', 'id': '5048890612', 'order': None, 'type': None,
     #  'side': 'sell', 'takerOrMaker': None, 'price': 107275.0, 'amount': 0.0177, 'cost': 1898.7675,
     #  'fee': {'cost': None, 'currency': None}, 'fees': []}
     async def add(self, trade):
-        dt = datetime.fromisoformat(trade['datetime'].replace("Z", "+00:00")).replace(tzinfo=None)
-        self.trades.append(Valuer(dt, trade['price']))
-        await self.on_update()
+        if self.trades.add(trade):
+            self.persist_trades(1)
+            await self.on_update()
+
+    async def add_many(self, trades):
+        """Принимает всю пачку из watch_trades за один вызов, повторы отбрасываются."""
+        if not trades:
+            return 0
+        count = self.trades.add_many(trades)
+        if count:
+            self.persist_trades(count)
+            await self.on_update_many(count)
+        return count
+
+    async def add_arrays(self, ids, timestamps, prices, amounts, sides):
+        """Пачка трейдов колонками - для бэктеста и восстановления без словарей ccxt."""
+        count = self.trades.add_arrays(ids, timestamps, prices, amounts, sides)
+        if count:
+            self.persist_trades(count)
+            await self.on_update_many(count)
+        return count
+
+    def trade_clock(self) -> float:
+        """Виртуальные часы: время последнего трейда в секундах."""
+        if len(self.trades) == 0:
+            return 0.0
+        return float(self.trades.column('timestamp', 1)[0]) / 1000
+
+    def persist_trades(self, count):
+        if self.tick_writer is not None:
+            self.tick_writer.put_trades(self.stock_name, self.pair_name, *self.trades.window(count))
+
+    def publish_buckets(self, buckets):
+        """Закрытые бакеты стратегии для общего расчёта индикаторов по всем парам."""
+        if self.cross_pair is not None:
+            self.cross_pair.collect(self, buckets)
+
+    def cross_indicators(self) -> dict:
+        """EMA/AMA/ATR пары по бакетам из CrossPairIndicators на последний тик."""
+        return self.cross_values
+
+    def on_cross_indicators(self, values: dict):
+        """Вызывается CrossPairIndicators после step(): значения уходят стратегиям, которым они нужны."""
+        self.cross_values = values
+        for strategy in self.strategies:
+            if hasattr(strategy, 'on_cross_indicators'):
+                strategy.on_cross_indicators(values)
+
+    def persist_bucket(self, interval_ms, row):
+        if self.tick_writer is not None:
+            self.tick_writer.put_bucket(self.stock_name, self.pair_name, interval_ms, row)
 
     async def on_update(self) -> None:
+        await self.on_update_many(1)
+
+    async def on_update_many(self, count) -> None:
+        if len(self.indicators):
+            self.indicators.update(self.trades.column('price', count))
+        if self.candles is not None:
+            self.update_candles(count)
         await asyncio.gather(
-            *[strategy.process_trade() for strategy in self.strategies]
+            *[self.runners[strategy].notify(count) for strategy in self.strategies]
         )
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import numpy as np
+
+from .trade_engine.trade_buffer import SIDES, TRADE_COLUMNS
+
+
+def from_columns(columns: dict) -> dict:
+    """Приводит колонки к TRADE_COLUMNS; id и side необязательны, side может быть строкой."""
+    count = len(columns['timestamp'])
+    trades = {}
+    for name, dtype in TRADE_COLUMNS.items():
+        if name not in columns:
+            trades[name] = np.zeros(count, dtype=dtype)
+            continue
+        column = np.asarray(columns[name])
+        if name == 'side' and column.dtype.kind in 'OUS':
+            column = np.array([SIDES.get(str(side), 0) for side in column])
+        trades[name] = column.astype(dtype, copy=False)
+    return trades
+
+
+def load_csv(path) -> dict:
+    data = np.genfromtxt(path, delimiter=',', names=True, dtype=None, encoding='utf-8')
+    return from_columns({name: np.atleast_1d(data[name]) for name in data.dtype.names})
+
+
+def load_npz(path) -> dict:
+    with np.load(path) as data:
+        return from_columns({name: data[name] for name in data.files})
+
+
+def load_parquet(path) -> dict:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Для Parquet нужен pyarrow") from e
+    table = pq.read_table(path)
+    return from_columns({name: table.column(name).to_numpy() for name in table.column_names})
+
+
+LOADERS = {
+    '.csv': load_csv,
+    '.npz': load_npz,
+    '.parquet': load_parquet,
+}
+
+
+def load_columns(path) -> dict:
+    """Каталог из <колонка>.npy: массивы открываются через mmap и делятся между процессами через page cache."""
+    return {name: np.load(Path(path) / f'{name}.npy', mmap_mode='r') for name in TRADE_COLUMNS}
+
+
+def save_columns(path, trades: dict):
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for name in TRADE_COLUMNS:
+        np.save(path / f'{name}.npy', trades[name])
+
+
+def load_trades(path) -> dict:
+    """Загружает записанные трейды в колонки id/timestamp/price/amount/side, отсортированные по времени."""
+    path = Path(path)
+    if path.is_dir():
+        return load_columns(path)
+    loader = LOADERS.get(path.suffix.lower())
+    if loader is None:
+        raise ValueError(f"Неизвестный формат трейдов: {path.name}")
+
+    trades = loader(path)
+    order = np.argsort(trades['timestamp'], kind='stable')
+    if not (order[1:] > order[:-1]).all():
+        trades = {name: column[order] for name, column in trades.items()}
+    return trades
+
+
+def save_npz(path, trades: dict):
+    np.savez(path, **{name: trades[name] for name in TRADE_COLUMNS})
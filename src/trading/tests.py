@@ -0,0 +1,1507 @@
+import asyncio
+import io
+import json
+import operator
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from trading.services import runtime
+from trading.services.backtest import run_backtest, simulate
+from trading.services.binance_stream import BinanceBatchTradeStream
+from trading.services.chart_reporter import (
+    ChartReporter,
+    decimate,
+    stack_vertically,
+)
+from trading.services.cross_pair import CrossPairIndicators
+from trading.services.metrics import ThroughputMeter
+from trading.services.notifier import TelegramNotifier
+from trading.services.rate_limiter import TokenBucket
+from trading.services.report_executor import ReportExecutor
+from trading.services.sharded_stream import (
+    ShardedTradeStream,
+    partition_of,
+    split_symbols,
+)
+from trading.services.snapshot_store import EngineSnapshotStore
+from trading.services.stripe_renderer import COLORS, MARGIN, render_stripes
+from trading.services.sweep import (
+    Sweep,
+    evaluate,
+    grid,
+    random_search,
+    simulate_signals,
+)
+from trading.services.symbol_universe import REFRESH_LOCK_KEY, SymbolUniverse
+from trading.services.tick_writer import TickWriter, to_timestamps
+from trading.services.trade_engine.bucket_aggregator import (
+    TradePerIntervalAggregator,
+)
+from trading.services.trade_engine.candles import TIMEFRAMES, CandleBuilder
+from trading.services.trade_engine.indicators.ama_indicator import AMAIndicator
+from trading.services.trade_engine.indicators.ema import EMA
+from trading.services.trade_engine.indicators.indicator_base import TREND_NAMES
+from trading.services.trade_engine.indicators.macd_indicator import (
+    MACDIndicator,
+)
+from trading.services.trade_engine.indicators.supertrend_indicator import (
+    SuperTrendIndicator,
+)
+from trading.services.trade_engine.pyramid import MultiResolutionPyramid
+from trading.services.trade_engine.report_scheduler import ReportScheduler
+from trading.services.trade_engine.strategy_registry import (
+    get_strategy,
+    load_strategies,
+)
+from trading.services.trade_engine.strategy_runner import (
+    IsolatedPool,
+    IsolatedStrategy,
+)
+from trading.services.trade_engine.trade_buffer import TradeBuffer
+from trading.services.trade_engine.trade_engine import TradeEngine
+from trading.services.trade_source import load_trades
+
+
+def make_trade(timestamp, price, amount=1.0, side="buy", trade_id=None):
+    return {
+        "id": str(trade_id if trade_id is not None else timestamp),
+        "timestamp": timestamp,
+        "price": price,
+        "amount": amount,
+        "side": side,
+    }
+
+
+def make_engine(**overrides):
+    config = {
+        "enabled_strategies": [],
+        "pair_name": "BTC/USDT",
+        "stock_name": "binance",
+        "limit": 100,
+    }
+    config.update(overrides)
+    return TradeEngine(config)
+
+
+class RecordingStrategy:
+    name = "recording"
+
+    def __init__(self):
+        self.calls = []
+
+    async def process_trade(self):
+        self.calls.append(1)
+
+    async def process_trades(self, count):
+        self.calls.append(count)
+
+
+class TradeEngineTests(SimpleTestCase):
+    def test_add_many_keeps_whole_burst(self):
+        """add_many should store every trade and notify strategies once."""
+        engine = make_engine()
+        strategy = RecordingStrategy()
+        engine.add_strategy(strategy)
+
+        trades = [make_trade(1750958244000 + i, 100.0 + i) for i in range(5)]
+        asyncio.run(engine.add_many(trades))
+
+        self.assertEqual(len(engine.trades), 5)
+        self.assertEqual(engine.trades[-1].v, 104.0)
+        self.assertEqual(strategy.calls, [5])
+
+
+class TradeBufferTests(SimpleTestCase):
+    def test_window_is_contiguous_after_wraparound(self):
+        """Last N trades should come back in order as contiguous views."""
+        buffer = TradeBuffer(4)
+        for i in range(6):
+            buffer.add(make_trade(1000 + i, float(i), side="sell"))
+
+        prices = buffer.prices
+        self.assertEqual(prices.tolist(), [2.0, 3.0, 4.0, 5.0])
+        self.assertTrue(prices.flags["C_CONTIGUOUS"])
+        self.assertEqual(buffer.sides.tolist(), [-1, -1, -1, -1])
+        self.assertEqual(buffer.column("timestamp", 2).tolist(), [1004, 1005])
+        self.assertEqual(buffer.total, 6)
+
+    def test_add_many_matches_add(self):
+        """Batch extend should leave the same state as per-trade appends."""
+        trades = [make_trade(1000 + i, float(i)) for i in range(11)]
+        one_by_one = TradeBuffer(8)
+        for trade in trades[:3]:
+            one_by_one.add(trade)
+        one_by_one.add_many(trades[3:])
+
+        batched = TradeBuffer(8)
+        batched.add_many(trades)
+
+        for column in ("id", "timestamp", "price", "amount", "side"):
+            np.testing.assert_array_equal(one_by_one.column(column), batched.column(column))
+
+    def test_duplicates_are_dropped(self):
+        """Trades with ids already in the buffer should be ignored."""
+        buffer = TradeBuffer(8)
+        self.assertEqual(buffer.add_many([make_trade(1000 + i, 1.0, trade_id=i) for i in range(1, 4)]), 3)
+        self.assertFalse(buffer.add(make_trade(1002, 1.0, trade_id=2)))
+        self.assertEqual(buffer.add_many([make_trade(1000 + i, 1.0, trade_id=i) for i in range(2, 6)]), 2)
+        self.assertEqual(buffer.ids.tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(buffer.last_id, 5)
+
+    def test_valuer_shim(self):
+        """Index access should keep returning Valuer objects."""
+        buffer = TradeBuffer(4)
+        buffer.add(make_trade(1750958244666, 107275.0))
+
+        valuer = buffer[-1]
+        self.assertEqual(valuer.v, 107275.0)
+        self.assertEqual(valuer.t.isoformat(), "2025-06-26T17:17:24.666000")
+
+
+def random_walk(size, seed=7):
+    rng = np.random.default_rng(seed)
+    return (100 + np.cumsum(rng.normal(0, 0.5, size))).tolist()
+
+
+def reference_ema(prices, period):
+    k = 2 / (period + 1)
+    result = [prices[0]]
+    for price in prices[1:]:
+        result.append(price * k + result[-1] * (1 - k))
+    return result
+
+
+class StreamingIndicatorTests(SimpleTestCase):
+    """Streaming indicators should match a full recomputation over history."""
+
+    def test_macd_matches_reference(self):
+        prices = random_walk(500)
+        macd = MACDIndicator()
+        short = reference_ema(prices, 12)
+        long = reference_ema(prices, 26)
+        line = [s - lg for s, lg in zip(short[26:], long[26:])]
+        signal = reference_ema(line, 9)
+
+        for i, price in enumerate(prices):
+            macd.update(price)
+            if i >= 26:
+                self.assertAlmostEqual(macd.macd, line[i - 26], places=9)
+                self.assertAlmostEqual(macd.signal, signal[i - 26], places=9)
+
+    def test_ama_matches_reference(self):
+        prices = random_walk(3000)
+        period, fast, slow = 10, 2 / 3, 2 / 31
+        ama = AMAIndicator(period=period)
+        expected = None
+
+        for i, price in enumerate(prices):
+            ama.update(price)
+            history = prices[:i + 1]
+            if len(history) <= period:
+                continue
+            change = abs(history[-1] - history[-period])
+            volatility = sum(abs(history[j] - history[j - 1]) for j in range(-period + 1, 0))
+            er = change / volatility if volatility != 0 else 0
+            sc = (er * (fast - slow) + slow) ** 2
+            expected = price if expected is None else expected + sc * (price - expected)
+            self.assertAlmostEqual(ama.current_ama, expected, places=9)
+
+    def test_supertrend_uses_wilder_atr(self):
+        prices = random_walk(500)
+        period = 7
+        supertrend = SuperTrendIndicator(atr_period=period)
+        trs = [abs(prices[i] - prices[i - 1]) for i in range(1, len(prices))]
+        atr = sum(trs[:period]) / period
+
+        for i, price in enumerate(prices):
+            supertrend.update(price)
+            if i == period:
+                self.assertAlmostEqual(supertrend.atr, atr, places=9)
+            elif i > period:
+                atr = (atr * (period - 1) + trs[i - 1]) / period
+                self.assertAlmostEqual(supertrend.atr, atr, places=9)
+        self.assertIn(supertrend.get_trend(), ("up", "down", "sideways"))
+
+
+class BatchIndicatorTests(SimpleTestCase):
+    """batch() should reproduce update() tick by tick, including across calls."""
+
+    def assert_batch_matches_stream(self, factory, value_of, splits=(0, 5, 37, 400)):
+        prices = random_walk(1200, seed=11)
+        streaming = factory()
+        expected_values, expected_trends = [], []
+        for price in prices:
+            streaming.update(price)
+            value = value_of(streaming)
+            expected_values.append(np.nan if value is None else value)
+            expected_trends.append(streaming.get_trend())
+
+        batched = factory()
+        chunks = np.split(np.asarray(prices), splits[1:])
+        results = [batched.batch(chunk) for chunk in chunks]
+        values = np.concatenate([values for values, _ in results])
+        trends = np.concatenate([trends for _, trends in results])
+
+        np.testing.assert_allclose(values, expected_values, rtol=1e-9, atol=1e-9)
+        self.assertEqual(
+            [TREND_NAMES[int(code)] for code in trends], expected_trends
+        )
+        self.assertEqual(batched.get_trend(), streaming.get_trend())
+        self.assertAlmostEqual(value_of(batched), value_of(streaming), places=9)
+
+    def test_macd(self):
+        self.assert_batch_matches_stream(MACDIndicator, lambda indicator: indicator.macd)
+
+    def test_ama(self):
+        self.assert_batch_matches_stream(
+            lambda: AMAIndicator(period=10), lambda indicator: indicator.current_ama
+        )
+
+    def test_supertrend(self):
+        self.assert_batch_matches_stream(
+            lambda: SuperTrendIndicator(atr_period=7, multiplier=0.5),
+            lambda indicator: indicator.atr,
+        )
+
+
+class ReportExecutorTests(SimpleTestCase):
+    def test_coalesce_and_drop(self):
+        """A pair keeps one pending report, a full queue drops new pairs."""
+        executor = ReportExecutor(max_pending=2)
+        self.assertTrue(executor.submit("BTC/USDT", operator.add, 1, 1))
+        self.assertTrue(executor.submit("BTC/USDT", operator.add, 2, 2))
+        self.assertTrue(executor.submit("ETH/USDT", operator.add, 3, 3))
+        self.assertFalse(executor.submit("SOL/USDT", operator.add, 4, 4))
+
+        metrics = executor.metrics()
+        self.assertEqual(metrics["queue_depth"], 2)
+        self.assertEqual(metrics["coalesced"], 1)
+        self.assertEqual(metrics["dropped"], 1)
+        self.assertEqual(executor.pending["BTC/USDT"][1], (2, 2))
+
+    def test_runs_jobs_in_process_pool(self):
+        """Jobs should run in worker processes and report their latency."""
+        results = []
+
+        async def scenario():
+            executor = ReportExecutor(workers=1)
+            await executor.start()
+            try:
+                executor.submit("BTC/USDT", operator.add, 2, 3, callback=results.append)
+                for _ in range(300):
+                    if results:
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                await executor.stop()
+            return executor.metrics()
+
+        metrics = asyncio.run(scenario())
+        self.assertEqual(results, [5])
+        self.assertEqual(metrics["render_latency"]["count"], 1)
+
+
+class ChartReporterTests(SimpleTestCase):
+    def test_stack_vertically_centers_narrow_images(self):
+        wide = np.zeros((2, 4, 3), dtype=np.uint8)
+        narrow = np.zeros((1, 2, 3), dtype=np.uint8)
+        image = stack_vertically([wide, None, narrow])
+        self.assertEqual(image.shape, (3, 4, 3))
+        self.assertEqual(image[2, :, 0].tolist(), [255, 0, 0, 255])
+
+    def test_generate_and_send_stays_in_memory(self):
+        """Charts go to the notifier as PNG bytes, nothing touches the disk without an archive."""
+        trades = [make_trade(1_700_000_000_000 + i * 1000, price) for i, price in enumerate(random_walk(50))]
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch("trading.services.chart_reporter.send_telegram_image") as send, \
+                override_settings(BASE_DIR=Path(directory), CHART_ARCHIVE_DIR=None):
+            ChartReporter("BTC/USDT").generate_and_send(trades, trades, trades)
+            self.assertEqual(list(Path(directory).iterdir()), [])
+
+        caption, png = send.call_args.args
+        self.assertIn("BTC_USDT", caption)
+        image = Image.open(io.BytesIO(png))
+        self.assertEqual(image.format, "PNG")
+        self.assertEqual(image.size, (1200, 1200))
+
+    def test_decimate_caps_points_and_keeps_extremes(self):
+        times = np.arange(100_000, dtype=np.int64).astype("datetime64[ms]")
+        prices = np.array(random_walk(100_000))
+        prices[[123, 45_678]] = [1e6, -1e6]
+        kept_times, kept = decimate(times, prices, 1200)
+        self.assertLessEqual(len(kept), 2400)
+        self.assertTrue(np.all(np.diff(kept_times.astype(np.int64)) > 0))
+        self.assertEqual((kept.max(), kept.min()), (1e6, -1e6))
+        # Every pixel column keeps its own minimum and maximum
+        columns = np.arange(100_000) * 1200 // 100_000
+        kept_columns = columns[kept_times.astype(np.int64)]
+        for index in (0, 600, 1199):
+            self.assertEqual(kept[kept_columns == index].max(), prices[columns == index].max())
+            self.assertEqual(kept[kept_columns == index].min(), prices[columns == index].min())
+
+    def test_decimate_leaves_small_series_and_drops_nan(self):
+        times = np.arange(5).astype("datetime64[ms]")
+        kept_times, kept = decimate(times, [1.0, np.nan, 3.0, 4.0, 5.0], 1200)
+        self.assertEqual(kept.tolist(), [1.0, 3.0, 4.0, 5.0])
+        self.assertEqual(len(kept_times), 4)
+
+    def test_archive_names_are_unique_per_pair(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = ChartReporter("BTC/USDT", archive_dir=directory)
+            second = ChartReporter("ETH/USDT", archive_dir=directory)
+            pngs = [reporter.draw_valuer_stripe([0.01, -0.01], width=10) for reporter in (first, second, first)]
+            names = sorted(path.name for path in Path(directory).iterdir())
+        self.assertEqual(len(names), 3)
+        self.assertTrue(names[0].startswith("BTC_USDT_stripes_"))
+        self.assertTrue(names[2].startswith("ETH_USDT_stripes_"))
+        self.assertTrue(all(png.startswith(b"\x89PNG") for png in pngs))
+
+
+def reference_stripe(values, width, height, k):
+    """The original per-column loop, kept as the reference for the renderer."""
+    pixels = np.full((height, width + MARGIN, 3), fill_value=255, dtype=np.uint8)
+    n = len(values)
+    for idx, value in enumerate(values):
+        x_start = int(idx * width / n) + MARGIN
+        x_end = int((idx + 1) * width / n) + MARGIN
+        color = COLORS[1] if value > k else COLORS[2] if value < -k else COLORS[0]
+        for x in range(x_start, min(x_end, width + MARGIN)):
+            pixels[:, x] = color
+    return pixels
+
+
+class StripeRendererTests(SimpleTestCase):
+    def test_matches_per_column_loop(self):
+        """Vectorized stripes should be pixel-identical to the loop version."""
+        rng = np.random.default_rng(3)
+        levels = [rng.normal(0, 0.002, size) for size in (0, 3, 8, 64, 700)]
+
+        image = render_stripes(levels, width=300, height=4, k=0.001)
+
+        self.assertEqual(image.shape, (len(levels) * 4, 300 + MARGIN, 3))
+        for row, values in enumerate(levels):
+            expected = reference_stripe(values, 300, 4, 0.001)
+            np.testing.assert_array_equal(image[row * 4:(row + 1) * 4], expected)
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class ReportSchedulerTests(SimpleTestCase):
+    def test_needs_new_buckets_and_interval(self):
+        clock = FakeClock()
+        scheduler = ReportScheduler(min_interval=10, min_new_buckets=2, clock=clock)
+        self.assertFalse(scheduler.should_report())
+
+        scheduler.on_buckets(2)
+        self.assertTrue(scheduler.should_report())
+        self.assertFalse(scheduler.should_report())
+
+        scheduler.on_buckets(5)
+        clock.now = 5
+        self.assertFalse(scheduler.should_report())
+        clock.now = 10
+        self.assertTrue(scheduler.should_report())
+
+    def test_global_rate_limit_is_shared(self):
+        clock = FakeClock()
+        limiter = TokenBucket(rate=1, burst=1, clock=clock)
+        first = ReportScheduler(min_interval=0, min_new_buckets=1, rate_limiter=limiter, clock=clock)
+        second = ReportScheduler(min_interval=0, min_new_buckets=1, rate_limiter=limiter, clock=clock)
+        first.on_buckets(1)
+        second.on_buckets(1)
+
+        self.assertTrue(first.should_report())
+        self.assertFalse(second.should_report())
+        clock.now = 1
+        self.assertTrue(second.should_report())
+
+    def test_no_reports_before_buckets_close(self):
+        """Trades inside a single bucket must not trigger any report."""
+        submitted = []
+        engine = make_engine(enabled_strategies=["GigaStrategy"])
+        engine.submit_report = lambda job, *args, **kwargs: submitted.append(job)
+
+        trades = [make_trade(1750958244000 + i, 100.0 + i) for i in range(60)]
+        asyncio.run(engine.add_many(trades[:50]))
+        for trade in trades[50:]:
+            asyncio.run(engine.add(trade))
+
+        self.assertEqual(submitted, [])
+
+
+class ShardedStreamTests(SimpleTestCase):
+    def test_split_symbols(self):
+        symbols = [f"PAIR{i}/USDT" for i in range(7)]
+        connections = split_symbols(symbols, 3)
+        self.assertEqual([len(connection) for connection in connections], [3, 3, 1])
+        self.assertEqual(sum(connections, []), symbols)
+
+    def test_partition_is_stable(self):
+        symbols = [f"PAIR{i}/USDT" for i in range(40)]
+        parts = [partition_of(symbol, 3) for symbol in symbols]
+        self.assertEqual(parts, [partition_of(symbol, 3) for symbol in symbols])
+        self.assertEqual(set(parts), {0, 1, 2})
+
+    def test_apply_universe_adds_and_drops_pairs(self):
+        sharded = ShardedTradeStream(streams_per_connection=2)
+        sharded.universe = mock.Mock(current=["A/USDT", "B/USDT"])
+        sharded.connections = [["A/USDT", "B/USDT"]]
+        stream = mock.Mock(remove_symbol=mock.AsyncMock())
+        sharded.streams = {0: stream}
+        sharded.supervise_shard = mock.AsyncMock()
+        sharded.running = True
+
+        async def scenario():
+            sharded.universe.current = ["B/USDT", "C/USDT", "D/USDT"]
+            await sharded.apply_universe()
+            await asyncio.gather(*sharded.shards)
+
+        asyncio.run(scenario())
+        stream.remove_symbol.assert_awaited_once_with("A/USDT")
+        stream.add_symbol.assert_called_once_with("C/USDT")
+        # The first connection is full again, D gets a new one
+        self.assertEqual(sharded.connections, [["B/USDT", "C/USDT"], ["D/USDT"]])
+        sharded.supervise_shard.assert_awaited_once_with(1, ["D/USDT"])
+
+    def test_shards_added_at_runtime_are_awaited_and_cancelled(self):
+        sharded = ShardedTradeStream(streams_per_connection=1)
+        sharded.running = True
+        sharded.connections = [["A/USDT"]]
+        started = []
+
+        async def supervise_shard(index, symbols):
+            started.append(index)
+            if index == 0:
+                # The first shard opens a new connection while the stream is already running
+                sharded.add_symbol("B/USDT")
+                raise RuntimeError("boom")
+            await asyncio.sleep(3600)
+
+        sharded.supervise_shard = supervise_shard
+
+        async def scenario():
+            sharded.start_shard(0, sharded.connections[0])
+            waiter = asyncio.create_task(sharded.wait_shards())
+            while len(started) < 2:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.01)
+            pending = not waiter.done()
+            await sharded.stop()
+            await waiter
+            return pending
+
+        self.assertTrue(asyncio.run(scenario()))
+        self.assertEqual(started, [0, 1])
+        self.assertEqual(sharded.shards, set())
+
+    def test_stream_add_symbol_waits_for_run(self):
+        stream = BinanceBatchTradeStream(symbols=[])
+        stream.add_symbol("A/USDT")
+        self.assertEqual(stream.tasks, {})
+
+        async def scenario():
+            stream.running = True
+            stream.tasks["A/USDT"] = asyncio.create_task(asyncio.sleep(0))
+            await stream.tasks["A/USDT"]
+            with mock.patch.object(stream, "stream_symbol", mock.AsyncMock()) as stream_symbol:
+                stream.add_symbol("A/USDT")  # The old task has finished, so the pair is subscribed again
+                await stream.tasks["A/USDT"]
+            stream_symbol.assert_awaited_once_with("A/USDT")
+            await stream.exchange.close()
+
+        asyncio.run(scenario())
+
+    def test_stream_reuses_and_closes_its_universe(self):
+        stream = BinanceBatchTradeStream(delay_between_batches=0)
+        universe = stream.universe
+        calls = []
+
+        async def symbols():
+            calls.append(universe)
+            stream.running = len(calls) < 2
+            return []
+
+        async def scenario():
+            with mock.patch.object(universe, "symbols", symbols), \
+                    mock.patch.object(universe.redis, "aclose", mock.AsyncMock()) as aclose:
+                await stream.fetch_usdt_symbols()
+                await stream.run()
+            return aclose
+
+        aclose = asyncio.run(scenario())
+        self.assertEqual(calls, [universe, universe])
+        self.assertIs(stream.universe, universe)
+        aclose.assert_awaited_once()
+
+
+class IdleExchange:
+    """Stands in for ccxt: subscriptions that never deliver trades."""
+
+    def __init__(self):
+        self.watching = set()
+
+    async def watch_trades(self, symbol):
+        self.watching.add(symbol)
+        try:
+            await asyncio.sleep(3600)
+        finally:
+            self.watching.discard(symbol)
+
+    async def close(self):
+        pass
+
+
+class CrashingStream(BinanceBatchTradeStream):
+    """The first instance fails in run() right after its symbols are subscribed."""
+
+    instances = []
+
+    def __init__(self, **kwargs):
+        super().__init__(delay_between_batches=0, **kwargs)
+        self.exchange = IdleExchange()
+        self.instances.append(self)
+
+    def add_symbol(self, symbol):
+        super().add_symbol(symbol)
+        if len(self.instances) == 1:
+            raise RuntimeError("boom")
+
+
+class ShardRestartTests(SimpleTestCase):
+    def test_restart_does_not_leak_old_stream(self):
+        CrashingStream.instances = []
+        sharded = ShardedTradeStream(restart_delay=0)
+        sharded.running = True
+        cross_pair = CrossPairIndicators()
+        snapshot_store = EngineSnapshotStore(redis=FakeRedis())
+        sharded.services = {
+            "report_executor": mock.Mock(start=mock.AsyncMock()),
+            "report_rate_limiter": TokenBucket(rate=1),
+            "tick_writer": None,
+            "snapshot_store": snapshot_store,
+            "cross_pair": cross_pair,
+            "notifier": None,
+        }
+
+        async def scenario():
+            with mock.patch("trading.services.sharded_stream.BinanceBatchTradeStream", CrashingStream):
+                shard = asyncio.create_task(sharded.supervise_shard(0, ["BTC/USDT"]))
+                while len(CrashingStream.instances) < 2 or not CrashingStream.instances[1].apps:
+                    await asyncio.sleep(0.01)
+                await asyncio.sleep(0.01)
+                first, second = CrashingStream.instances
+                state = {
+                    "first_tasks_done": all(task.done() for task in first.tasks.values()),
+                    "first_tasks": len(first.tasks),
+                    "first_watching": set(first.exchange.watching),
+                    "first_apps": dict(first.apps),
+                    "second_watching": set(second.exchange.watching),
+                    "engines": len(cross_pair.rows),
+                    "snapshots": list(snapshot_store.engines),
+                }
+                sharded.running = False
+                second.running = False
+                shard.cancel()
+                await asyncio.gather(shard, return_exceptions=True)
+                return state
+
+        state = asyncio.run(scenario())
+        self.assertEqual(state["first_tasks"], 0)
+        self.assertEqual(state["first_watching"], set())
+        self.assertEqual(state["first_apps"], {})
+        self.assertEqual(state["second_watching"], {"BTC/USDT"})
+        self.assertEqual(state["engines"], 1)
+        self.assertEqual(state["snapshots"], ["cryptobro:snapshot:binance:BTC/USDT"])
+
+
+class ThroughputMeterTests(SimpleTestCase):
+    def test_report_rates_and_reset(self):
+        clock = FakeClock()
+        meter = ThroughputMeter(clock=clock)
+        meter.observe(10, 0.000050)
+        meter.observe(30, 0.000150)
+        clock.now = 2
+
+        report = meter.report()
+        self.assertEqual(report["messages_per_s"], 1.0)
+        self.assertEqual(report["trades_per_s"], 20.0)
+        self.assertEqual(report["handling_avg_us"], 100.0)
+        self.assertEqual(meter.messages, 0)
+
+    def test_fast_mode_without_uvloop_logs_and_falls_back(self):
+        with mock.patch.dict(sys.modules, {"uvloop": None}), self.assertLogs(runtime.logger, "WARNING"):
+            self.assertIsNone(runtime.uvloop_factory())
+            self.assertEqual(runtime.run(asyncio.sleep(0, "done"), fast=True), "done")
+
+
+class FlakyExchange:
+    """Stands in for ccxt: fails once, then replays the given batches."""
+
+    def __init__(self, stream, batches):
+        self.stream = stream
+        self.batches = list(batches)
+        self.failed = False
+
+    async def watch_trades(self, symbol):
+        if not self.failed:
+            self.failed = True
+            raise ConnectionError("socket closed")
+        if not self.batches:
+            self.stream.running = False
+            return []
+        return self.batches.pop(0)
+
+
+class StreamRecoveryTests(SimpleTestCase):
+    def setUp(self):
+        self.history = [make_trade(1750958244000 + i, 100.0 + i, trade_id=i) for i in range(1, 2501)]
+        self.requests = []
+
+    async def backfill_source(self, symbol, from_id, limit):
+        self.requests.append(from_id)
+        return [trade for trade in self.history if trade["id"] and int(trade["id"]) >= from_id][:limit]
+
+    def test_gap_is_backfilled_in_one_batch(self):
+        stream = BinanceBatchTradeStream(backfill_source=self.backfill_source)
+        engine = make_engine(limit=5000)
+        engine.add_strategy(RecordingStrategy())
+
+        asyncio.run(stream.handle_trades(engine, "BTC/USDT", self.history[:10]))
+        asyncio.run(stream.handle_trades(engine, "BTC/USDT", self.history[2400:2410]))
+
+        self.assertEqual(engine.trades.ids.tolist(), list(range(1, 2411)))
+        self.assertEqual(self.requests, [11, 1011, 2011])
+        self.assertEqual(engine.strategies[0].calls, [10, 2390, 10])
+
+    @mock.patch("trading.services.binance_stream.RECONNECT_DELAY", 0)
+    def test_socket_error_is_retried(self):
+        stream = BinanceBatchTradeStream(backfill_source=self.backfill_source)
+        stream.exchange = FlakyExchange(stream, [self.history[:5], self.history[20:25]])
+        stream.running = True
+
+        engine = make_engine()
+        with mock.patch("trading.services.binance_stream.TradeEngine", lambda config: engine):
+            asyncio.run(stream.stream_symbol("BTC/USDT"))
+
+        self.assertEqual(engine.trades.ids.tolist(), list(range(1, 26)))
+        # A finished symbol task leaves nothing behind
+        self.assertEqual(stream.apps, {})
+
+
+class TickWriterTests(SimpleTestCase):
+    def test_engine_hands_new_trades_to_writer(self):
+        writer = TickWriter()
+        engine = make_engine(tick_writer=writer)
+        trades = [make_trade(1750958244000 + i, 100.0 + i, trade_id=i) for i in range(1, 4)]
+        asyncio.run(engine.add_many(trades))
+        asyncio.run(engine.add_many(trades))
+
+        self.assertEqual(writer.buffered, 3)
+        exchange, symbol, ids, timestamps, prices, amounts, sides = writer.trades[0]
+        self.assertEqual((exchange, symbol), ("binance", "BTC/USDT"))
+        self.assertEqual(ids.tolist(), [1, 2, 3])
+        self.assertEqual(to_timestamps(timestamps[:1]).tolist(), ["2025-06-26T17:17:24.001Z"])
+
+    def test_backpressure_drops_oldest(self):
+        """A slow database must not make the buffer grow without limit."""
+        writer = TickWriter(max_buffered=10, batch_size=4)
+        for start in range(0, 15, 5):
+            ids = np.arange(start, start + 5)
+            writer.put_trades("binance", "BTC/USDT", ids, ids, ids * 1.0, ids * 1.0, np.ones(5))
+
+        self.assertEqual(writer.buffered, 10)
+        self.assertEqual(writer.dropped, 5)
+        chunks = writer.take_trades()
+        self.assertEqual(chunks[0][2].tolist(), [5, 6, 7, 8, 9])
+        self.assertEqual(writer.buffered, 5)
+
+    def test_failed_write_is_retried(self):
+        writer = TickWriter(retry_delay=0)
+        writer.put_trades("binance", "BTC/USDT", np.arange(3), np.arange(3), np.ones(3), np.ones(3), np.ones(3))
+        writer.put_bucket("binance", "BTC/USDT", 2000, (0, 1.0, 1.0, 1.0, 1.0, 3.0, 3, 0.0))
+        written = []
+        attempts = iter([ConnectionError("db restarting"), None])
+
+        def write_trades(chunks):
+            error = next(attempts)
+            if error is not None:
+                raise error
+            written.extend(chunk[2].tolist() for chunk in chunks)
+
+        writer.write_trades = write_trades
+        writer.write_buckets = lambda buckets: written.append(len(buckets))
+        asyncio.run(writer.flush())
+
+        self.assertEqual(written, [[0, 1, 2], 1])
+        self.assertEqual((writer.retried, writer.buffered, writer.dropped), (1, 0, 0))
+
+    def test_batch_is_requeued_when_database_stays_down(self):
+        """Trades and buckets survive an outage; a bucket failure does not hold back trades."""
+        writer = TickWriter(retries=1, retry_delay=0)
+        for start in (0, 3):
+            ids = np.arange(start, start + 3)
+            writer.put_trades("binance", "BTC/USDT", ids, ids, ids * 1.0, ids * 1.0, np.ones(3))
+        writer.put_bucket("binance", "BTC/USDT", 2000, (0, 1.0, 1.0, 1.0, 1.0, 3.0, 3, 0.0))
+        written = []
+        writer.write_trades = lambda chunks: written.extend(chunk[2].tolist() for chunk in chunks)
+        writer.write_buckets = mock.Mock(side_effect=ConnectionError("down"))
+        asyncio.run(writer.flush())
+
+        self.assertEqual(written, [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(writer.write_buckets.call_count, 2)
+        self.assertEqual((len(writer.buckets), writer.requeued, writer.dropped_buckets), (1, 1, 0))
+
+    def test_bucket_overflow_is_counted(self):
+        writer = TickWriter(max_buffered=2)
+        for start in range(3):
+            writer.put_bucket("binance", "BTC/USDT", 2000, (start, 1.0, 1.0, 1.0, 1.0, 1.0, 1, 0.0))
+        self.assertEqual([bucket[3] for bucket in writer.buckets], [1, 2])
+        self.assertEqual(writer.dropped_buckets, 1)
+
+
+class FakeRedis:
+    """The handful of redis.asyncio calls EngineSnapshotStore uses, in memory."""
+
+    def __init__(self):
+        self.data = {}
+        self.during_execute = None  # Coroutine factory run while a pipeline is in flight
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def delete(self, key):
+        self.commands.append(lambda: self.redis.data.pop(key, None))
+
+    def rpush(self, key, value):
+        self.commands.append(lambda: self.redis.data.setdefault(key, []).append(value))
+
+    def set(self, key, value):
+        self.commands.append(lambda: self.redis.data.__setitem__(key, value))
+
+    async def execute(self):
+        if self.redis.during_execute is not None:
+            await self.redis.during_execute()
+        for command in self.commands:
+            command()
+
+
+class SnapshotStoreTests(SimpleTestCase):
+    def test_restore_warm_starts_engine(self):
+        redis = FakeRedis()
+        store = EngineSnapshotStore(redis=redis)
+        engine = make_engine(enabled_strategies=["GigaStrategy"], limit=50)
+        engine.submit_report = lambda *args, **kwargs: True
+        trades = [make_trade(1750958244000 + i * 300, 100.0 + i % 5, trade_id=i) for i in range(1, 121)]
+
+        asyncio.run(engine.add_many(trades[:30]))
+        asyncio.run(store.save(engine))
+        asyncio.run(engine.add_many(trades[30:40]))
+        asyncio.run(store.save(engine))
+        self.assertEqual(len(redis.data["cryptobro:snapshot:binance:BTC/USDT:trades"]), 2)
+        asyncio.run(engine.add_many(trades[40:]))
+        asyncio.run(store.save(engine))
+        # More than capacity trades in chunks: the list is compacted into one
+        self.assertEqual(len(redis.data["cryptobro:snapshot:binance:BTC/USDT:trades"]), 1)
+
+        restored = make_engine(enabled_strategies=["GigaStrategy"], limit=50)
+        self.assertTrue(asyncio.run(EngineSnapshotStore(redis=redis).restore(restored)))
+
+        np.testing.assert_array_equal(restored.trades.ids, engine.trades.ids)
+        self.assertEqual(restored.trades.last_id, 120)
+        original, copy = engine.strategies[0], restored.strategies[0]
+        for i in range(len(original.diffs)):
+            np.testing.assert_array_equal(copy.diffs.values(i), original.diffs.values(i))
+            np.testing.assert_array_equal(copy.diffs.times(i), original.diffs.times(i))
+        for key, value in original.aggregator.get_state().items():
+            np.testing.assert_array_equal(copy.aggregator.get_state()[key], value)
+
+    def test_trades_arriving_during_save_are_not_lost(self):
+        redis = FakeRedis()
+        store = EngineSnapshotStore(redis=redis)
+        engine = make_engine(limit=100)
+        trades = [make_trade(1750958244000 + i * 300, 100.0, trade_id=i) for i in range(1, 31)]
+
+        async def scenario():
+            await engine.add_many(trades[:10])
+            # Ten trades come in while the first save waits on Redis
+            redis.during_execute = lambda: engine.add_many(trades[10:20])
+            await store.save(engine)
+            redis.during_execute = None
+            await engine.add_many(trades[20:])
+            await store.save(engine)
+
+        asyncio.run(scenario())
+        restored = make_engine(limit=100)
+        asyncio.run(EngineSnapshotStore(redis=redis).restore(restored))
+        self.assertEqual(restored.trades.ids.tolist(), list(range(1, 31)))
+
+
+class BacktestTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def test_load_csv_maps_sides_and_sorts(self):
+        path = self.dir / "BTCUSDT.csv"
+        path.write_text("timestamp,price,amount,side\n2000,2.0,1.5,sell\n1000,1.0,0.5,buy\n")
+        trades = load_trades(path)
+        self.assertEqual(trades["timestamp"].tolist(), [1000, 2000])
+        self.assertEqual(trades["side"].tolist(), [1, -1])
+        self.assertEqual(trades["id"].tolist(), [0, 0])
+
+    def test_replay_uses_trade_time(self):
+        """Buckets and the report clock should follow trade timestamps, not wall time."""
+        start = 1_700_000_000_000
+        count = 3000
+        timestamps = start + np.arange(count, dtype=np.int64) * 50
+        path = self.dir / "ETHUSDT.npz"
+        np.savez(path, timestamp=timestamps, price=np.array(random_walk(count, seed=5)), amount=np.ones(count))
+
+        summary = run_backtest(path, self.dir / "out", batch_size=256)
+
+        self.assertEqual(summary["trades"], count)
+        signals = np.load(summary["signals"])
+        self.assertEqual(len(signals["start_ms"]), summary["buckets"])
+        self.assertEqual(signals["start_ms"][0], start)
+        self.assertTrue((np.diff(signals["start_ms"]) == 2000).all())
+        self.assertEqual(signals["signals"].shape, (summary["buckets"], 11))
+        self.assertIn("GigaStrategy.pyramid_10_v", np.load(summary["diffs"]).files)
+
+    def test_reports_are_archived_not_sent(self):
+        """Backtest reports go to files in the output directory and never reach Telegram."""
+        count = 3000
+        path = self.dir / "SOLUSDT.npz"
+        np.savez(
+            path,
+            timestamp=1_700_000_000_000 + np.arange(count, dtype=np.int64) * 100,
+            price=np.array(random_walk(count, seed=3)),
+            amount=np.ones(count),
+        )
+
+        with mock.patch("trading.services.telega.requests.post") as post:
+            summary = run_backtest(path, self.dir / "out", batch_size=256, reports=True)
+
+        post.assert_not_called()
+        self.assertGreater(summary["reports"], 1)
+        archived = list((self.dir / "out" / "SOLUSDT_reports").glob("*.png"))
+        self.assertEqual(len(archived), summary["reports"])
+
+    def test_virtual_clock(self):
+        engine = make_engine(virtual_clock=True)
+        asyncio.run(engine.add(make_trade(1_700_000_000_000, 1.0)))
+        self.assertEqual(engine.report_scheduler.clock(), 1_700_000_000.0)
+
+
+class SweepTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        count = 2000
+        self.path = self.dir / "BTCUSDT.npz"
+        np.savez(
+            self.path,
+            timestamp=1_700_000_000_000 + np.arange(count, dtype=np.int64) * 100,
+            price=np.array(random_walk(count, seed=9)),
+            amount=np.ones(count),
+        )
+
+    def test_grid_and_random_search(self):
+        space = {"diff_limit": [4, 8], "interval": [1, 2, 3]}
+        self.assertEqual(len(grid(space)), 6)
+        points = random_search(space, 4, seed=1)
+        self.assertEqual(len(points), 4)
+        self.assertTrue(all(point in grid(space) for point in points))
+        self.assertEqual(len(random_search(space, 100)), 6)
+
+    def test_results_are_cached_by_params(self):
+        """A repeated sweep should only evaluate points it has not seen."""
+        sweep = Sweep(self.path, self.dir / "sweeps")
+        results = sweep.run([{"diff_limit": 4}, {"diff_limit": 4, "macd_short": 6}])
+        self.assertEqual(len(results), 2)
+        self.assertIn("supertrend", results[0]["scores"])
+        self.assertEqual(results[0]["buckets"], 99)  # The last bucket is still open
+
+        with mock.patch("trading.services.sweep.evaluate", wraps=evaluate) as spy:
+            results = sweep.run([{"diff_limit": 4}, {"diff_limit": 8}])
+        self.assertEqual(spy.call_count, 1)
+        self.assertEqual(len(results), 2)
+
+    def test_indicator_only_points_share_one_simulation(self):
+        """Points that differ only in indicator parameters re-score one strategy run."""
+        simulate_signals.cache_clear()
+        sweep = Sweep(self.path, self.dir / "sweeps")
+        points = [{"diff_limit": 4, "macd_short": short} for short in (4, 6, 8)] + [{"diff_limit": 8}]
+        with mock.patch("trading.services.sweep.simulate", wraps=simulate) as spy:
+            results = sweep.run(points)
+        self.assertEqual(spy.call_count, 2)
+        self.assertEqual(len(results), 4)
+        by_short = {result["params"].get("macd_short"): result for result in results}
+        self.assertNotEqual(by_short[4]["scores"]["macd"], by_short[8]["scores"]["macd"])
+        self.assertEqual(by_short[4]["scores"]["giga_0"], by_short[8]["scores"]["giga_0"])
+
+
+class PyramidTests(SimpleTestCase):
+    def test_pairs_average_into_coarser_level(self):
+        pyramid = MultiResolutionPyramid(3, 2)
+        for t, v in zip(range(0, 8000, 1000), [1.0, 3.0, 5.0, 7.0, 2.0, 2.0, 4.0, 0.0]):
+            pyramid.push(t, v)
+        np.testing.assert_array_equal(pyramid.values(2), [1.0, 3.0, 5.0, 7.0, 2.0, 2.0, 4.0, 0.0])
+        np.testing.assert_array_equal(pyramid.values(1), [2.0, 6.0, 2.0, 2.0])
+        np.testing.assert_array_equal(pyramid.times(1), [500, 2500, 4500, 6500])
+        np.testing.assert_array_equal(pyramid.values(0), [4.0, 2.0])
+        np.testing.assert_array_equal(pyramid.times(0), [1500, 5500])
+        self.assertEqual(pyramid.nbytes, (2 + 4 + 8) * 2 * 16)
+
+    def test_extend_matches_push(self):
+        """Bulk appends split at odd offsets should give the same levels as single pushes."""
+        values = np.array(random_walk(700, seed=11))
+        times = 1_700_000_000_000 + np.arange(700, dtype=np.int64) * 2000
+        single, bulk = MultiResolutionPyramid(6, 4), MultiResolutionPyramid(6, 4)
+        for t, v in zip(times, values):
+            single.push(int(t), v)
+        for start, end in ((0, 1), (1, 38), (38, 39), (39, 500), (500, 700)):
+            bulk.extend(times[start:end], values[start:end])
+
+        for i in range(6):
+            np.testing.assert_array_equal(bulk.times(i), single.times(i))
+            np.testing.assert_allclose(bulk.values(i), single.values(i))
+            self.assertEqual(bulk.levels[i].total, single.levels[i].total)
+
+
+class BucketAggregatorTests(SimpleTestCase):
+    def test_ohlcv_and_gap_count(self):
+        aggregator = TradePerIntervalAggregator(1000)
+        buckets = aggregator.add_batch(
+            [100, 500, 900, 1200, 4100], [10.0, 12.0, 9.0, 11.0, 13.0], [1.0, 2.0, 3.0, 4.0, 5.0], [1, -1, 1, 0, 1],
+        )
+        self.assertEqual(buckets["start"].tolist(), [0, 1000])
+        self.assertEqual(buckets["open"].tolist(), [10.0, 11.0])
+        self.assertEqual(buckets["high"].tolist(), [12.0, 11.0])
+        self.assertEqual(buckets["low"].tolist(), [9.0, 11.0])
+        self.assertEqual(buckets["close"].tolist(), [9.0, 11.0])
+        self.assertEqual(buckets["volume"].tolist(), [6.0, 4.0])
+        self.assertEqual(buckets["buy_volume"].tolist(), [4.0, 0.0])
+        self.assertEqual(buckets["sell_volume"].tolist(), [2.0, 0.0])
+        self.assertEqual(buckets["up_move"].tolist(), [2.0, 0.0])
+        self.assertEqual(buckets["down_move"].tolist(), [3.0, 0.0])
+        self.assertEqual(buckets["count"].tolist(), [3, 1])
+        self.assertEqual(buckets["gap"].tolist(), [0, 2])  # 2000 and 3000 are empty
+        self.assertEqual(aggregator.start, 4000)
+
+    def test_batches_match_single_trades(self):
+        """Any split of the trade stream should close the same buckets."""
+        rng = np.random.default_rng(4)
+        timestamps = np.cumsum(rng.integers(0, 700, 3000))
+        prices = np.array(random_walk(3000, seed=4))
+        amounts = rng.random(3000)
+        sides = rng.choice([-1, 0, 1], 3000)
+
+        single = TradePerIntervalAggregator(2000)
+        expected = [single.add(*trade) for trade in zip(timestamps, prices, amounts, sides)]
+        batched = TradePerIntervalAggregator(2000)
+        chunks = [
+            batched.add_batch(timestamps[s:e], prices[s:e], amounts[s:e], sides[s:e])
+            for s, e in ((0, 1), (1, 999), (999, 3000))
+        ]
+
+        for name in ("start", "open", "high", "low", "close", "count", "gap"):
+            np.testing.assert_array_equal(
+                np.concatenate([chunk[name] for chunk in chunks]),
+                np.concatenate([bucket[name] for bucket in expected]),
+            )
+        for name in ("volume", "buy_volume", "sell_volume", "up_move", "down_move"):
+            np.testing.assert_allclose(
+                np.concatenate([chunk[name] for chunk in chunks]),
+                np.concatenate([bucket[name] for bucket in expected]),
+            )
+
+
+class GatedStrategy(RecordingStrategy):
+    """Blocks inside process_trades until the test opens the gate."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+
+    async def process_trades(self, count):
+        self.calls.append(count)
+        await self.gate.wait()
+
+
+class StrategyRuntimeTests(SimpleTestCase):
+    def tearDown(self):
+        load_strategies.cache_clear()
+
+    @override_settings(TRADING_STRATEGIES={
+        "Giga4": "trading.services.trade_engine.strategies.giga_strategy.GigaStrategy",
+        "Recording": RecordingStrategy,
+    })
+    def test_strategies_from_settings(self):
+        load_strategies.cache_clear()
+        self.assertIs(get_strategy("Giga4"), get_strategy("GigaStrategy"))
+        self.assertIs(get_strategy("Recording"), RecordingStrategy)
+        with self.assertRaises(KeyError):
+            get_strategy("Missing")
+
+    def run_queued(self, policy):
+        async def scenario():
+            engine = make_engine(strategy_mode="queued")
+            strategy = GatedStrategy()
+            engine.add_strategy(strategy, policy=policy)
+            await engine.add_many([make_trade(1750958244000 + i, 1.0) for i in range(3)])
+            await asyncio.sleep(0)
+            # The strategy is stuck on the first batch, the engine keeps accepting trades
+            for start in (3, 5):
+                await engine.add_many([make_trade(1750958244000 + i, 1.0) for i in range(start, start + 2)])
+            strategy.gate.set()
+            await asyncio.sleep(0.01)
+            metrics = engine.strategy_metrics()["recording"]
+            engine.close()
+            return strategy.calls, metrics
+
+        return asyncio.run(scenario())
+
+    def test_every_policy_coalesces_missed_trades(self):
+        calls, metrics = self.run_queued("every")
+        self.assertEqual(calls, [3, 4])
+        self.assertEqual(metrics["count"], 2)
+        self.assertEqual(metrics["dropped"], 0)
+
+    def test_latest_policy_skips_to_newest_batch(self):
+        calls, metrics = self.run_queued("latest")
+        self.assertEqual(calls, [3, 2])
+        self.assertEqual(metrics["dropped"], 2)
+
+    def test_isolated_strategy_runs_in_worker(self):
+        """Engines share one worker pool per strategy, which is shut down with the last engine."""
+        options = {"strategy_options": {"GigaStrategy": {"process": True}}, "enabled_strategies": ["GigaStrategy"]}
+
+        async def scenario():
+            engine = make_engine(**options)
+            other = make_engine(pair_name="ETH/USDT", **options)
+            self.assertIsInstance(engine.strategies[0], IsolatedStrategy)
+            pool = engine.strategies[0].pool
+            self.assertIs(other.strategies[0].pool, pool)
+            try:
+                for start in (0, 10):
+                    await engine.add_many(
+                        [make_trade(1750958244000 + i * 500, 100.0 + i, trade_id=i + 1) for i in range(start, start + 10)]
+                    )
+                return engine.strategy_metrics()["GigaStrategy"], pool
+            finally:
+                engine.close()
+                self.assertEqual(pool.users, 1)
+                other.close()
+
+        metrics, pool = asyncio.run(scenario())
+        pool.shutdown(wait=True)
+        self.assertEqual(metrics["count"], 2)
+        self.assertEqual(metrics["failed"], 0)
+        self.assertEqual(IsolatedPool.pools, {})
+
+
+class IndicatorCacheTests(SimpleTestCase):
+    def test_shared_between_strategies_and_evicted(self):
+        engine = make_engine()
+        first, second = RecordingStrategy(), RecordingStrategy()
+        engine.add_strategy(first)
+        engine.add_strategy(second)
+        prices = random_walk(60, seed=8)
+        asyncio.run(engine.add_many([make_trade(1750958244000 + i, price) for i, price in enumerate(prices[:30])]))
+
+        macd = engine.indicator(first, MACDIndicator, short_period=3, long_period=6, signal_period=3)
+        self.assertIs(engine.indicator(second, MACDIndicator, short_period=3, long_period=6, signal_period=3), macd)
+        self.assertIsNot(engine.indicator(second, MACDIndicator, short_period=4, long_period=6, signal_period=3), macd)
+        asyncio.run(engine.add_many([make_trade(1750958244030 + i, price) for i, price in enumerate(prices[30:])]))
+
+        # Warmed on the buffer, then updated once per batch: same as one pass over all prices
+        reference = MACDIndicator(short_period=3, long_period=6, signal_period=3)
+        values, _ = reference.batch(np.array(prices))
+        self.assertAlmostEqual(macd.macd, reference.macd)
+        np.testing.assert_allclose(engine.indicators.result(MACDIndicator, short_period=3, long_period=6, signal_period=3)[0], values[30:])
+
+        engine.remove_strategy(second)
+        self.assertEqual(len(engine.indicators), 1)
+        engine.remove_strategy(first)
+        self.assertEqual(len(engine.indicators), 0)
+
+
+def reference_atr(highs, lows, closes, period):
+    atr, trs, prev_close = None, [], None
+    for high, low, close in zip(highs, lows, closes):
+        tr = high - low if prev_close is None else max(high - low, abs(high - prev_close), abs(low - prev_close))
+        prev_close = close
+        if atr is None:
+            trs.append(tr)
+            if len(trs) == period:
+                atr = sum(trs) / period
+        else:
+            atr += (tr - atr) / period
+    return atr
+
+
+class CrossPairIndicatorsTests(SimpleTestCase):
+    def test_matches_per_pair_indicators(self):
+        """One vectorized pass over all pairs should equal per-pair streaming indicators."""
+        stage = CrossPairIndicators(ema_periods=(3, 12), ama_period=5, atr_period=4, capacity=2)
+        engines = [mock.Mock() for _ in range(3)]
+        series = {}
+        for seed, engine in enumerate(engines):
+            stage.register(engine)
+            closes = np.array(random_walk(40 + seed * 7, seed=seed))
+            series[engine] = (closes + 0.3, closes - 0.2, closes)
+
+        # Uneven deliveries: several batches per tick, one pair with nothing new on the second tick
+        for start, end in ((0, 5), (5, 6), (6, 30), (30, 60)):
+            for index, engine in enumerate(engines):
+                if index == 1 and start == 5:
+                    continue
+                first = 5 if index == 1 and start == 6 else start
+                highs, lows, closes = (column[first:end] for column in series[engine])
+                for part in (slice(0, 2), slice(2, None)):
+                    stage.collect(engine, {"close": closes[part], "high": highs[part], "low": lows[part]})
+            stage.step()
+
+        for engine in engines:
+            highs, lows, closes = series[engine]
+            values = stage.values(engine)
+            # The stage pushes the same values to the engine after each step
+            self.assertEqual(engine.on_cross_indicators.call_args.args[0], values)
+            for period in (3, 12):
+                ema = EMA(period)
+                for close in closes:
+                    ema.update(close)
+                self.assertAlmostEqual(values[f"ema_{period}"], ema.value)
+            ama = AMAIndicator(period=5)
+            for close in closes:
+                ama.update(close)
+            self.assertAlmostEqual(values["ama"], ama.current_ama)
+            self.assertAlmostEqual(values["atr"], reference_atr(highs, lows, closes, 4))
+
+    def test_engine_publishes_buckets(self):
+        stage = CrossPairIndicators()
+        engine = make_engine(enabled_strategies=["GigaStrategy"], cross_pair=stage)
+        engine.submit_report = lambda *args, **kwargs: True
+        trades = [make_trade(1750958244000 + i * 500, 100.0 + i % 7, trade_id=i + 1) for i in range(40)]
+        asyncio.run(engine.add_many(trades))
+        self.assertEqual(stage.step(), 1)
+        self.assertTrue(np.isfinite(engine.cross_indicators()["ema_12"]))
+        # GigaStrategy is the consumer: the values end up in its report caption
+        self.assertIn("EMA_12", engine.strategies[0].report_caption())
+
+        engine.close()
+        self.assertEqual(stage.free, [0])
+
+
+class FakeMarketsExchange:
+    """Stands in for ccxt: a fixed market list and 24h volumes that the test can change."""
+
+    def __init__(self, volumes):
+        self.volumes = volumes
+        self.calls = 0
+
+    async def load_markets(self):
+        self.calls += 1
+        return {symbol: {"active": True} for symbol in [*self.volumes, "BUSD/USDT", "BTC/EUR"]}
+
+    async def fetch_tickers(self, symbols=None):
+        self.calls += 1
+        return {symbol: {"quoteVolume": volume} for symbol, volume in self.volumes.items()}
+
+
+class SymbolUniverseTests(SimpleTestCase):
+    def make_universe(self, exchange, redis, clock, **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SymbolUniverse(
+            exchange=exchange, redis=redis, cache_dir=directory.name, min_volume=100, clock=clock, **kwargs,
+        )
+
+    def test_ranks_liquid_pairs_by_volume(self):
+        exchange = FakeMarketsExchange({"A/USDT": 150, "B/USDT": 900, "C/USDT": 50})
+        universe = self.make_universe(exchange, FakeRedis(), FakeClock())
+        self.assertEqual(asyncio.run(universe.symbols()), ["B/USDT", "A/USDT"])
+
+    def test_starts_from_cache_without_exchange_calls(self):
+        redis, clock = FakeRedis(), FakeClock()
+        warm = FakeMarketsExchange({"A/USDT": 150, "B/USDT": 900})
+        asyncio.run(self.make_universe(warm, redis, clock, max_pairs=1).symbols())
+
+        clock.now = 3600  # The ranking is stale, but still good enough to start
+        cold = FakeMarketsExchange({})
+        universe = self.make_universe(cold, redis, clock, max_pairs=1)
+        self.assertEqual(asyncio.run(universe.symbols()), ["B/USDT"])
+        self.assertEqual(cold.calls, 0)
+        self.assertTrue(universe.stale)
+
+    def test_processes_share_one_refresh(self):
+        """Only the process holding the refresh lock asks the exchange, the others reuse its ranking."""
+        redis, clock = FakeRedis(), FakeClock()
+        exchanges = [FakeMarketsExchange({"A/USDT": 150, "B/USDT": 900}) for _ in range(3)]
+        universes = [self.make_universe(exchange, redis, clock) for exchange in exchanges]
+
+        async def scenario():
+            for universe in universes:
+                await universe.symbols()
+            calls = [exchange.calls for exchange in exchanges]
+            clock.now = 3600
+            for universe in universes:
+                await universe.refresh()
+            return calls
+
+        before = asyncio.run(scenario())
+        refreshed = [exchange.calls - calls for exchange, calls in zip(exchanges, before)]
+        self.assertEqual(sorted(refreshed), [0, 0, 1])
+        self.assertTrue(all(universe.current == ["B/USDT", "A/USDT"] for universe in universes))
+
+    def test_refresh_notifies_added_and_removed(self):
+        exchange = FakeMarketsExchange({"A/USDT": 150, "B/USDT": 900, "C/USDT": 50})
+        redis, clock = FakeRedis(), FakeClock()
+        universe = self.make_universe(exchange, redis, clock)
+        changes = []
+        universe.subscribe(lambda added, removed: changes.append((added, removed)))
+
+        async def scenario():
+            await universe.symbols()
+            await universe.refresh()  # Nothing changed, nobody is notified
+            exchange.volumes = {"A/USDT": 50, "B/USDT": 900, "C/USDT": 500}
+            clock.now = 400  # The ranking is older than refresh_interval and the lock has expired
+            redis.data.pop(REFRESH_LOCK_KEY, None)
+            await universe.refresh()
+
+        asyncio.run(scenario())
+        self.assertEqual(changes, [(["C/USDT"], ["A/USDT"])])
+        self.assertEqual(universe.current, ["B/USDT", "C/USDT"])
+
+
+class FakeTelegram:
+    """A local Bot API endpoint: records every call and can answer the first ones with errors."""
+
+    def __init__(self, failures=(), html_failures=()):
+        self.failures = list(failures)  # HTTP statuses for the first calls
+        self.html_failures = set(html_failures)  # Statuses answered with a proxy HTML page
+        self.calls = []
+        self.server = None
+
+    async def handle(self, request):
+        form = await request.post()
+        fields = {name: value if isinstance(value, str) else value.file.read() for name, value in form.items()}
+        self.calls.append((request.match_info["method"], fields))
+        if self.failures:
+            status = self.failures.pop(0)
+            if status in self.html_failures:
+                return web.Response(text="<html>Bad Gateway</html>", status=status, content_type="text/html")
+            return web.json_response(
+                {"ok": False, "description": "fail", "parameters": {"retry_after": 0}}, status=status,
+            )
+        return web.json_response({"ok": True, "result": {}})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.server.close()
+
+    def notifier(self, **kwargs):
+        return TelegramNotifier(
+            token="test", chat_id="@test", base_url=str(self.server.make_url("")).rstrip("/"),
+            rate_limiter=TokenBucket(rate=1000, burst=1000), retry_delay=0, **kwargs,
+        )
+
+
+class TelegramNotifierTests(SimpleTestCase):
+    def test_retries_rate_limited_send(self):
+        async def scenario():
+            async with FakeTelegram(failures=[429, 502]) as telegram:
+                notifier = telegram.notifier()
+                await notifier.start()
+                notifier.send_photo("BTC/USDT", b"png")
+                await notifier.stop()
+                return telegram.calls, notifier.metrics()
+
+        calls, metrics = asyncio.run(scenario())
+        self.assertEqual([method for method, _ in calls], ["sendPhoto"] * 3)
+        self.assertEqual(calls[-1][1]["caption"], "BTC/USDT")
+        self.assertEqual(calls[-1][1]["photo"], b"png")
+        self.assertEqual((metrics["sent"], metrics["retried"], metrics["failed"]), (1, 2, 0))
+
+    def test_retries_proxy_html_error(self):
+        """A 502 page from a proxy is not JSON, but it is still a retryable 5xx."""
+        async def scenario():
+            async with FakeTelegram(failures=[502], html_failures=[502]) as telegram:
+                notifier = telegram.notifier()
+                await notifier.start()
+                notifier.send_message("hello")
+                await notifier.stop()
+                return telegram.calls, notifier.metrics()
+
+        calls, metrics = asyncio.run(scenario())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((metrics["sent"], metrics["retried"], metrics["failed"]), (1, 1, 0))
+
+    def test_client_errors_are_not_retried(self):
+        async def scenario():
+            async with FakeTelegram(failures=[400]) as telegram:
+                notifier = telegram.notifier()
+                await notifier.start()
+                notifier.send_message("hello")
+                await notifier.stop()
+                return telegram.calls, notifier.metrics()
+
+        calls, metrics = asyncio.run(scenario())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((metrics["sent"], metrics["failed"]), (0, 1))
+
+    def test_digest_merges_pairs(self):
+        """Reports of many pairs go out as one media group and one message."""
+        async def scenario():
+            async with FakeTelegram() as telegram:
+                notifier = telegram.notifier(digest_interval=60)
+                await notifier.start()
+                for pair in ("BTC/USDT", "ETH/USDT", "SOL/USDT"):
+                    notifier.send_photo(pair, pair.encode())
+                    notifier.send_message(f"{pair} up")
+                await notifier.stop()
+                return telegram.calls
+
+        calls = asyncio.run(scenario())
+        self.assertEqual([method for method, _ in calls], ["sendMediaGroup", "sendMessage"])
+        group = calls[0][1]
+        media = json.loads(group["media"])
+        self.assertEqual([item["caption"] for item in media], ["BTC/USDT", "ETH/USDT", "SOL/USDT"])
+        self.assertEqual(group["photo2"], b"SOL/USDT")
+        self.assertEqual(calls[1][1]["text"], "BTC/USDT up\nETH/USDT up\nSOL/USDT up")
+
+    def test_digest_keeps_latest_report_per_pair_and_is_bounded(self):
+        notifier = TelegramNotifier(digest_interval=60, digest_limit=2)
+        notifier.send_photo("BTC/USDT old", b"1", key="BTC/USDT")
+        notifier.send_photo("ETH/USDT", b"2", key="ETH/USDT")
+        notifier.send_photo("BTC/USDT new", b"3", key="BTC/USDT")
+        self.assertEqual(list(notifier.photos.values()), [("ETH/USDT", b"2"), ("BTC/USDT new", b"3")])
+        notifier.send_photo("SOL/USDT", b"4", key="SOL/USDT")  # ETH is the oldest and is pushed out
+        self.assertEqual(list(notifier.photos), ["BTC/USDT", "SOL/USDT"])
+        for text in ("a", "b", "c"):
+            notifier.send_message(text)
+        self.assertEqual(list(notifier.texts), ["b", "c"])
+        self.assertEqual(notifier.metrics()["dropped"], 2)
+
+    @override_settings(TELEGRAM_MESSAGES_PER_MINUTE=12)
+    def test_report_budget_matches_telegram_limit(self):
+        stream = BinanceBatchTradeStream(symbols=[])
+        self.assertEqual(stream.report_rate_limiter.rate, TelegramNotifier().rate_limiter.rate)
+        self.assertEqual(stream.report_rate_limiter.rate, 0.2)
+        asyncio.run(stream.exchange.close())
+
+    def test_full_queue_drops(self):
+        async def scenario():
+            notifier = TelegramNotifier(max_queue=2)
+            return [notifier.send_message(str(i)) for i in range(3)], notifier.metrics()
+
+        accepted, metrics = asyncio.run(scenario())
+        self.assertEqual(accepted, [True, True, False])
+        self.assertEqual(metrics["dropped"], 1)
+
+
+def reference_candles(timestamps, prices, amounts, interval_ms):
+    """Candles of a whole series by brute force, one group of trades at a time."""
+    starts = timestamps // interval_ms * interval_ms
+    rows = []
+    for start in np.unique(starts):
+        mask = starts == start
+        group_prices, group_amounts = prices[mask], amounts[mask]
+        rows.append((
+            start, group_prices[0], group_prices.max(), group_prices.min(), group_prices[-1],
+            group_amounts.sum(), (group_prices * group_amounts).sum() / group_amounts.sum(), mask.sum(),
+        ))
+    return np.array(rows)
+
+
+class CandleBuilderTests(SimpleTestCase):
+    def make_trades(self, size=20_000):
+        rng = np.random.default_rng(3)
+        timestamps = 1_700_000_000_000 + np.cumsum(rng.integers(0, 1500, size))
+        prices = np.array(random_walk(size)) + 100
+        amounts = rng.uniform(0.1, 2.0, size)
+        sides = rng.choice([-1, 1], size).astype(np.int8)
+        return timestamps, prices, amounts, sides
+
+    def test_rolled_up_candles_match_direct_aggregation(self):
+        timestamps, prices, amounts, sides = self.make_trades()
+        builder = CandleBuilder(capacity=50_000)
+        for batch in np.array_split(np.arange(len(prices)), 37):
+            builder.add_batch(timestamps[batch], prices[batch], amounts[batch], sides[batch])
+
+        columns = ("start", "open", "high", "low", "close", "volume", "vwap", "count")
+        for timeframe, interval_ms in TIMEFRAMES.items():
+            candles = builder.candles(timeframe)
+            built = np.column_stack([candles[name] for name in columns])
+            expected = reference_candles(timestamps, prices, amounts, interval_ms)
+            # The last candle is still open
+            np.testing.assert_allclose(built, expected[:-1])
+            np.testing.assert_allclose(builder.open_candle(timeframe)["volume"], expected[-1, 5])
+            np.testing.assert_allclose(builder.open_candle(timeframe)["vwap"], expected[-1, 6])
+
+        one_second = builder.candles("1s")
+        np.testing.assert_allclose(one_second["buy_volume"] + one_second["sell_volume"], one_second["volume"])
+
+    def test_ring_keeps_last_candles(self):
+        builder = CandleBuilder(timeframes=("1s",), capacity=3)
+        builder.add_batch(np.arange(10) * 1000, np.arange(10.0), np.ones(10))
+        self.assertEqual(builder.candles("1s")["start"].tolist(), [6000, 7000, 8000])
+
+    def test_rejects_timeframes_that_do_not_nest(self):
+        with mock.patch.dict(TIMEFRAMES, {"7s": 7000}), self.assertRaises(ValueError):
+            CandleBuilder(timeframes=("5m", "7s"))
+
+    def test_engine_subscription(self):
+        engine = make_engine(candles={"timeframes": ("1s", "1m")})
+        asyncio.run(engine.add_many([make_trade(500, 10.0, trade_id=1)]))
+        seen = []
+        builder = engine.subscribe_candles("chart", "1s", lambda timeframe, candles: seen.append(candles["start"].tolist()))
+        # Trades already in the buffer warm the builder up
+        self.assertEqual(builder.open_candle("1s")["count"].tolist(), [1])
+
+        asyncio.run(engine.add_many([make_trade(1500, 11.0, trade_id=2), make_trade(3500, 12.0, trade_id=3)]))
+        self.assertEqual(seen, [[0, 1000]])
+        self.assertEqual(builder.candles("1s")["close"].tolist(), [10.0, 11.0])
+
+        engine.unsubscribe_candles("chart")
+        self.assertIsNone(engine.candles)